@@ -1,12 +1,42 @@
-import socket
+import time
+STARTED_AT = time.perf_counter()  # startup is measured from here
+
 import pygame
 import sys
 
+from protocol import PROTO_BINARY, MAX_SPEED
+from frame_clock import FrameClock
+from controller_core import ControllerCore
+from keymap import BIT_UP, BIT_DOWN, BIT_LEFT, BIT_RIGHT
+from profiler import draw_overlay, overlay_size, P_DRAW, P_FLIP, P_IDLE
+from render_engine import Label
+from sender import MODE_CHANGE
+
 # ============================================
 # CONFIGURATION - CHANGE THIS!
 # ============================================
-ESP_IP = "10.67.214.228"  # ← PUT YOUR ESP8266 IP HERE
+ESP_IP = None  # ← the bot's address, pinned (None = discover it, reusing the last one from BOT_CACHE)
 ESP_PORT = 4210
+BOT_CACHE = ".bot_cache.json"
+SEND_RATE = 100  # Hz - command stream rate, independent of the frame rate
+SEND_MODE = MODE_CHANGE  # send on change + heartbeats ("stream" = every tick)
+HEARTBEAT_INTERVAL = 0.1  # s - must stay well below the receiver's 300 ms timeout
+PROTOCOL = PROTO_BINARY  # PROTO_ASCII for firmware without the binary protocol
+ACK_MODE = True  # bot echoes sequence numbers -> RTT/loss in the UI (binary only)
+ADAPTIVE_LINK = True  # heartbeats and critical-send copies follow the measured link
+TELEMETRY = True  # bot streams its PWM, applied seq, timeouts and uptime back (binary only)
+FPS = 30
+KEY_RESYNC_FRAMES = 15  # while no key is held, re-read the keyboard every N frames
+GAMEPAD_INDEX = 0  # analog stick drive (binary protocol only)
+RECORD_DIR = "recordings"  # every packet sent is logged here (None to disable)
+PROFILE = False  # time every loop phase from the start (F3 toggles it)
+PROFILE_CSV = "profile.csv"  # per-frame timings written on exit if profiled
+ANALYTICS = True  # keep every send/ack for the F4 and exit reports (needs numpy)
+METRICS_PORT = 9108  # Prometheus endpoint on localhost for the pit crew (None to disable)
+MANEUVER_KEYS = {  # timed maneuvers (maneuvers.py); a direction key cancels
+    pygame.K_1: "burst", pygame.K_2: "spin_left", pygame.K_3: "spin_right",
+    pygame.K_4: "pop", pygame.K_5: "tug",
+}
 
 # ============================================
 # Colors
@@ -23,57 +53,82 @@ YELLOW = (255, 255, 0)
 
 
 # ============================================
-# UDP Setup
+# Pygame Setup (deferred to init_gui)
 # ============================================
-sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-sock.settimeout(0.1)
+WIDTH, HEIGHT = 600, 500
+screen = None
+clock = None
+title_font = font = small_font = mono_font = None
+labels = None
+
+def init_gui():
+    """Open the window, load fonts and set up the labels"""
+    global screen, clock, title_font, font, small_font, mono_font, labels
+    pygame.init()
+    screen = pygame.display.set_mode((WIDTH, HEIGHT))
+    pygame.display.set_caption("ESP8266 RC Car Controller")
+    clock = FrameClock(FPS)
+    
+    # Fonts
+    title_font = pygame.font.Font(None, 48)
+    font = pygame.font.Font(None, 32)
+    small_font = pygame.font.Font(None, 24)
+    mono_font = pygame.font.SysFont("monospace", 14)
+    
+    # Text is rendered again only when what it shows changes
+    labels = {
+        "title": Label(title_font, "RC CAR CONTROL", WHITE),
+        "status": Label(small_font, "Status: {}{}", GREEN),
+        "target": Label(small_font, "Target: {}:{}", WHITE),
+        "target_none": Label(small_font, "Target: searching...", GRAY),
+        "packets": Label(small_font, "Packets: {}", WHITE),
+        "bot_none": Label(small_font, "Bot: no telemetry", GRAY),
+        "bot_pwm": Label(small_font, "Bot L/R: {:+d}/{:+d}", WHITE),
+        "bot_seq": Label(small_font, "Applied: #{} (lag {})", WHITE),
+        "bot_up": Label(small_font, "Up {}s  Timeouts: {}", WHITE),
+        "rtt": Label(small_font, "{}", WHITE),
+        "cmd": Label(font, "CMD: {}", GREEN),
+        "speed": Label(small_font, "Speed: {}/" + str(MAX_SPEED), WHITE),
+        "guide": Label(small_font, GUIDE_TEXT, GRAY),
+    }
 
 # ============================================
-# Pygame Setup
+# Layout (built once, reused every frame)
 # ============================================
-pygame.init()
-WIDTH, HEIGHT = 600, 500
-screen = pygame.display.set_mode((WIDTH, HEIGHT))
-pygame.display.set_caption("ESP8266 RC Car Controller")
-clock = pygame.time.Clock()
+GUIDE_TEXT = "W/↑: Forward  |  S/↓: Backward  |  A/←: Left  |  D/→: Right  |  +: Speed↑  |  -: Speed↓  |  ESC: Quit"
+CMD_BOX = pygame.Rect(WIDTH//2 - 150, 130, 300, 60)
+SPEED_BAR = pygame.Rect(WIDTH//2 - 150, 230, 300, 20)
+GUIDE_Y = 450
+speed_fill = SPEED_BAR.copy()  # width follows the speed
 
-# Fonts
-title_font = pygame.font.Font(None, 48)
-font = pygame.font.Font(None, 32)
-small_font = pygame.font.Font(None, 24)
+def arrow_points(direction, x, y, size):
+    """Triangle of an arrow pointing in direction"""
+    if direction == "UP":
+        return ((x, y - size), (x - size, y + size), (x + size, y + size))
+    if direction == "DOWN":
+        return ((x, y + size), (x - size, y - size), (x + size, y - size))
+    if direction == "LEFT":
+        return ((x - size, y), (x + size, y - size), (x + size, y + size))
+    return ((x + size, y), (x - size, y - size), (x - size, y + size))
+
+ARROW_CENTER_X = WIDTH // 2
+ARROW_CENTER_Y = 340
+ARROW_SPACING = 80
+ARROWS = [
+    (arrow_points("UP", ARROW_CENTER_X, ARROW_CENTER_Y - ARROW_SPACING, 20), BIT_UP),
+    (arrow_points("DOWN", ARROW_CENTER_X, ARROW_CENTER_Y + ARROW_SPACING, 20), BIT_DOWN),
+    (arrow_points("LEFT", ARROW_CENTER_X - ARROW_SPACING, ARROW_CENTER_Y, 20), BIT_LEFT),
+    (arrow_points("RIGHT", ARROW_CENTER_X + ARROW_SPACING, ARROW_CENTER_Y, 20), BIT_RIGHT),
+]
 
 # ============================================
-# State Variables
+# State (input, sender and reports live in controller_core.py)
 # ============================================
-current_command = "STOPPED"
-current_speed = 512
-command_history = []
-max_history = 10
-packets_sent = 0
-connection_status = "CONNECTING..."
+core = ControllerCore(sys.modules[__name__])
 
 # ============================================
 # Functions
 # ============================================
-def send_command(command):
-    """Send UDP command to ESP8266"""
-    global packets_sent, connection_status
-    try:
-        sock.sendto(command.encode(), (ESP_IP, ESP_PORT))
-        packets_sent += 1
-        connection_status = "CONNECTED"
-        return True
-    except Exception as e:
-        connection_status = f"ERROR: {e}"
-        return False
-
-def log_command(cmd, description):
-    """Add command to history"""
-    global command_history
-    command_history.append(f"{description}")
-    if len(command_history) > max_history:
-        command_history.pop(0)
-
 def draw_button(text, x, y, width, height, active=False):
     """Draw a button on screen"""
     color = GREEN if active else GRAY
@@ -84,188 +139,119 @@ def draw_button(text, x, y, width, height, active=False):
     text_rect = text_surf.get_rect(center=(x + width//2, y + height//2))
     screen.blit(text_surf, text_rect)
 
-def draw_arrow(direction, x, y, size, active=False):
+def draw_arrow(points, active=False):
     """Draw directional arrow"""
     color = YELLOW if active else BLUE
-    
-    if direction == "UP":
-        points = [(x, y - size), (x - size, y + size), (x + size, y + size)]
-    elif direction == "DOWN":
-        points = [(x, y + size), (x - size, y - size), (x + size, y - size)]
-    elif direction == "LEFT":
-        points = [(x - size, y), (x + size, y - size), (x + size, y + size)]
-    elif direction == "RIGHT":
-        points = [(x + size, y), (x - size, y - size), (x - size, y + size)]
-    
     pygame.draw.polygon(screen, color, points)
     pygame.draw.polygon(screen, WHITE, points, 3)
 
+def draw_label(name, x, y, *values):
+    """Blit a label; x=None centers it"""
+    surf = labels[name].get(*values)
+    screen.blit(surf, (WIDTH//2 - surf.get_width()//2 if x is None else x, y))
+
 def draw_ui():
     """Draw the user interface"""
+    sender = core.sender
     screen.fill(DARK_GRAY)
     
     # Title
-    title = title_font.render("RC CAR CONTROL", True, WHITE)
-    screen.blit(title, (WIDTH//2 - title.get_width()//2, 20))
+    draw_label("title", None, 20)
     
     # Connection status
-    status_color = GREEN if connection_status == "CONNECTED" else RED
-    status_text = small_font.render(f"Status: {connection_status}", True, status_color)
-    screen.blit(status_text, (20, 70))
+    rtt, loss_text = core.link_labels()
+    labels["status"].color = GREEN if sender.status == "CONNECTED" else RED
+    draw_label("status", 20, 70, sender.status, loss_text)
     
     # Target info
-    target_text = small_font.render(f"Target: {ESP_IP}:{ESP_PORT}", True, WHITE)
-    screen.blit(target_text, (20, 95))
+    address = sender.address  # follows the bot if discovery retargets
+    if address is None:
+        draw_label("target_none", 20, 95)
+    else:
+        draw_label("target", 20, 95, *address)
     
     # Packets sent
-    packets_text = small_font.render(f"Packets: {packets_sent}", True, WHITE)
-    screen.blit(packets_text, (WIDTH - 150, 70))
+    draw_label("packets", WIDTH - 150, 70, sender.packets_sent)
     
-    # Current command display
-    cmd_bg = pygame.Rect(WIDTH//2 - 150, 130, 300, 60)
-    pygame.draw.rect(screen, BLACK, cmd_bg, border_radius=10)
-    pygame.draw.rect(screen, GREEN, cmd_bg, 3, border_radius=10)
+    # Round-trip time p50/p95/p99
+    draw_label("rtt", WIDTH - 150, 95, rtt)
     
-    cmd_text = font.render(f"CMD: {current_command}", True, GREEN)
-    screen.blit(cmd_text, (WIDTH//2 - cmd_text.get_width()//2, 145))
+    # Bot-side telemetry, as last reported (None once it goes stale)
+    if sender.telemetry is not None:
+        state = sender.telemetry.fresh(time.perf_counter())
+        if state is None:
+            draw_label("bot_none", 20, 280)
+        else:
+            draw_label("bot_pwm", 20, 280, state.left, state.right)
+            draw_label("bot_seq", 20, 305, "-" if state.last_seq is None else state.last_seq,
+                       "-" if state.lag is None else state.lag)
+            labels["bot_up"].color = RED if state.timed_out else WHITE
+            draw_label("bot_up", 20, 330, state.uptime_ms // 1000, state.timeouts)
+    
+    # Current command display
+    pygame.draw.rect(screen, BLACK, CMD_BOX, border_radius=10)
+    pygame.draw.rect(screen, GREEN, CMD_BOX, 3, border_radius=10)
+    draw_label("cmd", None, 145, core.current_command)
     
     # Speed display
-    speed_text = small_font.render(f"Speed: {current_speed}/1023", True, WHITE)
-    screen.blit(speed_text, (WIDTH//2 - speed_text.get_width()//2, 200))
+    draw_label("speed", None, 200, core.current_speed)
     
     # Speed bar
-    bar_width = 300
-    bar_height = 20
-    bar_x = WIDTH//2 - bar_width//2
-    bar_y = 230
-    
-    pygame.draw.rect(screen, BLACK, (bar_x, bar_y, bar_width, bar_height))
-    filled_width = int((current_speed / 1023) * bar_width)
-    pygame.draw.rect(screen, GREEN, (bar_x, bar_y, filled_width, bar_height))
-    pygame.draw.rect(screen, WHITE, (bar_x, bar_y, bar_width, bar_height), 2)
+    pygame.draw.rect(screen, BLACK, SPEED_BAR)
+    speed_fill.width = int((core.current_speed / MAX_SPEED) * SPEED_BAR.width)
+    pygame.draw.rect(screen, GREEN, speed_fill)
+    pygame.draw.rect(screen, WHITE, SPEED_BAR, 2)
     
     # Draw directional arrows
-    center_x = WIDTH // 2
-    center_y = 340
-    spacing = 80
-    
-    # Get key states
-    keys = pygame.key.get_pressed()
-    
-    # Up arrow
-    draw_arrow("UP", center_x, center_y - spacing, 20, 
-               keys[pygame.K_UP] or keys[pygame.K_w])
-    
-    # Down arrow
-    draw_arrow("DOWN", center_x, center_y + spacing, 20, 
-               keys[pygame.K_DOWN] or keys[pygame.K_s])
-    
-    # Left arrow
-    draw_arrow("LEFT", center_x - spacing, center_y, 20, 
-               keys[pygame.K_LEFT] or keys[pygame.K_a])
-    
-    # Right arrow
-    draw_arrow("RIGHT", center_x + spacing, center_y, 20, 
-               keys[pygame.K_RIGHT] or keys[pygame.K_d])
+    for points, bit in ARROWS:
+        draw_arrow(points, core.input_mask & bit)
     
     # Controls guide
-    guide_y = 450
-    guide_texts = [
-        "W/↑: Forward  |  S/↓: Backward  |  A/←: Left  |  D/→: Right  |  +: Speed↑  |  -: Speed↓  |  ESC: Quit"
-    ]
-    
-    guide = small_font.render(guide_texts[0], True, GRAY)
-    screen.blit(guide, (WIDTH//2 - guide.get_width()//2, guide_y))
+    draw_label("guide", None, GUIDE_Y)
 
 # ============================================
 # Main Loop
 # ============================================
-def main():
-    global current_command, current_speed
+def run_frame():
+    """One pass of the main loop, up to the wait for the next frame"""
+    profiler = core.profiler
     
-    running = True
-    last_command = None
+    # Events, key state and the command for the sender
+    core.process_input()
     
-    print("=" * 60)
-    print("ESP8266 RC Car Controller (Pygame)")
-    print("=" * 60)
-    print(f"Target: {ESP_IP}:{ESP_PORT}")
-    print("=" * 60)
+    # Draw UI
+    draw_ui()
+    if profiler.enabled:
+        # Bottom right: clear of the telemetry on the left and the arrows
+        width, height = overlay_size(mono_font)
+        draw_overlay(screen, mono_font, profiler.overlay_lines(), WIDTH - width - 10, GUIDE_Y - height - 6)
+    profiler.mark(P_DRAW)
     
-    while running:
-        # Event handling
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                running = False
-            
-            # Speed control on key press
-            if event.type == pygame.KEYDOWN:
-                if event.key == pygame.K_PLUS or event.key == pygame.K_EQUALS:
-                    current_speed = min(1023, current_speed + 100)
-                    send_command("+")
-                    log_command("+", f"Speed increased to {current_speed}")
-                elif event.key == pygame.K_MINUS or event.key == pygame.K_UNDERSCORE:
-                    current_speed = max(200, current_speed - 100)
-                    send_command("-")
-                    log_command("-", f"Speed decreased to {current_speed}")
-                elif event.key == pygame.K_ESCAPE:
-                    running = False
-        
-        # Get current key states
-        keys = pygame.key.get_pressed()
-        
-        # Determine command based on keys
-        command = "S"  # Default to stop
-        command_name = "STOPPED"
-        
-        if keys[pygame.K_UP] or keys[pygame.K_w]:
-            command = "F"
-            command_name = "FORWARD"
-        elif keys[pygame.K_DOWN] or keys[pygame.K_s]:
-            command = "B"
-            command_name = "BACKWARD"
-        elif keys[pygame.K_LEFT] or keys[pygame.K_a]:
-            command = "L"
-            command_name = "LEFT"
-        elif keys[pygame.K_RIGHT] or keys[pygame.K_d]:
-            command = "R"
-            command_name = "RIGHT"
-        elif keys[pygame.K_UP] and keys[pygame.K_LEFT]:
-            command = "UL"
-            command_name = "UPPER_LEFT"
-        elif keys[pygame.K_UP] and keys[pygame.K_RIGHT]:
-            command = "UR"
-            command_name = "UPPER_RIGHT"
-        elif keys[pygame.K_DOWN] and keys[pygame.K_LEFT]:
-            command = "DL"
-            command_name = "dOWN_LEFT"
-        elif keys[pygame.K_DOWN] and keys[pygame.K_RIGHT]:
-            command = "DR"
-            command_name = "DOWN_RIGHT"
-        
-        
-        # Always send command (removed change check for better responsiveness)
-        if send_command(command):
-            current_command = command_name
-            # Only log and print when command changes to reduce console spam
-            if command != last_command:
-                log_command(command, command_name)
-                print(f"→ {command_name}")
-            last_command = command
-        
-        # Draw UI
-        draw_ui()
-        
-        # Update display
-        pygame.display.flip()
+    # Update display
+    pygame.display.flip()
+    profiler.mark(P_FLIP)
+
+def main():
+    core.open_network()
+    init_gui()
+    core.open_gamepad()
+    
+    core.print_banner("ESP8266 RC Car Controller (Pygame)")
+    core.start()
+    print(f"Startup: {(time.perf_counter() - STARTED_AT) * 1000:.0f} ms from launch to window")
+    
+    while core.running:
+        run_frame()
         
-        # Control frame rate (20 FPS = 50ms between commands)
-        clock.tick(20)
+        # Control frame rate, handling input as it arrives in between
+        clock.wait(core.handle_event)
+        core.profiler.mark(P_IDLE)
+        core.profiler.end_frame()
     
     # Cleanup
-    send_command("S")  # Stop car before exiting
+    core.close()
     pygame.quit()
-    sock.close()
+    core.print_report()
     print("\n✓ Controller stopped.")
 
 # ============================================
@@ -276,6 +262,6 @@ if __name__ == "__main__":
         main()
     except KeyboardInterrupt:
         print("\n\nInterrupted by user")
+        core.close()
         pygame.quit()
-        sock.close()
-        sys.exit(0)
\ No newline at end of file
+        sys.exit(0)
@@ -0,0 +1,276 @@
+import argparse
+import time
+
+try:
+    import numpy as np
+except ImportError:  # analytics is optional; the controller runs without it
+    np = None
+
+from protocol import COMMAND_NAMES, FLAG_ACK_REQUEST
+from recorder import NO_COMMAND
+
+# ============================================
+# Packet Analytics
+# ============================================
+# A columnar record of every packet a CommandSender puts on the wire, for
+# post-match analysis. Each column (send time, seq, command, speed, flags,
+# ack time) is a preallocated NumPy array, filled one row per packet on the
+# sender thread. When a chunk is full another one is appended, so nothing
+# is ever copied or reallocated while the sender writes; summaries
+# concatenate the filled rows and work on whole columns at once:
+#
+#   intervals  - distribution of the time between consecutive sends
+#   gaps       - intervals longer than the receiver's COMMAND_TIMEOUT,
+#                i.e. moments the motors would have been stopped
+#   dwell      - how long each command stayed in effect
+#   loss       - ack-requested packets never acked, and the bursts they
+#                came in (ack mode only)
+#
+# Acks find their row through a table indexed by sequence number, like
+# LinkStats. NumPy is optional: open_store() returns None without it.
+#
+#   python analytics.py recordings/session-....tkr   # report for a recorded log
+
+CHUNK_ROWS = 16384  # ~2.7 min at 100 Hz, 360 KB per chunk
+RECEIVER_COMMAND_TIMEOUT_MS = 300  # COMMAND_TIMEOUT in Reciever/src/main.cpp
+ACK_WAIT_MS = 1000  # packets younger than this may still be acked
+INTERVAL_BUCKETS_MS = (2, 5, 10, 20, 50, 100, 150, 300)
+SEQ_SPACE = 0x10000
+
+COLUMNS = (
+    ("t_send", "i8"),   # perf_counter_ns() when sendto returned
+    ("seq", "u2"),
+    ("cmd", "u1"),      # NO_COMMAND for ASCII speed steps
+    ("speed", "i2"),
+    ("flags", "u1"),
+    ("t_ack", "i8"),    # -1 until acked
+)
+
+
+class PacketStore:
+    """Chunked, array-backed columns of sent packets with vectorized summaries"""
+
+    def __init__(self, chunk_rows=CHUNK_ROWS):
+        if np is None:
+            raise RuntimeError("packet analytics needs numpy")
+        self.chunk_rows = chunk_rows
+        self.rows = 0
+        self._chunks = []  # one dict of column arrays per chunk
+        self._chunk = None
+        self._index = chunk_rows  # row within the current chunk
+        self._row_of_seq = np.full(SEQ_SPACE, -1, dtype=np.int64)
+        self._add_chunk()
+
+    def _add_chunk(self):
+        chunk = {name: np.empty(self.chunk_rows, dtype) for name, dtype in COLUMNS}
+        chunk["t_ack"].fill(-1)
+        self._chunks.append(chunk)
+        self._chunk = chunk
+        self._index = 0
+
+    # ----- Sender thread -----
+
+    def record(self, t_ns, seq, cmd, speed, flags):
+        """Append one sent packet"""
+        if self._index == self.chunk_rows:
+            self._add_chunk()
+        chunk, i = self._chunk, self._index
+        chunk["t_send"][i] = t_ns
+        chunk["seq"][i] = seq
+        chunk["cmd"][i] = cmd
+        chunk["speed"][i] = speed
+        chunk["flags"][i] = flags
+        if flags & FLAG_ACK_REQUEST:
+            self._row_of_seq[seq] = self.rows
+        self._index = i + 1
+        self.rows += 1  # published last: readers never see a half-written row
+
+    def record_ack(self, seq, t_ns):
+        """Stamp the ack time on the newest packet with seq (first ack wins)"""
+        row = self._row_of_seq[seq]
+        if row < 0:
+            return
+        self._row_of_seq[seq] = -1
+        chunk, i = divmod(int(row), self.chunk_rows)
+        self._chunks[chunk]["t_ack"][i] = t_ns
+
+    # ----- Summaries -----
+
+    def columns(self):
+        """The filled rows as one contiguous array per column"""
+        rows = self.rows
+        chunks = self._chunks[:(rows + self.chunk_rows - 1) // self.chunk_rows]
+        columns = {}
+        for name, dtype in COLUMNS:
+            parts = [chunk[name] for chunk in chunks]
+            columns[name] = np.concatenate(parts)[:rows] if parts else np.empty(0, dtype)
+        return columns
+
+    def summary(self, now_ns=None):
+        """Summary dict of everything recorded so far (see summarize())"""
+        return summarize(self.columns(), now_ns)
+
+
+# recorder.RECORD ("<QHHhhBBBx") as a structured dtype
+LOG_DTYPE = None if np is None else np.dtype([
+    ("t_send", "<u8"), ("seq", "<u2"), ("speed", "<u2"), ("left", "<i2"), ("right", "<i2"),
+    ("cmd", "u1"), ("flags", "u1"), ("lead", "u1"), ("pad", "u1"),
+])
+
+
+def log_columns(log):
+    """Columns of a recorded SessionLog; acks aren't logged, so t_ack is None"""
+    records = np.frombuffer(log.raw(), dtype=LOG_DTYPE)
+    columns = {name: records[name].astype(dtype) for name, dtype in COLUMNS if name != "t_ack"}
+    columns["t_ack"] = None
+    return columns
+
+
+def _runs(mask):
+    # (start, length) of every run of True in a boolean array
+    edges = np.diff(np.concatenate(([0], mask.view(np.int8), [0])))
+    starts = np.flatnonzero(edges == 1)
+    return starts, np.flatnonzero(edges == -1) - starts
+
+
+def summarize(columns, now_ns=None):
+    """Interval distribution, timeout gaps, command dwell and loss bursts"""
+    t = columns["t_send"]
+    n = len(t)
+    result = {"packets": n, "duration_s": (t[-1] - t[0]) / 1e9 if n > 1 else 0.0}
+    if n < 2:
+        return result
+
+    # Inter-send intervals
+    intervals_ms = np.diff(t) / 1e6
+    p50, p90, p99 = np.percentile(intervals_ms, (50, 90, 99))
+    edges = np.searchsorted(INTERVAL_BUCKETS_MS, intervals_ms, side="left")
+    result["interval_ms"] = {
+        "mean": float(intervals_ms.mean()), "p50": float(p50), "p90": float(p90),
+        "p99": float(p99), "max": float(intervals_ms.max()),
+        "buckets": np.bincount(edges, minlength=len(INTERVAL_BUCKETS_MS) + 1).tolist(),
+    }
+
+    # Gaps the receiver would have timed out on
+    gaps = np.flatnonzero(intervals_ms > RECEIVER_COMMAND_TIMEOUT_MS)
+    result["timeout_gaps"] = {
+        "count": len(gaps),
+        "longest_ms": float(intervals_ms[gaps].max()) if len(gaps) else 0.0,
+        "total_s": float(intervals_ms[gaps].sum() / 1e3),
+        "at_s": ((t[gaps] - t[0]) / 1e9).tolist()[:10],
+    }
+
+    # Command dwell: a segment runs from a change to the next one
+    cmd = columns["cmd"]
+    is_command = cmd != NO_COMMAND
+    seg_t, seg_cmd = t[is_command], cmd[is_command]
+    dwell = {}
+    if len(seg_t):
+        starts = np.flatnonzero(np.concatenate(([True], seg_cmd[1:] != seg_cmd[:-1])))
+        ends = np.append(seg_t[starts[1:]], seg_t[-1] if now_ns is None else now_ns)
+        durations_ms = (ends - seg_t[starts]) / 1e6
+        codes = seg_cmd[starts]
+        slots = len(COMMAND_NAMES)
+        total = np.bincount(codes, weights=durations_ms, minlength=slots)
+        count = np.bincount(codes, minlength=slots)
+        longest = np.zeros(slots)
+        np.maximum.at(longest, codes, durations_ms)
+        for code in np.flatnonzero(count):
+            dwell[COMMAND_NAMES[code]] = {
+                "segments": int(count[code]), "total_s": float(total[code] / 1e3),
+                "mean_ms": float(total[code] / count[code]), "longest_ms": float(longest[code]),
+            }
+    result["dwell"] = dwell
+
+    # Loss bursts among packets old enough to have been acked
+    if columns["t_ack"] is None:
+        return result
+    requested = (columns["flags"] & FLAG_ACK_REQUEST) != 0
+    settled = t <= (t[-1] if now_ns is None else now_ns) - ACK_WAIT_MS * 1_000_000
+    candidates = requested & settled
+    if candidates.any():
+        t_ack = columns["t_ack"][candidates]
+        lost = t_ack < 0
+        acked = ~lost
+        rtt_ms = (t_ack[acked] - t[candidates][acked]) / 1e6
+        _, lengths = _runs(lost)
+        result["loss"] = {
+            "requested": int(candidates.sum()), "lost": int(lost.sum()),
+            "rate": float(lost.mean()),
+            "bursts": len(lengths), "longest_burst": int(lengths.max()) if len(lengths) else 0,
+            "burst_lengths": np.bincount(lengths).tolist()[1:] if len(lengths) else [],
+            "rtt_ms": tuple(float(x) for x in np.percentile(rtt_ms, (50, 95, 99)))
+            if len(rtt_ms) else None,
+        }
+    return result
+
+
+def format_report(summary, width=30):
+    """Text lines for the console"""
+    lines = [f"Packets: {summary['packets']} over {summary['duration_s']:.1f}s"]
+    interval = summary.get("interval_ms")
+    if interval is None:
+        return lines
+    lines.append(f"  Send interval: mean {interval['mean']:.2f} ms, p50 {interval['p50']:.2f}, "
+                 f"p90 {interval['p90']:.2f}, p99 {interval['p99']:.2f}, max {interval['max']:.1f} ms")
+    buckets = interval["buckets"]
+    peak = max(buckets) or 1
+    labels = [f"<= {b} ms" for b in INTERVAL_BUCKETS_MS] + [f"> {INTERVAL_BUCKETS_MS[-1]} ms"]
+    for label, count in zip(labels, buckets):
+        lines.append(f"  {label:>10} {'#' * round(width * count / peak):<{width}} {count}")
+
+    gaps = summary["timeout_gaps"]
+    if gaps["count"]:
+        at = ", ".join(f"{s:.1f}s" for s in gaps["at_s"])
+        lines.append(f"  Gaps > {RECEIVER_COMMAND_TIMEOUT_MS} ms (receiver timeout): {gaps['count']}, "
+                     f"longest {gaps['longest_ms']:.0f} ms, {gaps['total_s']:.2f}s total (at {at})")
+    else:
+        lines.append(f"  No gaps > {RECEIVER_COMMAND_TIMEOUT_MS} ms (receiver timeout)")
+
+    if summary["dwell"]:
+        lines.append("  Command dwell:")
+        for name, d in sorted(summary["dwell"].items(), key=lambda item: -item[1]["total_s"]):
+            lines.append(f"    {name:<12}{d['total_s']:7.1f}s in {d['segments']:4d} segments, "
+                         f"mean {d['mean_ms']:6.0f} ms, longest {d['longest_ms']:6.0f} ms")
+
+    loss = summary.get("loss")
+    if loss is not None:
+        lines.append(f"  Loss: {loss['lost']} of {loss['requested']} ({loss['rate']:.2%}), "
+                     f"{loss['bursts']} bursts, longest {loss['longest_burst']} in a row")
+        if loss["burst_lengths"]:
+            lines.append("    burst lengths: " + ", ".join(
+                f"{length}x{count}" for length, count in enumerate(loss["burst_lengths"], 1) if count))
+        if loss["rtt_ms"] is not None:
+            lines.append("    RTT p50/p95/p99: {:.2f}/{:.2f}/{:.2f} ms".format(*loss["rtt_ms"]))
+    return lines
+
+
+def open_store(**kwargs):
+    """A PacketStore, or None (with a warning) if numpy isn't installed"""
+    if np is None:
+        print("Warning: numpy not installed, packet analytics disabled")
+        return None
+    return PacketStore(**kwargs)
+
+
+def print_report(store, title="Packet analytics"):
+    """Print the summary of everything store has recorded up to now"""
+    lines = format_report(store.summary(time.perf_counter_ns()))
+    print("\n".join([f"\n{title}:"] + lines))
+
+
+def main():
+    from recorder import SessionLog
+
+    parser = argparse.ArgumentParser(description="Packet analytics for a recorded session")
+    parser.add_argument("log", help="session log written by recorder.py")
+    args = parser.parse_args()
+    if np is None:
+        parser.error("numpy is required")
+    with SessionLog(args.log) as log:
+        columns = log_columns(log)
+    print("\n".join(format_report(summarize(columns))))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+import hashlib
+import os
+
+import pygame
+
+# ============================================
+# Startup Asset Cache
+# ============================================
+# Decoding the background PNG, scaling it to the window and blending it
+# with the overlay costs more at launch than everything else before the
+# first frame. The finished layer only depends on the image, the window
+# size and the blend settings, so it is kept on disk as raw RGB pixels,
+# keyed by a hash of the source file (plus a tag for the blend settings)
+# and the size. Later launches read the blob and wrap it with
+# pygame.image.frombuffer, which uses the bytes as the surface's pixels
+# without decoding or copying. Blobs for an older image or size are
+# deleted when a new one is written.
+#
+# LazyFont defers creating a font until it is first used, so fonts a
+# session never draws with (e.g. the profiler's monospace SysFont, which
+# scans the system's fonts) cost nothing at startup.
+
+CACHE_DIR = ".asset_cache"
+BLOB_SUFFIX = ".rgb"
+
+
+def _blob_path(cache_dir, source_path, digest, size):
+    stem = os.path.splitext(os.path.basename(source_path))[0]
+    return os.path.join(cache_dir, f"{stem}-{digest}-{size[0]}x{size[1]}{BLOB_SUFFIX}")
+
+
+def _prune(cache_dir, source_path, keep):
+    stem = os.path.splitext(os.path.basename(source_path))[0]
+    for name in os.listdir(cache_dir):
+        path = os.path.join(cache_dir, name)
+        if name.startswith(stem + "-") and name.endswith(BLOB_SUFFIX) and path != keep:
+            os.remove(path)
+
+
+def load_layer(source_path, size, blend, tag="", cache_dir=CACHE_DIR):
+    """Opaque surface blend(image scaled to size), from the cache when possible
+
+    blend(scaled) returns the finished layer; tag names its settings, so a
+    change to them builds a new blob. Returns None (with a warning) if the
+    image can't be read or decoded.
+    """
+    try:
+        with open(source_path, "rb") as f:
+            source = f.read()
+    except OSError as e:
+        print(f"Warning: can't read {source_path}: {e}")
+        return None
+    digest = hashlib.blake2b(source + tag.encode(), digest_size=12).hexdigest()
+    blob = _blob_path(cache_dir, source_path, digest, size)
+
+    try:
+        with open(blob, "rb") as f:
+            pixels = f.read()
+        if len(pixels) == size[0] * size[1] * 3:
+            return pygame.image.frombuffer(pixels, size, "RGB")  # shares pixels, keeps it alive
+        print(f"Warning: ignoring truncated asset cache {blob}")
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        print(f"Warning: can't read asset cache {blob}: {e}")
+
+    try:
+        image = pygame.image.load(source_path)
+    except pygame.error as e:
+        print(f"Warning: can't decode {source_path}: {e}")
+        return None
+    layer = blend(pygame.transform.scale(image, size))
+
+    # Write to a temporary name first, so a crash never leaves half a blob
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        with open(blob + ".tmp", "wb") as f:
+            f.write(pygame.image.tobytes(layer, "RGB"))
+        os.replace(blob + ".tmp", blob)
+        _prune(cache_dir, source_path, blob)
+    except OSError as e:
+        print(f"Warning: can't write asset cache {blob}: {e}")
+    return layer
+
+
+class LazyFont:
+    """A pygame font that is only created when first used"""
+
+    def __init__(self, name, size, sysfont=False):
+        self.name = name
+        self.size_px = size
+        self.sysfont = sysfont
+        self._font = None
+
+    def __getattr__(self, attr):
+        # Only reached for attributes of the real font (render, get_linesize, ...)
+        font = self._font
+        if font is None:
+            if self.sysfont:
+                font = pygame.font.SysFont(self.name, self.size_px)
+            else:
+                font = pygame.font.Font(self.name, self.size_px)
+            self._font = font
+        return getattr(font, attr)
@@ -0,0 +1,138 @@
+import argparse
+import gc
+import importlib
+import os
+import time
+import tracemalloc
+
+# ============================================
+# Steady-State Allocation Benchmark
+# ============================================
+# Runs a controller's main loop (run_frame()) headless, against a local
+# receiver emulator, and counts what it leaves allocated. CPython collects
+# generation 0 once net allocations of GC-tracked objects (containers)
+# pass a threshold, and those pauses show up as hitches in the loop. A
+# steady-state tick (no input, link up, labels unchanged) should leave no
+# tracked objects behind.
+#
+# After a warmup (text caches filled, link up, telemetry arriving) it runs
+# N ticks and reports:
+#   gc objects - net GC-tracked allocations per tick (from gc.get_count()
+#                and the collections during the run); the pass/fail number
+#   net        - tracemalloc growth per tick, with the source lines that
+#                grew. Includes objects parked on CPython's float/tuple
+#                free lists, which level off
+#   transient  - the most memory a tick had allocated at once beyond what
+#                it started with (Python objects only; SDL surface pixels
+#                are not traced)
+# The exit status is 1 if a UI leaves more than --max-objects per tick.
+#
+# The session recorder and packet analytics are off: both keep every
+# packet by design.
+#
+#   python bench_alloc.py                      # Controller.py and trial.py, 5000 ticks
+#   python bench_alloc.py --ui trial --ticks 20000 --top 10
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import pygame
+
+from receiver_emulator import ReceiverEmulator
+
+UIS = ("Controller", "trial")
+MAX_OBJECTS_PER_TICK = 0.01
+
+
+def run(name, ticks, warmup, top):
+    """Run one UI's main loop headless; returns (GC objects per tick, lines)"""
+    emulator = ReceiverEmulator(port=0).start()
+    ui = importlib.import_module(name)
+    ui.ESP_IP, ui.ESP_PORT = "127.0.0.1", emulator.port
+    ui.RECORD_DIR = None
+    ui.ANALYTICS = False
+    ui.METRICS_PORT = None
+    core = ui.core
+    core.open_network()
+    core.start()
+    ui.init_gui()
+    for _ in range(warmup):
+        ui.run_frame()
+
+    # A full collection also empties CPython's free lists; let the loop (and
+    # the sender thread's telemetry batches) refill them before counting
+    gc.collect()
+    telemetry = core.sender.telemetry
+    batches = telemetry.batches if telemetry is not None else 0
+    for _ in range(warmup):
+        ui.run_frame()
+    while telemetry is not None and telemetry.batches < batches + 2:
+        ui.run_frame()
+    collections = [stats["collections"] for stats in gc.get_stats()]
+    count = gc.get_count()[0]
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    start_bytes = tracemalloc.get_traced_memory()[0]
+    transient = 0  # bytes allocated and freed again within a tick, at their peak
+    worst = 0
+    t0 = time.perf_counter()
+    for _ in range(ticks):
+        tracemalloc.reset_peak()
+        current = tracemalloc.get_traced_memory()[0]
+        ui.run_frame()
+        peak = tracemalloc.get_traced_memory()[1] - current
+        transient += peak
+        worst = max(worst, peak)
+    elapsed = time.perf_counter() - t0
+    objects = gc.get_count()[0] - count
+    end_bytes = tracemalloc.get_traced_memory()[0]
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    collections = [stats["collections"] - n for stats, n in zip(gc.get_stats(), collections)]
+    objects += collections[0] * gc.get_threshold()[0]  # each gen 0 collection reset the count
+
+    core.close()
+    pygame.quit()
+    emulator.stop()
+
+    ignore = (tracemalloc.Filter(False, tracemalloc.__file__),
+              tracemalloc.Filter(False, "<frozen importlib._bootstrap>"))
+    diff = after.filter_traces(ignore).compare_to(before.filter_traces(ignore), "lineno")
+    blocks = sum(stat.count_diff for stat in diff)
+    lines = [f"{name}.py: {ticks} ticks in {elapsed:.2f}s ({elapsed / ticks * 1e6:.0f} us/tick), "
+             f"{core.sender.packets_sent} packets",
+             f"  gc objects: {objects / ticks:+.4f}/tick ({objects:+d} over the run)",
+             f"  net: {(end_bytes - start_bytes) / ticks:+.2f} bytes/tick, {blocks / ticks:+.4f} blocks/tick",
+             f"  transient peak: mean {transient / ticks:.0f} bytes/tick, worst {worst} bytes",
+             f"  GC collections during the run (gen 0/1/2): {'/'.join(map(str, collections))}"]
+    growth = [stat for stat in diff if stat.count_diff > 0][:top]
+    for stat in growth:
+        frame = stat.traceback[0]
+        lines.append(f"    {stat.count_diff:+6d} blocks {stat.size_diff:+8d} B  "
+                     f"{os.path.basename(frame.filename)}:{frame.lineno}")
+    return objects / ticks, lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Net allocations per steady-state main loop tick")
+    parser.add_argument("--ui", choices=UIS, action="append", help="UI to run (default: both)")
+    parser.add_argument("--ticks", type=int, default=5000)
+    parser.add_argument("--warmup", type=int, default=300, help="ticks before measuring")
+    parser.add_argument("--top", type=int, default=5, help="growing source lines to list")
+    parser.add_argument("--max-objects", type=float, default=MAX_OBJECTS_PER_TICK,
+                        help="fail above this many net GC-tracked allocations per tick")
+    args = parser.parse_args()
+
+    failed = []
+    for name in args.ui or UIS:
+        per_tick, lines = run(name, args.ticks, args.warmup, args.top)
+        print("\n".join(lines))
+        if per_tick > args.max_objects:
+            failed.append(name)
+    if failed:
+        print(f"FAIL: {', '.join(failed)} above {args.max_objects} GC objects/tick")
+        raise SystemExit(1)
+    print(f"OK: every UI at or below {args.max_objects} net GC objects/tick")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+import argparse
+import os
+import random
+import socket
+import threading
+import time
+
+# ============================================
+# Input-to-Wire Latency Benchmark
+# ============================================
+# Compares the two ways a key press can reach the wire, using the real
+# CommandSender against a local receiver emulator:
+#
+#   frame - the event queue is drained once per frame and the command is
+#           published for the sender's next tick (the old main loop)
+#   edge  - FrameClock hands each event over as it arrives, and the
+#           handler publishes and wakes the sender (the current main loop)
+#
+# A thread posts synthetic KEYDOWN/KEYUP events at random moments, stamped
+# with perf_counter_ns() at post time; the sender's input_latency
+# histogram measures from that stamp to sendto returning.
+#
+#   python bench_input_latency.py                  # 200 edges per mode, 30 FPS
+#   python bench_input_latency.py --fps 20 --draw-ms 8
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import pygame
+
+from frame_clock import FrameClock
+from keymap import Keymap
+from protocol import DEFAULT_SPEED
+from receiver_emulator import ReceiverEmulator
+from sender import CommandSender, MODE_CHANGE
+
+
+def post_edges(count, key, min_gap, max_gap, seed):
+    """Post alternating press/release events with their post time attached"""
+    rng = random.Random(seed)
+    for i in range(count):
+        time.sleep(rng.uniform(min_gap, max_gap))
+        event_type = pygame.KEYDOWN if i % 2 == 0 else pygame.KEYUP
+        pygame.event.post(pygame.event.Event(event_type, key=key, t_ns=time.perf_counter_ns()))
+    pygame.event.post(pygame.event.Event(pygame.QUIT))
+
+
+def run(mode, address, args):
+    """One session in mode 'frame' or 'edge'; returns the sender"""
+    keymap = Keymap()
+    key = pygame.K_w
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setblocking(False)
+    sender = CommandSender(sock, address, args.rate, mode=MODE_CHANGE)
+    state = {"mask": 0, "pending_ns": None, "running": True}
+
+    # Synthetic events don't touch pygame's key state, so the mask follows
+    # the events themselves
+    def handle_event(event):
+        if event.type == pygame.QUIT:
+            state["running"] = False
+        elif event.type in (pygame.KEYDOWN, pygame.KEYUP):
+            bit = keymap.key_bits[event.key]
+            state["mask"] = state["mask"] | bit if event.type == pygame.KEYDOWN else state["mask"] & ~bit
+            if mode == "edge":
+                sender.set_command(keymap.command(state["mask"]), DEFAULT_SPEED, event.t_ns)
+                sender.wake()
+            elif state["pending_ns"] is None:
+                state["pending_ns"] = event.t_ns
+
+    frame_clock = FrameClock(args.fps)
+    pygame_clock = pygame.time.Clock()
+    poster = threading.Thread(target=post_edges, args=(args.edges, key, args.min_gap, args.max_gap, args.seed),
+                              daemon=True)
+    sender.start()
+    poster.start()
+    while state["running"]:
+        for event in pygame.event.get():
+            handle_event(event)
+        sender.set_command(keymap.command(state["mask"]), DEFAULT_SPEED, state["pending_ns"])
+        state["pending_ns"] = None
+        time.sleep(args.draw_ms / 1000)  # stand-in for draw_ui + flip
+        if mode == "edge":
+            frame_clock.wait(handle_event)
+        else:
+            pygame_clock.tick(args.fps)
+    poster.join()
+    sender.stop()
+    sock.close()
+    return sender
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure input-to-wire latency, per frame vs on edges")
+    parser.add_argument("--edges", type=int, default=200, help="key edges per mode")
+    parser.add_argument("--fps", type=int, default=30)
+    parser.add_argument("--rate", type=int, default=100, help="sender rate in Hz")
+    parser.add_argument("--draw-ms", type=float, default=5.0, help="simulated render time per frame")
+    parser.add_argument("--min-gap", type=float, default=0.02)
+    parser.add_argument("--max-gap", type=float, default=0.08)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    pygame.init()
+    pygame.display.set_mode((64, 64))
+    emulator = ReceiverEmulator(port=0).start()
+    address = ("127.0.0.1", emulator.port)
+
+    print(f"{args.edges} key edges per mode, {args.fps} FPS, sender {args.rate} Hz, "
+          f"{args.draw_ms:g} ms simulated render")
+    results = {}
+    for mode in ("frame", "edge"):
+        sender = run(mode, address, args)
+        latency = sender.input_latency
+        results[mode] = latency
+        print(f"\n{mode}: {latency.count} edges sent, mean {latency.mean_ms():.2f} ms, "
+              f"p95 <= {latency.percentile_ms(0.95):g} ms, max {latency.max_ns / 1e6:.2f} ms "
+              f"({sender.wakeups} wakeups)")
+        print("\n".join(latency.format_lines()))
+
+    emulator.stop()
+    pygame.quit()
+    frame, edge = results["frame"], results["edge"]
+    if frame.count and edge.count:
+        print(f"\nMean input-to-wire latency: {frame.mean_ms():.2f} ms -> {edge.mean_ms():.2f} ms "
+              f"({frame.mean_ms() / edge.mean_ms():.0f}x lower)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,327 @@
+import argparse
+import json
+import os
+import platform
+import socket
+import time
+from array import array
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from protocol import (
+    PROTOCOL_VERSION, COMMAND_PACKET, FLAG_ACK_REQUEST, ASCII_PAYLOADS, CMD_STOP,
+    DEFAULT_SPEED, PacketEncoder, decode_ack, motor_pwm,
+)
+from receiver_emulator import ReceiverEmulator
+
+# ============================================
+# UDP Load Benchmark
+# ============================================
+# How many packets per second can the receiver path absorb, and how do
+# several controllers on the same network affect each other?
+#
+# N load generators (threads or processes) each send a packet mix at a
+# fixed rate against local receiver emulators - one per controller, or one
+# shared by all with --shared. The receivers are the emulator with two
+# additions: every drained packet is timestamped, and --service-us adds a
+# fixed per-packet cost to stand in for the ESP8266 being far slower than
+# this machine. --rcvbuf shrinks the socket buffer towards the few
+# packets lwIP holds.
+#
+# Per run it measures, per controller and in total:
+#   delivered  - packets the drain loop got, per second
+#   dropped    - sent but never drained (socket buffer overflow)
+#   queueing   - send to drained, for binary packets (matched by seq)
+#   rejected   - binary packets the decoder refused (stale/out of order)
+#   timeouts   - COMMAND_TIMEOUT stops on the receiver
+#   max drain  - most packets drained in one loop() pass
+#
+# Results go to JSON so runs of two controller versions can be compared:
+#
+#   python bench_udp.py --controllers 4 --rates 100,1000,5000 --json new.json
+#   python bench_udp.py --processes --shared --service-us 150 --ascii 0.2
+#   python bench_udp.py --compare old.json new.json
+
+START_DELAY = 0.3  # s for every generator to be ready before the common start
+DRAIN_GRACE = 0.3  # s after the last send before the receivers are stopped
+COMMAND_CYCLE = (1, 1, 1, 4, 4, 6, 2, 2, 0, 0)  # per-packet commands, repeating
+
+
+class InstrumentedReceiver(ReceiverEmulator):
+    """ReceiverEmulator that timestamps every packet its drain loop handles"""
+
+    def __init__(self, service_us=0.0, rcvbuf=None, **kwargs):
+        super().__init__(port=0, **kwargs)
+        self.service_ns = int(service_us * 1000)
+        self.rcvbuf = rcvbuf
+        self.arrivals = []  # (t_ns, source port, seq or -1 for ASCII)
+
+    def start(self):
+        super().start()
+        if self.rcvbuf:
+            self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self.rcvbuf)
+        return self
+
+    def handle_packet(self, data, address):
+        t_ns = time.perf_counter_ns()
+        binary = len(data) == COMMAND_PACKET.size and data[0] == PROTOCOL_VERSION
+        self.arrivals.append((t_ns, address[1], COMMAND_PACKET.unpack_from(data)[4] if binary else -1))
+        super().handle_packet(data, address)
+        if self.service_ns:
+            end = t_ns + self.service_ns
+            while time.perf_counter_ns() < end:
+                pass
+
+
+def generate_load(spec):
+    """One simulated controller; runs in a thread or a worker process"""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setblocking(False)
+    sock.bind(("127.0.0.1", 0))
+    address = tuple(spec["address"])
+    encoder = PacketEncoder()
+    period_ns = int(1e9 / spec["rate"])
+    count = int(spec["rate"] * spec["duration"])
+    ascii_every = round(1 / spec["ascii"]) if spec["ascii"] > 0 else 0
+    ack_every = round(1 / spec["ack"]) if spec["ack"] > 0 else 0
+    send_ns = array("q")     # per binary packet, in seq order, taken just before sendto
+    ack_ns = {}               # binary index -> ack time
+    pending_ack = {}          # seq -> binary index
+    buf = bytearray(64)
+    errors = 0
+    ascii_sent = 0
+
+    start_ns = spec["start_ns"]
+    while time.perf_counter_ns() < start_ns - 2_000_000:
+        time.sleep(0.001)
+    for i in range(count):
+        due = start_ns + i * period_ns
+        while True:
+            remaining = due - time.perf_counter_ns()
+            if remaining <= 0:
+                break
+            if remaining > 1_000_000:
+                time.sleep((remaining - 500_000) / 1e9)
+        cmd = COMMAND_CYCLE[i % len(COMMAND_CYCLE)]
+        if ascii_every and i % ascii_every == ascii_every - 1:
+            payload = ASCII_PAYLOADS[cmd]
+            ascii_sent += 1
+        else:
+            flags = FLAG_ACK_REQUEST if ack_every and len(send_ns) % ack_every == 0 else 0
+            payload = encoder.encode(cmd, *motor_pwm(cmd, DEFAULT_SPEED), flags)
+            if flags:
+                pending_ack[encoder.seq] = len(send_ns)
+        if payload is encoder.buffer:
+            send_ns.append(time.perf_counter_ns())
+        try:
+            sock.sendto(payload, address)
+        except OSError:
+            errors += 1
+        # Acks are read between sends, without ever blocking
+        while True:
+            try:
+                n = sock.recv_into(buf)
+            except (BlockingIOError, InterruptedError, ConnectionRefusedError):
+                break
+            seq = decode_ack(buf[:n])
+            index = pending_ack.pop(seq, None)
+            if index is not None:
+                ack_ns[index] = time.perf_counter_ns()
+    send_ns.append(time.perf_counter_ns())
+    sock.sendto(encoder.encode(CMD_STOP, 0, 0), address)
+    end_ns = time.perf_counter_ns()
+    time.sleep(DRAIN_GRACE / 2)  # late acks
+    while True:
+        try:
+            n = sock.recv_into(buf)
+        except (BlockingIOError, InterruptedError, ConnectionRefusedError):
+            break
+        index = pending_ack.pop(decode_ack(buf[:n]), None)
+        if index is not None:
+            ack_ns[index] = time.perf_counter_ns()
+    port = sock.getsockname()[1]
+    sock.close()
+    rtt_ns = sorted(ack_ns[i] - send_ns[i] for i in ack_ns)
+    return {
+        "port": port, "sent": len(send_ns) + ascii_sent, "binary": len(send_ns), "ascii": ascii_sent,
+        "send_errors": errors, "elapsed_s": (end_ns - start_ns) / 1e9,
+        "acks_requested": len(ack_ns) + len(pending_ack), "acks": len(ack_ns),
+        "rtt_ms": percentiles([x / 1e6 for x in rtt_ns]),
+        "send_ns": send_ns.tobytes(),
+    }
+
+
+def percentiles(sorted_values):
+    """mean/p50/p99/max of an already sorted list (None when empty)"""
+    if not sorted_values:
+        return None
+    n = len(sorted_values)
+    return {
+        "mean": sum(sorted_values) / n,
+        "p50": sorted_values[n // 2],
+        "p99": sorted_values[min(n - 1, int(0.99 * n))],
+        "max": sorted_values[-1],
+    }
+
+
+def queueing_delays(arrivals, send_ns_by_port):
+    """Send-to-drain delay (ms) of every binary packet, by source port"""
+    delays = {port: [] for port in send_ns_by_port}
+    epoch = {}
+    last_seq = {}
+    for t_ns, port, seq in arrivals:
+        sends = send_ns_by_port.get(port)
+        if sends is None or seq < 0:
+            continue
+        # Sequence numbers wrap every 65536 packets
+        if seq < last_seq.get(port, 0) - 0x8000:
+            epoch[port] = epoch.get(port, 0) + 1
+        last_seq[port] = seq
+        index = epoch.get(port, 0) * 0x10000 + seq - 1
+        if 0 <= index < len(sends):
+            delays[port].append((t_ns - sends[index]) / 1e6)
+    return delays
+
+
+def run(args, rate):
+    """One run at rate packets/s per controller; returns the result dict"""
+    receivers = [InstrumentedReceiver(args.service_us, args.rcvbuf, loop_interval=args.loop_interval)
+                 for _ in range(1 if args.shared else args.controllers)]
+    for receiver in receivers:
+        receiver.start()
+    start_ns = time.perf_counter_ns() + int(START_DELAY * 1e9)
+    specs = [{"address": ("127.0.0.1", receivers[0 if args.shared else i].port), "rate": rate,
+              "duration": args.duration, "ascii": args.ascii, "ack": args.ack, "start_ns": start_ns}
+             for i in range(args.controllers)]
+    pool = ProcessPoolExecutor if args.processes else ThreadPoolExecutor
+    with pool(max_workers=args.controllers) as executor:
+        controllers = list(executor.map(generate_load, specs))
+    time.sleep(DRAIN_GRACE)
+    for receiver in receivers:
+        receiver.stop()
+
+    send_ns_by_port = {}
+    for c in controllers:
+        sends = array("q")
+        sends.frombytes(c.pop("send_ns"))
+        send_ns_by_port[c["port"]] = sends
+    arrivals = [a for receiver in receivers for a in receiver.arrivals]
+    arrivals.sort()
+    delays = queueing_delays(arrivals, send_ns_by_port)
+    received = {}
+    for _, port, _ in arrivals:
+        received[port] = received.get(port, 0) + 1
+
+    duration = max(c["elapsed_s"] for c in controllers)
+    for c in controllers:
+        c["received"] = received.get(c["port"], 0)
+        c["dropped"] = c["sent"] - c["received"]
+        c["delivered_pps"] = c["received"] / c["elapsed_s"]
+        c["queueing_ms"] = percentiles(sorted(delays[c["port"]]))
+    all_delays = sorted(d for port_delays in delays.values() for d in port_delays)
+    sent = sum(c["sent"] for c in controllers)
+    total_received = sum(c["received"] for c in controllers)
+    return {
+        "rate_per_controller": rate,
+        "totals": {
+            "offered_pps": sent / duration,
+            "delivered_pps": total_received / duration,
+            "sent": sent,
+            "received": total_received,
+            "drop_rate": 1 - total_received / sent if sent else 0.0,
+            "queueing_ms": percentiles(all_delays),
+            "rejected": sum(r.decoder.out_of_order + r.decoder.stale + r.decoder.duplicates
+                            for r in receivers),
+            "timeouts": sum(r.timeouts for r in receivers),
+            "max_drain": max(r.max_drain for r in receivers),
+            "acks": sum(c["acks"] for c in controllers),
+            "acks_requested": sum(c["acks_requested"] for c in controllers),
+        },
+        "controllers": controllers,
+        "receivers": [{"port": r.port, "packets": r.packets_received, "accepted": r.decoder.accepted,
+                       "out_of_order": r.decoder.out_of_order, "stale": r.decoder.stale,
+                       "duplicates": r.decoder.duplicates,
+                       "timeouts": r.timeouts, "loops": r.loops, "max_drain": r.max_drain}
+                      for r in receivers],
+    }
+
+
+def format_run(result):
+    """One table row for a run"""
+    t = result["totals"]
+    q = t["queueing_ms"] or {"p50": 0, "p99": 0, "max": 0}
+    return (f"{result['rate_per_controller']:>7} {t['offered_pps']:9.0f} {t['delivered_pps']:9.0f} "
+            f"{t['drop_rate']:7.2%} {q['p50']:7.3f} {q['p99']:7.3f} {q['max']:8.2f} "
+            f"{t['rejected']:8} {t['timeouts']:8} {t['max_drain']:9}")
+
+
+HEADER = (" rate/c   offered  delivered   drop  q p50ms  q p99ms   q maxms  rejected  timeouts  max drain")
+
+
+def compare(old_path, new_path):
+    """Print the change in the key totals between two result files, by rate"""
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    print(f"{old.get('label') or old_path} -> {new.get('label') or new_path}")
+    old_runs = {r["rate_per_controller"]: r["totals"] for r in old["runs"]}
+    for run_result in new["runs"]:
+        rate = run_result["rate_per_controller"]
+        before, after = old_runs.get(rate), run_result["totals"]
+        if before is None:
+            print(f"  {rate}/s: not in {old_path}")
+            continue
+        q_before = (before["queueing_ms"] or {}).get("p99", 0.0)
+        q_after = (after["queueing_ms"] or {}).get("p99", 0.0)
+        print(f"  {rate:>6}/s per controller: delivered {before['delivered_pps']:.0f} -> "
+              f"{after['delivered_pps']:.0f}/s, drop {before['drop_rate']:.2%} -> {after['drop_rate']:.2%}, "
+              f"queueing p99 {q_before:.3f} -> {q_after:.3f} ms, "
+              f"timeouts {before['timeouts']} -> {after['timeouts']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="UDP load benchmark against the receiver emulator")
+    parser.add_argument("--controllers", type=int, default=1, help="simulated controllers")
+    parser.add_argument("--rates", default="100,500,1000,2000,5000",
+                        help="comma-separated packets/s per controller, one run each")
+    parser.add_argument("--duration", type=float, default=3.0, help="seconds per run")
+    parser.add_argument("--processes", action="store_true", help="controllers as processes instead of threads")
+    parser.add_argument("--shared", action="store_true", help="all controllers send to one receiver")
+    parser.add_argument("--ascii", type=float, default=0.0, help="fraction of ASCII packets in the mix")
+    parser.add_argument("--ack", type=float, default=0.0, help="fraction of binary packets asking for an ack")
+    parser.add_argument("--service-us", type=float, default=0.0, help="per-packet receiver cost to emulate")
+    parser.add_argument("--rcvbuf", type=int, help="receiver socket buffer in bytes")
+    parser.add_argument("--loop-interval", type=float, default=0.001, help="receiver loop() idle wait, s")
+    parser.add_argument("--json", help="save the results here")
+    parser.add_argument("--label", help="name for this run in --json (e.g. the controller version)")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="compare two result files")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+    if not 0 <= args.ascii <= 1 or not 0 <= args.ack <= 1:
+        parser.error("--ascii and --ack are fractions between 0 and 1")
+    rates = [int(r) for r in args.rates.split(",")]
+
+    print(f"{args.controllers} controller(s) as {'processes' if args.processes else 'threads'}, "
+          f"{'one shared receiver' if args.shared else 'one receiver each'}, {args.duration:g}s per run, "
+          f"ASCII {args.ascii:.0%}, acks {args.ack:.0%}, service {args.service_us:g} us/packet")
+    print(HEADER)
+    runs = []
+    for rate in rates:
+        result = run(args, rate)
+        runs.append(result)
+        print(format_run(result))
+
+    if args.json:
+        config = {k: v for k, v in vars(args).items() if k not in ("json", "compare", "label")}
+        with open(args.json, "w") as f:
+            json.dump({"label": args.label, "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+                       "host": platform.node(), "python": platform.python_version(),
+                       "cpus": os.cpu_count(), "config": config, "runs": runs}, f, indent=1)
+        print(f"Saved to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
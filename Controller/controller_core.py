@@ -0,0 +1,319 @@
+import socket
+import time
+
+import pygame
+
+from protocol import (
+    PROTO_BINARY, CMD_STOP, CMD_DRIVE, COMMAND_NAMES, DEFAULT_SPEED, SPEED_STEP, clamp_speed,
+)
+from analytics import open_store, print_report
+from discovery import open_finder, target_text
+from gamepad import open_gamepad
+from keymap import Keymap
+from link_manager import report_lines
+from maneuvers import ManeuverRunner
+from metrics_server import ControllerMetrics, open_metrics_server
+from profiler import FrameProfiler, P_EVENTS, P_INPUT, P_SEND
+from recorder import SessionRecorder, session_path
+from sender import CommandSender
+
+# ============================================
+# Controller Core
+# ============================================
+# Everything the windowed controllers (Controller.py, trial.py) do apart
+# from drawing: finding the bot, the socket, sender, maneuver runner and
+# metrics endpoint, turning pygame events and the key state into commands,
+# and the startup and end-of-session reports. Each UI keeps its own
+# CONFIGURATION block and drawing code, and reads what it shows
+# (current_command, current_speed, input_mask, sender, link_labels()) from
+# one ControllerCore.
+#
+# config is the UI module itself: its constants are read when they are
+# used (PROFILE at construction, the network ones in open_network()), so a
+# benchmark can change them after importing the UI.
+#
+#   core = ControllerCore(sys.modules[__name__])
+#   core.open_network(); core.start(); core.open_gamepad()
+#   while core.running:
+#       core.process_input()   # events, key resync, publish
+#       ...draw...
+#       clock.wait(core.handle_event)
+#   core.close(); core.print_report()
+
+
+class ControllerCore:
+    """Input, command publishing and network setup shared by the windowed UIs"""
+
+    def __init__(self, config):
+        self.config = config
+        self.keymap = Keymap()
+        self.profiler = FrameProfiler(enabled=config.PROFILE)
+        self.metrics = ControllerMetrics()  # frame and command numbers for the metrics endpoint
+
+        self.current_command = "STOPPED"
+        self.current_speed = DEFAULT_SPEED
+        self.input_mask = 0  # held directions, shared by sender and renderer
+        self.last_command = None
+        self.stick_moving = False
+        self.gamepad = None
+        self.running = True
+        self.command_history = []
+        self.max_history = 10
+
+        self.sock = None
+        self.sender = None
+        self.maneuvers = None
+        self.metrics_server = None
+        self.finder = None
+        self._link_label_cache = (None, ("RTT: off", ""))  # (snapshot, labels made from it)
+
+    # ----- Setup and teardown -----
+
+    def open_network(self):
+        """Find the bot, open the UDP socket, the command sender, the maneuver runner and the metrics endpoint"""
+        config = self.config
+        address = None
+        if config.ESP_IP is not None:
+            address = (config.ESP_IP, config.ESP_PORT)  # pinned: never retargeted
+        else:
+            self.finder = open_finder(config.ESP_PORT, config.BOT_CACHE)
+            if self.finder is not None:
+                address = self.finder.resolve()  # None until a bot answers
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setblocking(False)  # acks are read without ever blocking
+        recorder = SessionRecorder(session_path(config.RECORD_DIR)) if config.RECORD_DIR else None
+        self.sender = CommandSender(self.sock, address, config.SEND_RATE,
+                                    mode=config.SEND_MODE, heartbeat_interval=config.HEARTBEAT_INTERVAL,
+                                    protocol=config.PROTOCOL, ack=config.ACK_MODE, recorder=recorder,
+                                    analytics=open_store() if config.ANALYTICS else None,
+                                    adaptive=config.ADAPTIVE_LINK, telemetry=config.TELEMETRY)
+        self.maneuvers = ManeuverRunner(self.sender)
+        if self.finder is not None:
+            self.finder.follow(self.sender)  # moves the sender along if the bot's address changes
+        if config.METRICS_PORT:
+            self.metrics_server = open_metrics_server(self.sender, self.metrics, port=config.METRICS_PORT)
+
+    def start(self):
+        """Start the sender and maneuver threads"""
+        self.sender.start()
+        self.maneuvers.start()
+
+    def open_gamepad(self):
+        """Connect the configured gamepad, if any (binary protocol only)"""
+        if self.config.PROTOCOL == PROTO_BINARY:
+            self.gamepad = open_gamepad(self.config.GAMEPAD_INDEX, self.current_speed)
+
+    def close(self):
+        """Stop the car and every thread, then close the sockets"""
+        if self.sender is not None:
+            self.maneuvers.stop()
+            self.sender.stop(final=CMD_STOP)  # Stop car before exiting
+            self.sock.close()
+        if self.metrics_server is not None:
+            self.metrics_server.stop()
+        if self.finder is not None:
+            self.finder.stop()
+
+    # ----- Reports -----
+
+    def print_banner(self, title):
+        """The startup block: target, rates, gamepad and configuration problems"""
+        config = self.config
+        sender = self.sender
+        print("=" * 60)
+        print(title)
+        print("=" * 60)
+        print(target_text(sender.address))
+        if self.finder is not None:
+            print(self.finder.summary())
+        print(f"Send rate: {config.SEND_RATE} Hz ({config.SEND_MODE})  |  Frame rate: {config.FPS} FPS")
+        if self.gamepad is not None:
+            print(f"Gamepad: {self.gamepad.name}")
+        for problem in self.keymap.problems:
+            print(f"Warning: keymap: {problem}")
+        for key, name in config.MANEUVER_KEYS.items():
+            if key in self.keymap.key_bits or key in self.keymap.key_actions:
+                print(f"Warning: maneuver {name} key {pygame.key.name(key)} is also bound in the keymap")
+        print("=" * 60)
+        if self.metrics_server is not None:
+            print(f"Metrics: http://{self.metrics_server.address[0]}:{self.metrics_server.address[1]}/metrics")
+
+    def print_report(self):
+        """Print how many packets the transmit mode sent and saved, and save the profile"""
+        sender = self.sender
+        stats = sender.session_stats()
+        print(f"\nSession: {stats['elapsed_s']:.1f}s in {stats['mode']} mode")
+        print(f"  Sent: {stats['packets_sent']}  "
+              f"(changes: {stats['changes']}, heartbeats: {stats['heartbeats']})")
+        print(f"  Saved vs streaming every tick: {stats['saved_vs_stream']} "
+              f"of {stats['stream_equivalent']}")
+        print(f"  Saved vs old per-frame sending: {stats['saved_vs_legacy']} "
+              f"of {stats['legacy_per_frame']}")
+        for line in report_lines(stats):
+            print(f"  {line}")
+        if sender.telemetry is not None:
+            for line in sender.telemetry.report_lines(stats["elapsed_s"]):
+                print(f"  {line}")
+        latency = sender.input_latency
+        if latency.count:
+            print(f"  Input-to-wire latency: {latency.count} edges, mean {latency.mean_ms():.2f} ms, "
+                  f"p95 <= {latency.percentile_ms(0.95):g} ms, max {latency.max_ns / 1e6:.2f} ms")
+            print("\n".join(latency.format_lines()))
+        if sender.recorder is not None:
+            print(f"  Recorded {sender.recorder.records} packets to {sender.recorder.path}")
+        if sender.analytics is not None:
+            print_report(sender.analytics)
+        profiler = self.profiler
+        if profiler.frames:
+            rows = profiler.save_csv(self.config.PROFILE_CSV)
+            print(f"  Profiled {profiler.frames} frames, last {rows} saved to {self.config.PROFILE_CSV}")
+
+    def link_labels(self):
+        """RTT percentiles and loss labels for the UI (formatted once per snapshot)"""
+        if self.sender.link is None:
+            return self._link_label_cache[1]
+        snapshot = self.sender.link.snapshot()
+        if snapshot is not self._link_label_cache[0]:
+            p50, p95, p99, loss = snapshot
+            rtt = "RTT: --" if p50 is None else f"RTT {p50:.1f}/{p95:.1f}/{p99:.1f}ms"
+            loss_text = "" if loss is None else f"  (loss {loss:.1%})"
+            self._link_label_cache = (snapshot, (rtt, loss_text))
+        return self._link_label_cache[1]
+
+    def log_command(self, cmd, description):
+        """Add command to history"""
+        self.command_history.append(f"{description}")
+        if len(self.command_history) > self.max_history:
+            self.command_history.pop(0)
+
+    # ----- Input -----
+
+    def send_command(self, command, input_ns=None):
+        """Publish the current command; the sender thread puts it on the wire"""
+        self.sender.set_command(command, self.current_speed, input_ns)
+        self.metrics.set_command(command, self.current_speed)
+
+    def publish_input(self, input_ns=None):
+        """Pick the command from input_mask (or the stick) and hand it to the sender
+
+        With input_ns (an input edge) the sender is woken to send it right away.
+        """
+        # A running maneuver owns the sender until it ends or is cancelled
+        maneuvers = self.maneuvers
+        if maneuvers.active is not None:
+            self.current_command = maneuvers.label()
+            step = maneuvers.step
+            if step is not None:
+                self.metrics.set_command(*step)
+            return
+        command = self.keymap.command(self.input_mask)
+
+        # Analog stick drives when the keyboard is idle
+        drive = None
+        if self.gamepad is not None and command == CMD_STOP:
+            drive = self.gamepad.read()
+            if drive == (0, 0):
+                drive = None
+        self.stick_moving = drive is not None
+
+        if drive is not None:
+            self.sender.set_drive(*drive, input_ns=input_ns)
+            command = CMD_DRIVE
+            self.metrics.set_command(command, self.current_speed)
+        else:
+            self.send_command(command, input_ns)
+        if input_ns is not None:
+            self.sender.wake()
+
+        command_name = COMMAND_NAMES[command]
+        self.current_command = command_name if drive is None else f"DRIVE {drive[0]}/{drive[1]}"
+        # Only log and print when command changes to reduce console spam
+        if command != self.last_command:
+            self.log_command(command, command_name)
+            print(f"→ {command_name}")
+        self.last_command = command
+
+    def handle_event(self, event):
+        """Handle one pygame event; input edges are sent immediately"""
+        keymap = self.keymap
+        gamepad = self.gamepad
+        if event.type == pygame.QUIT:
+            self.running = False
+
+        # Direction keys: new mask, straight to the wire
+        elif event.type in (pygame.KEYDOWN, pygame.KEYUP) and event.key in keymap.key_bits:
+            input_ns = time.perf_counter_ns()
+            if event.type == pygame.KEYDOWN and self.maneuvers.active is not None:
+                self.maneuvers.cancel()
+                print("Maneuver cancelled")
+            self.input_mask = keymap.mask(pygame.key.get_pressed())
+            self.publish_input(input_ns)
+
+        # Timed maneuvers run on their own thread
+        elif event.type == pygame.KEYDOWN and event.key in self.config.MANEUVER_KEYS:
+            name = self.config.MANEUVER_KEYS[event.key]
+            self.maneuvers.run(name)
+            self.log_command(name, f"Maneuver {name}")
+            print(f"→ Maneuver {name}")
+
+        # Speed control on key press
+        elif event.type == pygame.KEYDOWN:
+            action = keymap.edge_action(event.key)
+            if action == "faster" or action == "slower":
+                input_ns = time.perf_counter_ns()
+                step = SPEED_STEP if action == "faster" else -SPEED_STEP
+                self.current_speed = clamp_speed(self.current_speed + step)
+                if gamepad is not None:
+                    gamepad.mixer.set_max_pwm(self.current_speed)
+                self.publish_input(input_ns)
+                self.log_command("+" if step > 0 else "-",
+                                 f"Speed {'increased' if step > 0 else 'decreased'} to {self.current_speed}")
+            elif action == "quit":
+                self.running = False
+            elif action == "profiler":
+                print(f"Profiler {'on' if self.profiler.toggle() else 'off'}")
+            elif action == "analytics":
+                if self.sender.analytics is not None:
+                    print_report(self.sender.analytics)
+                else:
+                    print("Packet analytics disabled")
+
+        # Stick leaving or returning to centre is an edge; moves in between
+        # go out at the send rate
+        elif event.type == pygame.JOYAXISMOTION and gamepad is not None \
+                and event.instance_id == gamepad.instance_id and self.input_mask == 0:
+            if (gamepad.read() != (0, 0)) != self.stick_moving:
+                self.publish_input(time.perf_counter_ns())
+
+        # Gamepad hot-plug
+        elif event.type == pygame.JOYDEVICEADDED and gamepad is None \
+                and self.config.PROTOCOL == PROTO_BINARY:
+            self.gamepad = open_gamepad(self.config.GAMEPAD_INDEX, self.current_speed)
+            if self.gamepad is not None:
+                print(f"Gamepad connected: {self.gamepad.name}")
+        elif event.type == pygame.JOYDEVICEREMOVED and gamepad is not None \
+                and event.instance_id == gamepad.instance_id:
+            self.gamepad = None
+            print("Gamepad disconnected")
+
+    def process_input(self):
+        """The input half of a frame: events, key resync and publishing the command"""
+        profiler = self.profiler
+        profiler.begin_frame()
+        self.metrics.frame(time.perf_counter_ns())
+
+        # Event handling (most events were already handled in clock.wait)
+        for event in pygame.event.get():
+            self.handle_event(event)
+        profiler.mark(P_EVENTS)
+
+        # Resync with the key state, e.g. after a lost KEYUP: every frame while
+        # a key is held, every KEY_RESYNC_FRAMES otherwise (get_pressed() builds
+        # a 512-entry tuple per call)
+        if self.input_mask or self.metrics.frames % self.config.KEY_RESYNC_FRAMES == 0:
+            self.input_mask = self.keymap.mask(pygame.key.get_pressed())
+        profiler.mark(P_INPUT)
+
+        # Publish the command; the sender thread streams it at SEND_RATE
+        self.publish_input()
+        profiler.mark(P_SEND)
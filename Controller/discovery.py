@@ -0,0 +1,330 @@
+import argparse
+import json
+import os
+import random
+import selectors
+import socket
+import threading
+import time
+from collections import namedtuple
+
+from protocol import CAP_ASCII, CAP_BINARY, CAP_ACK, CAP_TELEMETRY, encode_probe, decode_hello
+
+# ============================================
+# Bot Discovery
+# ============================================
+# Finds receivers on the LAN instead of relying on a hardcoded ESP_IP.
+# discover() sends a probe (see protocol.py) to the broadcast address, or
+# to any list of targets, and reads every hello from one non-blocking
+# socket through a selector, so any number of bots answering at once costs
+# a single wait. Its time is bounded: it returns DISCOVERY_SETTLE after the
+# first reply (bots on one LAN answer within a few ms of each other), as
+# soon as the bot it was asked for answers, or at the timeout if nobody
+# does. Until the first reply (or the wanted bot's) the probe is repeated
+# every PROBE_RETRY in case one is lost; each attempt has its own nonce, so a bot's RTT is
+# measured against the probe it answered.
+#
+# The bot last used, and where it was, is kept in a small JSON cache
+# (BOT_CACHE). BotFinder.resolve() returns the cached address without
+# touching the network, so the first command goes out immediately; only a
+# first launch waits for discover(). BotFinder.follow(sender) then
+# revalidates in the background: every REVALIDATE_INTERVAL it probes the
+# sender's address, and if the bot no longer answers there (e.g. DHCP gave
+# it a new address) or another bot does, it broadcasts for the bot's ID
+# and points the sender at the new address. Rebinding sender.address is
+# atomic, so the sender thread never waits on the finder. If nothing answers
+# at launch, sender.address stays None (nothing is sent) until a bot does.
+#
+# Discovery only runs when no address is configured (ESP_IP = None, or
+# headless --ip auto). A configured address is pinned: no finder runs, so
+# neither the cache nor a probe can ever move the sender away from it. A
+# relay hub (relay_hub.py) answers probes on its operator ports for the bot
+# behind it, so a discovered hub is kept like any bot.
+#
+#   python discovery.py                          # list bots on the LAN
+#   python discovery.py --target 127.0.0.1:4210  # probe one address (e.g. an emulator)
+
+DISCOVERY_PORT = 4210  # receivers answer probes on their command port
+BROADCAST = "255.255.255.255"
+BOT_CACHE = ".bot_cache.json"
+DISCOVERY_TIMEOUT = 0.5  # s, longest a discovery waits when nobody answers
+DISCOVERY_SETTLE = 0.05  # s after the first reply to hear from other bots
+PROBE_RETRY = 0.1  # s between probes until the first reply
+PROBE_TIMEOUT = 0.2  # s to wait for the current address during revalidation
+REVALIDATE_INTERVAL = 2.0  # s between checks while the bot answers
+SEARCH_INTERVAL = 0.5  # s between searches while it doesn't
+
+CAP_NAMES = ((CAP_BINARY, "binary"), (CAP_ACK, "ack"), (CAP_TELEMETRY, "telemetry"),
+             (CAP_ASCII, "ascii"))
+
+Bot = namedtuple("Bot", "bot_id name caps host port rtt_ms")
+
+
+def caps_text(caps):
+    """Capability bits as e.g. 'binary+ack+telemetry+ascii'"""
+    return "+".join(name for bit, name in CAP_NAMES if caps & bit) or "none"
+
+
+def describe(bot):
+    """One line naming a bot and where it is"""
+    rtt = "" if bot.rtt_ms is None else f", {bot.rtt_ms:.1f} ms"
+    return f"{bot.name} ({bot.bot_id:08x}) at {bot.host}:{bot.port} [{caps_text(bot.caps)}{rtt}]"
+
+
+def target_text(address):
+    """The banners' target line; address is None while discovery is searching"""
+    if address is None:
+        return "Target: searching (no bot answered yet)"
+    return f"Target: {address[0]}:{address[1]}"
+
+
+def open_socket():
+    """Non-blocking UDP socket that may send to the broadcast address"""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+    sock.setblocking(False)
+    return sock
+
+
+def _drain(sock, buf, sent, found, now):
+    # Read every pending hello; the first one per bot ID counts
+    while True:
+        try:
+            n, address = sock.recvfrom_into(buf)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            # e.g. ICMP port unreachable from a target with no receiver
+            continue
+        hello = decode_hello(buf[:n])
+        if hello is None or hello.nonce not in sent or hello.bot_id in found:
+            continue
+        rtt_ms = (now - sent[hello.nonce]) * 1000
+        found[hello.bot_id] = Bot(hello.bot_id, hello.name, hello.caps,
+                                  address[0], address[1], rtt_ms)
+
+
+def discover(sock, targets, timeout=DISCOVERY_TIMEOUT, want=None, settle=DISCOVERY_SETTLE):
+    """Probe every target at once; returns (bots by RTT, seconds taken)
+
+    With want (a bot ID) it returns as soon as that bot answers.
+    """
+    buf = bytearray(64)
+    sent = {}  # nonce -> perf_counter() when that probe went out
+    found = {}
+    selector = selectors.DefaultSelector()
+    selector.register(sock, selectors.EVENT_READ)
+    start = time.perf_counter()
+    deadline = start + timeout
+    next_probe = start
+    try:
+        while True:
+            now = time.perf_counter()
+            if now >= deadline:
+                break
+            probing = want is not None or not found
+            if probing and now >= next_probe:
+                nonce = random.getrandbits(32)
+                probe = encode_probe(nonce)
+                sent[nonce] = now
+                for target in targets:
+                    try:
+                        sock.sendto(probe, target)
+                    except OSError:
+                        pass  # no route to one target doesn't stop the others
+                next_probe = now + PROBE_RETRY
+            wake = min(deadline, next_probe) if probing else deadline
+            if selector.select(max(0.0, wake - now)):
+                first = not found
+                now = time.perf_counter()
+                _drain(sock, buf, sent, found, now)
+                if want is not None and want in found:
+                    break
+                if first and found and want is None:
+                    deadline = min(deadline, now + settle)
+    finally:
+        selector.close()
+    elapsed = time.perf_counter() - start
+    return sorted(found.values(), key=lambda bot: bot.rtt_ms), elapsed
+
+
+def load_cache(path):
+    """The bot cache, or an empty one if the file is missing or unreadable"""
+    try:
+        with open(path) as f:
+            cache = json.load(f)
+        if isinstance(cache, dict) and isinstance(cache.get("bots"), dict):
+            return cache
+        print(f"Warning: ignoring malformed bot cache {path}")
+    except FileNotFoundError:
+        pass
+    except (OSError, ValueError) as e:
+        print(f"Warning: can't read bot cache {path}: {e}")
+    return {"last": None, "bots": {}}
+
+
+def remember(cache, bot):
+    """Make bot the cache's last bot; True if that changed anything"""
+    key = f"{bot.bot_id:08x}"
+    entry = {"name": bot.name, "caps": bot.caps, "host": bot.host, "port": bot.port}
+    if cache.get("last") == key and cache["bots"].get(key) == entry:
+        return False
+    cache["last"] = key
+    cache["bots"][key] = entry
+    return True
+
+
+def save_cache(path, cache):
+    """Write the cache to a temporary name first, so a crash never truncates it"""
+    try:
+        with open(path + ".tmp", "w") as f:
+            json.dump(cache, f, indent=2)
+        os.replace(path + ".tmp", path)
+    except OSError as e:
+        print(f"Warning: can't write bot cache {path}: {e}")
+
+
+class BotFinder:
+    """Picks the bot to drive (cache first) and follows it if its address changes"""
+
+    def __init__(self, sock, port=DISCOVERY_PORT, cache_path=BOT_CACHE, targets=None,
+                 timeout=DISCOVERY_TIMEOUT, interval=REVALIDATE_INTERVAL):
+        self.sock = sock
+        self.port = port
+        self.cache_path = cache_path
+        self.targets = list(targets or [(BROADCAST, port)])
+        self.timeout = timeout
+        self.interval = interval
+        self.cache = load_cache(cache_path) if cache_path else {"last": None, "bots": {}}
+        self.bot = None          # Bot being driven, once known
+        self.source = None       # "cache" or "discovery"
+        self.answered = 0        # bots that answered the last discovery
+        self.discovery_s = None  # how long the last discovery took
+        self.moves = 0
+        self.sender = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def resolve(self):
+        """Address to drive: the cached bot at once, else the fastest to answer; None if neither"""
+        last = self.cache.get("last")
+        entry = self.cache["bots"].get(last)
+        if entry is not None:
+            self.bot = Bot(int(last, 16), entry["name"], entry["caps"],
+                           entry["host"], entry["port"], None)
+            self.source = "cache"
+            return self.bot.host, self.bot.port
+        bots = self._search(None)
+        if not bots:
+            return None
+        self._use(bots[0])
+        self.source = "discovery"
+        return self.bot.host, self.bot.port
+
+    def summary(self):
+        """One line on where the target came from"""
+        if self.bot is None:
+            return (f"Discovery: no bot answered in {self.discovery_s * 1000:.0f} ms, "
+                    f"still searching")
+        if self.source == "cache":
+            return f"Discovery: {describe(self.bot)} from {self.cache_path}, revalidating"
+        return (f"Discovery: {describe(self.bot)}, {self.answered} bot(s) answered "
+                f"in {self.discovery_s * 1000:.0f} ms")
+
+    def follow(self, sender):
+        """Revalidate sender.address in the background, retargeting it if the bot moves"""
+        self.sender = sender
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="bot-finder", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop revalidating and close the socket"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.sock.close()
+
+    def _run(self):
+        while not self._stop.is_set():
+            found = self._revalidate()
+            self._stop.wait(self.interval if found else SEARCH_INTERVAL)
+
+    def _revalidate(self):
+        # Cheap check first: is our bot still at the sender's address?
+        address = self.sender.address
+        want = None if self.bot is None else self.bot.bot_id
+        bot = None
+        if address is not None:
+            bots, _ = discover(self.sock, [address], PROBE_TIMEOUT, want=want)
+            bot = next((bot for bot in bots if want is None or bot.bot_id == want), None)
+        if bot is None:
+            # Gone from there: ask everyone (for any bot if we never had one)
+            bots = self._search(want)
+            bot = next((bot for bot in bots if want is None or bot.bot_id == want), None)
+            if bot is None:
+                return False
+        if address is None:
+            print(f"Discovery: {describe(bot)}")
+            self.sender.address = (bot.host, bot.port)
+        elif (bot.host, bot.port) != address:
+            print(f"Discovery: {describe(bot)}, moved from {address[0]}:{address[1]}")
+            self.sender.address = (bot.host, bot.port)
+            self.moves += 1
+        self._use(bot)
+        return True
+
+    def _search(self, want):
+        bots, self.discovery_s = discover(self.sock, self.targets, self.timeout, want=want)
+        self.answered = len(bots)
+        return bots
+
+    def _use(self, bot):
+        # The cache is only written when something changed
+        self.bot = bot
+        if remember(self.cache, bot) and self.cache_path:
+            save_cache(self.cache_path, self.cache)
+
+
+def open_finder(port=DISCOVERY_PORT, cache_path=BOT_CACHE, targets=None):
+    """BotFinder on its own socket, or None (with a warning) if it can't open one"""
+    try:
+        sock = open_socket()
+    except OSError as e:
+        print(f"Warning: bot discovery unavailable ({e})")
+        return None
+    return BotFinder(sock, port, cache_path, targets)
+
+
+def parse_target(text):
+    """'host[:port]' -> (host, port)"""
+    host, _, port = text.partition(":")
+    return host, int(port) if port else DISCOVERY_PORT
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Find RC car receivers on the LAN")
+    parser.add_argument("--target", type=parse_target, action="append",
+                        help="host[:port] to probe (default: broadcast on port 4210)")
+    parser.add_argument("--timeout", type=float, default=DISCOVERY_TIMEOUT)
+    parser.add_argument("--save", action="store_true",
+                        help=f"remember the fastest bot in {BOT_CACHE} for the controllers")
+    args = parser.parse_args()
+
+    sock = open_socket()
+    bots, elapsed = discover(sock, args.target or [(BROADCAST, DISCOVERY_PORT)], args.timeout)
+    sock.close()
+    print(f"{len(bots)} bot(s) answered in {elapsed * 1000:.1f} ms")
+    for bot in bots:
+        print(f"  {describe(bot)}")
+    if args.save and bots:
+        cache = load_cache(BOT_CACHE)
+        remember(cache, bots[0])
+        save_cache(BOT_CACHE, cache)
+        print(f"Saved {bots[0].name} to {BOT_CACHE}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,34 @@
+import time
+
+import pygame
+
+# ============================================
+# Frame Clock
+# ============================================
+# Stands in for pygame.time.Clock.tick(): it paces frames on an absolute
+# schedule, but instead of sleeping out the rest of the frame it waits on
+# the event queue and hands every event to the handler the moment it
+# arrives. A key press is then dispatched within about a millisecond,
+# instead of sitting in the queue until the next frame polls it.
+
+class FrameClock:
+    """Frame pacing that keeps handling input while it waits"""
+
+    def __init__(self, fps):
+        self.period = 1.0 / fps
+        self._next_frame = time.perf_counter()
+
+    def wait(self, handle_event):
+        """Handle events as they arrive until the next frame is due"""
+        self._next_frame += self.period
+        now = time.perf_counter()
+        if self._next_frame < now:
+            self._next_frame = now  # fell behind: don't burst to catch up
+            return
+        while True:
+            remaining = self._next_frame - time.perf_counter()
+            if remaining <= 0:
+                return
+            event = pygame.event.wait(max(1, int(remaining * 1000)))
+            if event.type != pygame.NOEVENT:
+                handle_event(event)
@@ -0,0 +1,133 @@
+from array import array
+
+import pygame
+
+from protocol import MIN_SPEED, MAX_SPEED
+
+# ============================================
+# Analog Gamepad Input
+# ============================================
+# Turns a stick into continuous left/right motor PWM (arcade drive:
+# left = throttle + turn, right = throttle - turn, rescaled so neither side
+# saturates). Deadzone, expo curve, rescaling and the motor start-up floor
+# are all baked into one table per top speed; each tick is two index
+# computations and a single lookup.
+#
+# The shaped and rescaled stick grid is computed once per process; each
+# table is just that grid scaled to one speed's PWM, kept as a flat
+# array('h') of interleaved left/right values (~66 KB per speed). Both are
+# built on first use and shared by every DriveMixer, so connecting a pad
+# (also on hot-plug, on the UI thread) costs the grid and one table, about
+# 25 ms, and each speed the +/- keys reach costs ~13 ms once per process;
+# after that a speed change, or another pad, is only a dict lookup.
+
+AXIS_STEPS = 64  # table resolution per half-axis (129 x 129 entries)
+DEFAULT_DEADZONE = 0.08
+DEFAULT_EXPO = 0.3
+
+
+def shape_axis(value, deadzone, expo):
+    """Deadzone then expo curve, keeping -1..1"""
+    magnitude = abs(value)
+    if magnitude <= deadzone:
+        return 0.0
+    x = (magnitude - deadzone) / (1.0 - deadzone)
+    x = expo * x ** 3 + (1.0 - expo) * x
+    return x if value > 0 else -x
+
+
+def build_mix_grid(deadzone=DEFAULT_DEADZONE, expo=DEFAULT_EXPO, steps=AXIS_STEPS):
+    """Interleaved left/right outputs in -1..1 for every quantized (throttle, turn) pair"""
+    size = 2 * steps + 1
+    shaped = [shape_axis((i - steps) / steps, deadzone, expo) for i in range(size)]
+    grid = []
+    for throttle in shaped:
+        for turn in shaped:
+            left = throttle + turn
+            right = throttle - turn
+            scale = max(1.0, abs(left), abs(right))
+            grid += (left / scale, right / scale)
+    return grid
+
+
+def build_mix_table(max_pwm, grid, min_pwm=MIN_SPEED):
+    """The grid as interleaved left/right PWM for top speed max_pwm"""
+    min_pwm = min(min_pwm, max_pwm)
+    span = max_pwm - min_pwm
+    # BO motors don't turn below MIN_SPEED, so any non-zero output starts there
+    return array("h", [0 if value == 0 else round(min_pwm + value * span) if value > 0
+                       else -round(min_pwm - value * span) for value in grid])
+
+
+_grids = {}   # (deadzone, expo, steps) -> grid
+_tables = {}  # (deadzone, expo, steps, max_pwm) -> table
+
+
+def mix_table(max_pwm, deadzone=DEFAULT_DEADZONE, expo=DEFAULT_EXPO, steps=AXIS_STEPS):
+    """The shared table for these settings, built on first use"""
+    key = (deadzone, expo, steps, max_pwm)
+    table = _tables.get(key)
+    if table is None:
+        grid = _grids.get(key[:3])
+        if grid is None:
+            grid = _grids[key[:3]] = build_mix_grid(deadzone, expo, steps)
+        table = _tables[key] = build_mix_table(max_pwm, grid)
+    return table
+
+
+class DriveMixer:
+    """Lookup-table differential-drive mixer"""
+
+    def __init__(self, deadzone=DEFAULT_DEADZONE, expo=DEFAULT_EXPO, steps=AXIS_STEPS,
+                 max_pwm=MAX_SPEED):
+        self.deadzone = deadzone
+        self.expo = expo
+        self.steps = steps
+        self.size = 2 * steps + 1
+        self.max_pwm = None
+        self.table = None
+        self.set_max_pwm(max_pwm)
+
+    def set_max_pwm(self, max_pwm):
+        """Select the table for a top speed"""
+        self.table = mix_table(max_pwm, self.deadzone, self.expo, self.steps)
+        self.max_pwm = max_pwm
+
+    def mix(self, throttle, turn):
+        """(left, right) PWM for stick values in -1..1"""
+        steps = self.steps
+        i = int((throttle + 1.0) * steps + 0.5)
+        j = int((turn + 1.0) * steps + 0.5)
+        k = 2 * (i * self.size + j)
+        table = self.table
+        return table[k], table[k + 1]
+
+
+class Gamepad:
+    """One pygame joystick mapped to differential drive"""
+
+    def __init__(self, index=0, throttle_axis=1, turn_axis=0, mixer=None):
+        self.joystick = pygame.joystick.Joystick(index)
+        self.joystick.init()
+        self.name = self.joystick.get_name()
+        self.instance_id = self.joystick.get_instance_id()
+        self.throttle_axis = throttle_axis
+        self.turn_axis = turn_axis
+        self.mixer = mixer if mixer is not None else DriveMixer()
+
+    def read(self):
+        """(left, right) PWM for the current stick position"""
+        # Stick up is negative on every common pad
+        throttle = -self.joystick.get_axis(self.throttle_axis)
+        turn = self.joystick.get_axis(self.turn_axis)
+        return self.mixer.mix(max(-1.0, min(1.0, throttle)), max(-1.0, min(1.0, turn)))
+
+
+def open_gamepad(index=0, max_pwm=MAX_SPEED, **kwargs):
+    """The gamepad at index, capped at max_pwm, or None if none is connected"""
+    pygame.joystick.init()
+    if pygame.joystick.get_count() <= index:
+        return None
+    mixer = kwargs.pop("mixer", None) or DriveMixer(max_pwm=max_pwm)
+    mixer.set_max_pwm(max_pwm)
+    return Gamepad(index, mixer=mixer, **kwargs)
@@ -0,0 +1,389 @@
+import time
+STARTED_AT = time.perf_counter()  # startup is measured from here
+
+import argparse
+import glob
+import os
+import selectors
+import socket
+import struct
+import sys
+
+from protocol import (
+    PROTO_BINARY, PROTO_ASCII, CMD_STOP, COMMAND_NAMES, DEFAULT_SPEED, SPEED_STEP,
+    clamp_speed,
+)
+from discovery import open_finder, target_text
+from keymap import Keymap
+from link_manager import report_lines
+from recorder import SessionRecorder, session_path
+from sender import CommandSender, MODE_CHANGE, MODE_STREAM
+
+# ============================================
+# Headless Controller
+# ============================================
+# Drives one bot with no window, no pygame and no per-frame rendering, for
+# the low-power board on the arena table. The main thread sleeps in a
+# selector until input arrives (or a held terminal key is due to expire),
+# then wakes the CommandSender thread to send any change at once.
+#
+# Two input sources, both feeding the same Keymap:
+#   terminal - stdin in cbreak mode. Terminals only report key presses, so
+#              a direction counts as held while its auto-repeat keeps
+#              coming. A fresh press holds the key for REPEAT_DELAY, long
+#              enough for the keyboard's first repeat to arrive, so a hold
+#              drives smoothly; once repeats arrive each one holds it for
+#              REPEAT_GAP, so a release stops the bot within REPEAT_GAP.
+#              The price is that a tap drives for REPEAT_DELAY. Only the
+#              last key repeats: no diagonals. SPACE stops at once.
+#   evdev    - a /dev/input/event* keyboard read directly (struct
+#              input_event), with real press/release events and diagonals.
+#              Needs read access to the device (usually the input group).
+#
+#   python headless.py                        # terminal input
+#   python headless.py --evdev auto           # first keyboard in /dev/input/by-id
+#   python headless.py --ip 127.0.0.1         # against receiver_emulator.py
+#
+# By default (--ip auto) the bot is found as in the windowed controllers
+# (discovery.py): the cached bot at once, else a broadcast probe, and
+# nothing is sent until one answers. An address given with --ip is pinned.
+
+# ============================================
+# CONFIGURATION
+# ============================================
+ESP_PORT = 4210
+BOT_CACHE = ".bot_cache.json"
+SEND_RATE = 100  # Hz
+SEND_MODE = MODE_CHANGE
+HEARTBEAT_INTERVAL = 0.1  # s
+PROTOCOL = PROTO_BINARY
+ACK_MODE = True
+ADAPTIVE_LINK = True  # see link_manager.py
+TELEMETRY = True  # bot reports timeout stops back (see telemetry.py)
+STATUS_INTERVAL = 1.0  # s, longest sleep between link status checks
+RECORD_DIR = "recordings"
+
+# Terminal auto-repeat: first repeat arrives after the keyboard delay
+# (250-600 ms), later ones every 30-50 ms. A key counts as held only until
+# the next event for it is overdue
+REPEAT_DELAY = 0.6  # s a fresh press holds the key, covering common repeat delays
+REPEAT_GAP = 0.08  # s each repeat holds the key: the stop latency while held
+
+TERMINAL_KEYMAP = {
+    "up": ("w", "UP"),
+    "down": ("s", "DOWN"),
+    "left": ("a", "LEFT"),
+    "right": ("d", "RIGHT"),
+    "faster": ("+", "="),
+    "slower": ("-", "_"),
+    "quit": ("q", "ESC"),
+}
+TERMINAL_STOP = " "
+
+# Linux input-event-codes.h
+EV_KEY = 1
+KEY_ESC, KEY_MINUS, KEY_EQUAL, KEY_Q = 1, 12, 13, 16
+KEY_W, KEY_A, KEY_S, KEY_D = 17, 30, 31, 32
+KEY_KPMINUS, KEY_KPPLUS = 74, 78
+KEY_UP, KEY_LEFT, KEY_RIGHT, KEY_DOWN = 103, 105, 106, 108
+
+EVDEV_KEYMAP = {
+    "up": (KEY_UP, KEY_W),
+    "down": (KEY_DOWN, KEY_S),
+    "left": (KEY_LEFT, KEY_A),
+    "right": (KEY_RIGHT, KEY_D),
+    "faster": (KEY_EQUAL, KEY_KPPLUS),
+    "slower": (KEY_MINUS, KEY_KPMINUS),
+    "quit": (KEY_ESC, KEY_Q),
+}
+EVDEV_KEY_NAMES = {code: name for name, code in list(globals().items()) if name.startswith("KEY_")}
+
+# struct input_event: struct timeval, __u16 type, __u16 code, __s32 value
+INPUT_EVENT = struct.Struct("llHHi")
+
+_ESCAPES = {"A": "UP", "B": "DOWN", "C": "RIGHT", "D": "LEFT"}
+
+
+class HeldKeys(dict):
+    """key -> held flag; keys never seen read as released"""
+
+    def __missing__(self, key):
+        return False
+
+
+class TerminalInput:
+    """Keys from a terminal in cbreak mode, held while they auto-repeat"""
+
+    bindings = TERMINAL_KEYMAP
+
+    def __init__(self, fd=None, repeat_delay=REPEAT_DELAY, repeat_gap=REPEAT_GAP):
+        self.fd = sys.stdin.fileno() if fd is None else fd
+        self.repeat_delay = repeat_delay
+        self.repeat_gap = repeat_gap
+        self.held = HeldKeys()
+        self._expires = {}
+        self._saved_mode = None
+
+    @staticmethod
+    def key_name(key):
+        return key
+
+    def open(self):
+        if not os.isatty(self.fd):
+            raise OSError("stdin is not a terminal (use --evdev)")
+        import termios
+        import tty
+        self._saved_mode = termios.tcgetattr(self.fd)
+        tty.setcbreak(self.fd)  # no line buffering or echo; Ctrl+C still works
+        return self
+
+    def close(self):
+        if self._saved_mode is not None:
+            import termios
+            termios.tcsetattr(self.fd, termios.TCSADRAIN, self._saved_mode)
+            self._saved_mode = None
+
+    def fileno(self):
+        return self.fd
+
+    def _keys(self, text):
+        # Arrow keys arrive as ESC [ A..D (or ESC O A..D); a lone ESC is ESC
+        i = 0
+        while i < len(text):
+            if text[i] == "\x1b":
+                if text[i + 1:i + 2] in ("[", "O") and text[i + 2:i + 3] in _ESCAPES:
+                    yield _ESCAPES[text[i + 2]]
+                    i += 3
+                    continue
+                yield "ESC"
+            else:
+                yield text[i].lower()
+            i += 1
+
+    def read(self, now, held_keys):
+        """Consume pending input; returns the keys pressed"""
+        data = os.read(self.fd, 64)
+        if not data:
+            raise EOFError("terminal closed")
+        pressed = []
+        for key in self._keys(data.decode(errors="ignore")):
+            if key == TERMINAL_STOP:
+                self.held.clear()
+                self._expires.clear()
+            elif key in held_keys:
+                # Still held means this is an auto-repeat; the next one is close
+                gap = self.repeat_gap if key in self._expires else self.repeat_delay
+                self._expires[key] = now + gap
+                self.held[key] = True
+            pressed.append(key)
+        return pressed
+
+    def expire(self, now):
+        """Release keys whose auto-repeat stopped; returns the next deadline"""
+        deadline = None
+        for key, expires in list(self._expires.items()):
+            if expires <= now:
+                del self._expires[key]
+                self.held[key] = False
+            elif deadline is None or expires < deadline:
+                deadline = expires
+        return deadline
+
+
+class EvdevInput:
+    """Keys from a Linux input device, with real press and release events"""
+
+    bindings = EVDEV_KEYMAP
+
+    def __init__(self, path):
+        if path == "auto":
+            keyboards = sorted(glob.glob("/dev/input/by-id/*-event-kbd"))
+            if not keyboards:
+                raise OSError("no keyboard found in /dev/input/by-id")
+            path = keyboards[0]
+        self.path = path
+        self.held = HeldKeys()
+        self.fd = None
+
+    @staticmethod
+    def key_name(key):
+        return EVDEV_KEY_NAMES.get(key, f"code {key}")
+
+    def open(self):
+        self.fd = os.open(self.path, os.O_RDONLY | os.O_NONBLOCK)
+        return self
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+    def fileno(self):
+        return self.fd
+
+    def read(self, now, held_keys):
+        """Consume pending events; returns the keys pressed"""
+        try:
+            data = os.read(self.fd, INPUT_EVENT.size * 64)
+        except BlockingIOError:
+            return []
+        if not data:
+            raise EOFError("input device closed")
+        data = data[:len(data) - len(data) % INPUT_EVENT.size]
+        pressed = []
+        for _, _, ev_type, code, value in INPUT_EVENT.iter_unpack(data):
+            if ev_type != EV_KEY or value == 2:  # 2 = kernel auto-repeat
+                continue
+            self.held[code] = value == 1
+            if value == 1:
+                pressed.append(code)
+        return pressed
+
+    def expire(self, now):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Drive the bot without a window")
+    parser.add_argument("--ip", default="auto", help="bot address, or 'auto' to discover it")
+    parser.add_argument("--port", type=int, default=ESP_PORT)
+    parser.add_argument("--evdev", metavar="DEVICE",
+                        help="read a /dev/input/event* keyboard ('auto' to pick one) instead of the terminal")
+    parser.add_argument("--repeat-delay", type=float, default=REPEAT_DELAY, metavar="S",
+                        help=f"terminal input: seconds a fresh key press keeps driving, at least "
+                             f"the keyboard's auto-repeat delay (default {REPEAT_DELAY})")
+    parser.add_argument("--repeat-gap", type=float, default=REPEAT_GAP, metavar="S",
+                        help=f"terminal input: seconds each auto-repeat keeps driving; the bot "
+                             f"stops this long after releasing a held key (default {REPEAT_GAP})")
+    parser.add_argument("--rate", type=int, default=SEND_RATE, help="send rate in Hz")
+    parser.add_argument("--mode", choices=(MODE_CHANGE, MODE_STREAM), default=SEND_MODE)
+    parser.add_argument("--ascii", action="store_true", help="use the one-letter ASCII protocol")
+    parser.add_argument("--no-record", action="store_true", help=f"don't log the session to {RECORD_DIR}/")
+    args = parser.parse_args()
+
+    try:
+        if args.evdev:
+            source = EvdevInput(args.evdev).open()
+        else:
+            source = TerminalInput(repeat_delay=args.repeat_delay, repeat_gap=args.repeat_gap).open()
+    except OSError as e:
+        print(f"Error: can't open input: {e}")
+        return 1
+    keymap = Keymap(source.bindings, key_name=source.key_name)
+    protocol = PROTO_ASCII if args.ascii else PROTOCOL
+
+    address = (args.ip, args.port)  # pinned: never retargeted
+    finder = None
+    if args.ip == "auto":
+        address = None
+        finder = open_finder(args.port, BOT_CACHE)
+        if finder is not None:
+            address = finder.resolve()  # None until a bot answers
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setblocking(False)
+    recorder = None if args.no_record else SessionRecorder(session_path(RECORD_DIR))
+    sender = CommandSender(sock, address, args.rate, mode=args.mode,
+                           heartbeat_interval=HEARTBEAT_INTERVAL, protocol=protocol,
+                           ack=ACK_MODE and protocol == PROTO_BINARY, recorder=recorder,
+                           adaptive=ADAPTIVE_LINK, telemetry=TELEMETRY and protocol == PROTO_BINARY)
+
+    selector = selectors.DefaultSelector()
+    selector.register(source.fileno(), selectors.EVENT_READ)
+    sender.start()
+    if finder is not None:
+        finder.follow(sender)
+    ready_ms = (time.perf_counter() - STARTED_AT) * 1000
+
+    print("=" * 60)
+    print("ESP8266 RC Car Controller (headless)")
+    print("=" * 60)
+    print(target_text(address))
+    if finder is not None:
+        print(finder.summary())
+    print(f"Send rate: {args.rate} Hz ({args.mode}, {protocol})")
+    print(f"Input: {getattr(source, 'path', 'terminal - WASD/arrows, SPACE stop, +/- speed, q quit')}")
+    if not args.evdev:
+        print(f"Stop latency: {source.repeat_gap * 1000:.0f} ms after releasing a held key; "
+              f"a tap drives {source.repeat_delay * 1000:.0f} ms (use --evdev for real key releases)")
+    for problem in keymap.problems:
+        print(f"Warning: keymap: {problem}")
+    print(f"Startup: {ready_ms:.0f} ms from launch to sending")
+    print("=" * 60)
+
+    speed = DEFAULT_SPEED
+    published = None
+    last_command = None
+    last_status = None
+    bot_timeouts = 0
+    held_keys = keymap.key_bits
+    running = True
+    try:
+        while running:
+            # Sleep until input, a hold expiring or the next status check
+            now = time.perf_counter()
+            deadline = source.expire(now)
+            timeout = STATUS_INTERVAL if deadline is None else min(STATUS_INTERVAL, deadline - now)
+            pressed = []
+            if selector.select(max(0.0, timeout)):
+                pressed = source.read(time.perf_counter(), held_keys)
+            input_ns = time.perf_counter_ns()
+            source.expire(time.perf_counter())
+
+            for key in pressed:
+                action = keymap.edge_action(key)
+                if action == "faster":
+                    speed = clamp_speed(speed + SPEED_STEP)
+                    print(f"Speed: {speed}")
+                elif action == "slower":
+                    speed = clamp_speed(speed - SPEED_STEP)
+                    print(f"Speed: {speed}")
+                elif action == "quit":
+                    running = False
+
+            # A change is an input edge: send it now, not at the next tick
+            command = keymap.command(keymap.mask(source.held))
+            if (command, speed) != published:
+                sender.set_command(command, speed, input_ns)
+                sender.wake()
+                published = (command, speed)
+            if command != last_command:
+                print(f"→ {COMMAND_NAMES[command]}")
+                last_command = command
+            if sender.status != last_status:
+                print(f"[{sender.status}]")
+                last_status = sender.status
+            if sender.telemetry is not None and sender.telemetry.timeouts_seen != bot_timeouts:
+                bot_timeouts = sender.telemetry.timeouts_seen
+                print(f"[BOT TIMEOUT - STOPPED] ({bot_timeouts} this session)")
+    except KeyboardInterrupt:
+        print("\nInterrupted by user")
+    except (EOFError, OSError) as e:
+        print(f"\nInput lost: {e}")
+    finally:
+        sender.stop(final=CMD_STOP)  # Stop car before exiting
+        if finder is not None:
+            finder.stop()
+        selector.close()
+        source.close()
+        sock.close()
+
+    stats = sender.session_stats()
+    print(f"\nSession: {stats['elapsed_s']:.1f}s, sent {stats['packets_sent']} "
+          f"(saved {stats['saved_vs_stream']} vs streaming)")
+    for line in report_lines(stats):
+        print(f"  {line}")
+    if sender.telemetry is not None:
+        for line in sender.telemetry.report_lines(stats["elapsed_s"]):
+            print(f"  {line}")
+    if recorder is not None:
+        print(f"Recorded {recorder.records} packets to {recorder.path}")
+    latency = sender.input_latency
+    if latency.count:
+        print(f"Input-to-wire latency: mean {latency.mean_ms():.2f} ms, max {latency.max_ns / 1e6:.2f} ms")
+    print("✓ Controller stopped.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,150 @@
+from protocol import (
+    CMD_STOP, CMD_FORWARD, CMD_BACKWARD, CMD_LEFT, CMD_RIGHT, CMD_UP_LEFT,
+    CMD_UP_RIGHT, CMD_DOWN_LEFT, CMD_DOWN_RIGHT, COMMAND_NAMES,
+)
+
+# ============================================
+# Keymap
+# ============================================
+# Input is reduced to one bitmask per tick (one bit per held direction) and
+# mapped to a command through a 16-entry table built once from the
+# declarative keymap, so per-tick cost doesn't depend on how many commands
+# exist. Opposite directions held together cancel out. Problems such as a
+# key bound to two actions or a command that can never be selected are
+# collected at build time and reported at startup.
+#
+# Keys are whatever the input source reports: pygame key codes for the GUI,
+# characters or evdev codes for headless.py. pygame is only imported for the
+# default GUI bindings, so headless input never pays for it.
+
+BIT_UP = 1
+BIT_DOWN = 2
+BIT_LEFT = 4
+BIT_RIGHT = 8
+
+# Held actions form the bitmask; edge actions fire on KEYDOWN
+HELD_ACTIONS = {"up": BIT_UP, "down": BIT_DOWN, "left": BIT_LEFT, "right": BIT_RIGHT}
+EDGE_ACTIONS = ("faster", "slower", "quit", "profiler", "analytics")
+
+# Which held directions select which command
+COMMAND_RULES = (
+    (CMD_FORWARD, ("up",)),
+    (CMD_BACKWARD, ("down",)),
+    (CMD_LEFT, ("left",)),
+    (CMD_RIGHT, ("right",)),
+    (CMD_UP_LEFT, ("up", "left")),
+    (CMD_UP_RIGHT, ("up", "right")),
+    (CMD_DOWN_LEFT, ("down", "left")),
+    (CMD_DOWN_RIGHT, ("down", "right")),
+)
+
+
+def default_keymap():
+    """Arrow keys/WASD, +/- for speed, ESC to quit, F3 profiler, F4 analytics (pygame key codes)"""
+    import pygame
+    return {
+        "up": (pygame.K_UP, pygame.K_w),
+        "down": (pygame.K_DOWN, pygame.K_s),
+        "left": (pygame.K_LEFT, pygame.K_a),
+        "right": (pygame.K_RIGHT, pygame.K_d),
+        "faster": (pygame.K_PLUS, pygame.K_EQUALS, pygame.K_KP_PLUS),
+        "slower": (pygame.K_MINUS, pygame.K_UNDERSCORE, pygame.K_KP_MINUS),
+        "quit": (pygame.K_ESCAPE,),
+        "profiler": (pygame.K_F3,),
+        "analytics": (pygame.K_F4,),
+    }
+
+
+def pygame_key_name(key):
+    """Readable name of a pygame key code for problem reports"""
+    import pygame
+    return pygame.key.name(key)
+
+
+def _cancel_opposites(mask):
+    if mask & BIT_UP and mask & BIT_DOWN:
+        mask &= ~(BIT_UP | BIT_DOWN)
+    if mask & BIT_LEFT and mask & BIT_RIGHT:
+        mask &= ~(BIT_LEFT | BIT_RIGHT)
+    return mask
+
+
+class Keymap:
+    """Declarative key bindings compiled to a bitmask -> command table"""
+
+    def __init__(self, bindings=None, rules=COMMAND_RULES, key_name=pygame_key_name):
+        self.bindings = dict(default_keymap() if bindings is None else bindings)
+        self.key_name = key_name
+        self.problems = []
+
+        # key -> bit for held actions, key -> action for edge actions
+        self.key_bits = {}
+        self.key_actions = {}
+        owner = {}
+        for action, keys in self.bindings.items():
+            if action not in HELD_ACTIONS and action not in EDGE_ACTIONS:
+                self.problems.append(f"unknown action {action!r}")
+                continue
+            if not keys:
+                self.problems.append(f"action {action!r} has no keys")
+            for key in keys:
+                if key in owner:
+                    self.problems.append(
+                        f"key {key_name(key)!r} bound to both {owner[key]!r} and {action!r}")
+                    continue
+                owner[key] = action
+                if action in HELD_ACTIONS:
+                    self.key_bits[key] = HELD_ACTIONS[action]
+                else:
+                    self.key_actions[key] = action
+        self.held_keys = tuple(self.key_bits.items())
+
+        # Build the table: every mask -> the rule matching its directions
+        bound = {action for action, keys in self.bindings.items() if keys}
+        by_mask = {}
+        for cmd, actions in rules:
+            mask = 0
+            for action in actions:
+                mask |= HELD_ACTIONS[action]
+            if mask in by_mask:
+                self.problems.append(
+                    f"{COMMAND_NAMES[cmd]} and {COMMAND_NAMES[by_mask[mask]]} use the same keys")
+                continue
+            if _cancel_opposites(mask) != mask:
+                self.problems.append(f"{COMMAND_NAMES[cmd]} needs opposite directions; unreachable")
+                continue
+            missing = [action for action in actions if action not in bound]
+            if missing:
+                self.problems.append(f"{COMMAND_NAMES[cmd]} unreachable: no keys for {', '.join(missing)}")
+                continue
+            by_mask[mask] = cmd
+        self.table = tuple(by_mask.get(_cancel_opposites(mask), CMD_STOP) for mask in range(16))
+
+    def mask(self, keys):
+        """Bitmask of held directions (keys[key] is true while key is held)"""
+        mask = 0
+        for key, bit in self.held_keys:
+            if keys[key]:
+                mask |= bit
+        return mask
+
+    def command(self, mask):
+        """Command for a direction bitmask (one table lookup)"""
+        return self.table[mask]
+
+    def edge_action(self, key):
+        """Edge action bound to key ('faster', 'slower', 'quit', 'profiler') or None"""
+        return self.key_actions.get(key)
+
+
+def check_keymaps(named_keymaps):
+    """Problems across several keymaps sharing one keyboard (e.g. multi-bot)"""
+    problems = []
+    owner = {}
+    for name, keymap in named_keymaps:
+        problems.extend(f"{name}: {problem}" for problem in keymap.problems)
+        for key in list(keymap.key_bits) + list(keymap.key_actions):
+            if key in owner and owner[key] != name:
+                problems.append(f"key {keymap.key_name(key)!r} used by both {owner[key]} and {name}")
+            owner.setdefault(key, name)
+    return problems
@@ -0,0 +1,182 @@
+import math
+
+from protocol import CMD_STOP
+
+# ============================================
+# Link Manager
+# ============================================
+# Adapts what a CommandSender puts on the air to the measured link, so a
+# crowded hotspot neither wastes airtime on a clean link nor loses the one
+# packet that mattered on a bad one.
+#
+# Loss comes from LinkStats (ack mode); a silence of several heartbeats
+# with no ack counts as an outage in progress. Without acks the loss is
+# unknown and UNKNOWN_LOSS is assumed. Jitter is RTT p95 - p50.
+#
+#   heartbeats  - the change-mode keepalive interval is the longest that
+#                 still makes it unlikely (TARGET_TIMEOUT_MISS) that every
+#                 heartbeat inside the receiver's COMMAND_TIMEOUT is lost:
+#                 HEARTBEAT_RANGE[1] on a clean link, down to
+#                 HEARTBEAT_RANGE[0] on a bad one
+#   redundancy  - critical transitions (STOP, a speed change, a motor
+#                 reversing) are repeated as identical copies, the same
+#                 sequence number included, so the receiver keeps the first
+#                 that arrives and drops the rest as duplicates. There are
+#                 enough copies that losing all of them is unlikely
+#                 (TARGET_CRITICAL_MISS), spaced by at least the jitter so
+#                 one burst doesn't take them all. Binary protocol only:
+#                 ASCII has no sequence number, and a repeated '+' would
+#                 step the speed twice.
+#
+# Critical sends are followed up to their ack, so the delivery rate of the
+# transitions that matter is reported next to the overall one.
+
+UNKNOWN_LOSS = 0.05          # assumed without acks
+LOSS_FLOOR = 0.001           # never plan for a perfect link
+OUTAGE_HEARTBEATS = 3        # heartbeats without any ack -> treat as an outage
+OUTAGE_LOSS = 0.5
+TARGET_TIMEOUT_MISS = 1e-4   # chance a run of lost heartbeats stops the bot
+TARGET_CRITICAL_MISS = 1e-3  # chance every copy of a critical send is lost
+HEARTBEAT_RANGE = (0.040, 0.140)  # s
+MAX_COPIES = 3               # extra copies of a critical send
+MIN_SPACING = 0.012          # s between copies
+REFRESH_INTERVAL = 0.25      # s between re-plans
+ACK_TIMEOUT = 1.0            # s before a critical send counts as undelivered
+
+
+def _sign(value):
+    return (value > 0) - (value < 0)
+
+
+def critical_reason(last_slot, slot):
+    """Why the change from last_slot to slot must not be lost, or None"""
+    if last_slot is None:
+        return None
+    cmd, speed, left, right = slot
+    last_cmd, last_speed, last_left, last_right = last_slot
+    if (left, right) == (0, 0) or cmd == CMD_STOP:
+        return "stop" if (last_left, last_right) != (0, 0) else None
+    if speed != last_speed:
+        return "speed"
+    if _sign(left) * _sign(last_left) < 0 or _sign(right) * _sign(last_right) < 0:
+        return "reverse"
+    return None
+
+
+def _runs_needed(loss, target):
+    # Consecutive losses it takes before the chance of all of them drops below target
+    return math.ceil(math.log(target) / math.log(loss))
+
+
+class LinkManager:
+    """Heartbeat interval and critical-send redundancy from measured link quality"""
+
+    def __init__(self, link=None, command_timeout=0.300, redundancy=True):
+        self.link = link
+        self.command_timeout = command_timeout
+        self.redundancy = redundancy
+
+        self.loss = UNKNOWN_LOSS
+        self.jitter_ms = 0.0
+        self.heartbeat_interval = HEARTBEAT_RANGE[1]
+        self.copies = 0
+        self.spacing = MIN_SPACING
+
+        self.critical = {"stop": 0, "speed": 0, "reverse": 0}
+        self.critical_sent = 0
+        self.critical_delivered = 0
+        self.critical_lost = 0
+        self.copies_sent = 0
+
+        self._pending = {}  # seq -> send time (ns) of unacked critical sends
+        self._planned_at = None
+        self.plan(0.0, 0)
+
+    def plan(self, now, now_ns):
+        """Re-plan heartbeats and redundancy from the latest link numbers"""
+        self._planned_at = now
+        loss = UNKNOWN_LOSS
+        jitter_ms = 0.0
+        margin_ms = 0.0
+        link = self.link
+        if link is not None:
+            p50, p95, p99 = link.percentiles()
+            measured = link.loss_rate()
+            if measured is not None:
+                loss = measured
+            if p50 is not None:
+                jitter_ms = p95 - p50
+                margin_ms = p99
+            if link.last_ack_ns and now_ns - link.last_ack_ns > OUTAGE_HEARTBEATS * self.heartbeat_interval * 1e9:
+                loss = max(loss, OUTAGE_LOSS)
+        loss = min(max(loss, LOSS_FLOOR), OUTAGE_LOSS)
+        self.loss = loss
+        self.jitter_ms = jitter_ms
+
+        window = self.command_timeout - margin_ms / 1000
+        interval = window / _runs_needed(loss, TARGET_TIMEOUT_MISS)
+        self.heartbeat_interval = min(max(interval, HEARTBEAT_RANGE[0]), HEARTBEAT_RANGE[1])
+        if self.redundancy:
+            self.copies = min(max(_runs_needed(loss, TARGET_CRITICAL_MISS) - 1, 0), MAX_COPIES)
+        self.spacing = max(MIN_SPACING, jitter_ms / 1000)
+
+    def update(self, now, now_ns):
+        """Expire undelivered critical sends and re-plan every REFRESH_INTERVAL"""
+        if now - self._planned_at < REFRESH_INTERVAL:
+            return
+        if self._pending:
+            cutoff = now_ns - ACK_TIMEOUT * 1e9
+            for seq in [seq for seq, sent in self._pending.items() if sent < cutoff]:
+                del self._pending[seq]
+                self.critical_lost += 1
+        self.plan(now, now_ns)
+
+    def on_change(self, last_slot, slot, seq, t_ns):
+        """A changed slot went out as seq; returns the due offsets (s) of its copies"""
+        reason = critical_reason(last_slot, slot)
+        if reason is None:
+            return ()
+        self.critical[reason] += 1
+        self.critical_sent += 1
+        if self.link is not None:
+            self._pending[seq] = t_ns
+        return tuple(self.spacing * (i + 1) for i in range(self.copies))
+
+    def on_ack(self, seq):
+        """An ack arrived for seq"""
+        if self._pending.pop(seq, None) is not None:
+            self.critical_delivered += 1
+
+    def stats(self):
+        """Current plan and critical-send counters"""
+        resolved = self.critical_delivered + self.critical_lost
+        return {
+            "loss": self.loss,
+            "jitter_ms": self.jitter_ms,
+            "heartbeat_interval": self.heartbeat_interval,
+            "copies": self.copies,
+            "spacing_ms": self.spacing * 1000,
+            "critical": dict(self.critical),
+            "critical_sent": self.critical_sent,
+            "copies_sent": self.copies_sent,
+            "critical_delivery": self.critical_delivered / resolved if resolved else None,
+        }
+
+
+def report_lines(stats):
+    """Bandwidth, delivery and link manager lines for a session_stats() dict"""
+    lines = [f"Bandwidth: {stats['bandwidth_bps'] / 1000:.1f} kbit/s "
+             f"({stats['bytes_sent']} bytes incl. IP/UDP headers)"]
+    if stats["delivery"] is not None:
+        lines.append(f"Command delivery: {stats['delivery']:.2%} acked")
+    manager = stats.get("link_manager")
+    if manager is not None:
+        reasons = ", ".join(f"{n} {reason}" for reason, n in manager["critical"].items() if n)
+        delivery = manager["critical_delivery"]
+        lines.append(f"Critical sends: {manager['critical_sent']} ({reasons or 'none'}), "
+                     f"{manager['copies_sent']} extra copies"
+                     + (f", {delivery:.2%} delivered" if delivery is not None else ""))
+        lines.append(f"Link plan: loss {manager['loss']:.1%}, jitter {manager['jitter_ms']:.1f} ms -> "
+                     f"heartbeat {manager['heartbeat_interval'] * 1000:.0f} ms, "
+                     f"{manager['copies']} copies {manager['spacing_ms']:.0f} ms apart")
+    return lines
@@ -0,0 +1,173 @@
+from array import array
+
+# ============================================
+# Link Statistics
+# ============================================
+# Tracks round-trip time and loss from the receiver's acks. Send times are
+# kept in a table indexed by sequence number, so recording a send or an ack
+# is a single array store. A packet counts as lost if no ack arrives within
+# ack_timeout. RTTs and outcomes live in fixed-size rings, so the reported
+# numbers cover the most recent `window` packets.
+#
+# Only the thread that records sends and acks (the sender thread) reads the
+# rings: it calls refresh() every tick, which republishes (p50, p95, p99,
+# loss) as one tuple at most every refresh_interval. Every other thread (the
+# UI, the metrics endpoint) just reads that tuple with snapshot(), so none
+# of them ever sorts the ring while the sender is writing it.
+#
+# LatencyHistogram counts input-to-wire latencies (see CommandSender) in
+# fixed buckets, so recording a sample never allocates.
+
+SEQ_SPACE = 0x10000
+_ACKED = -1
+
+
+class LinkStats:
+    """Rolling RTT percentiles and loss rate from echoed sequence numbers"""
+
+    def __init__(self, window=512, ack_timeout=1.0, refresh_interval=0.25):
+        self.window = window
+        self.ack_timeout_ns = int(ack_timeout * 1e9)
+        self.refresh_interval = refresh_interval
+        self.acks = 0
+        self.lost = 0
+        self.last_ack_ns = 0
+
+        self._sent_ns = array("q", bytes(8 * SEQ_SPACE))
+        self._oldest = None  # oldest unresolved seq
+        self._next = None    # seq after the newest sent
+
+        self._rtt_ms = array("d", bytes(8 * window))
+        self._rtt_index = 0
+        self._rtt_count = 0
+
+        self._outcomes = bytearray(window)  # 1 = acked, 0 = lost
+        self._outcome_index = 0
+        self._outcome_count = 0
+        self._outcome_sum = 0
+
+        self._snapshot = (None, None, None, None)
+        self._snapshot_at = 0.0
+
+    def record_send(self, seq, t_ns):
+        """Remember when seq went out"""
+        self._sent_ns[seq] = t_ns
+        if self._oldest is None:
+            self._oldest = seq
+        self._next = (seq + 1) % SEQ_SPACE
+
+    def record_ack(self, seq, t_ns):
+        """Match an echoed seq to its send time; returns the RTT in ms or None"""
+        sent = self._sent_ns[seq]
+        if sent <= 0:
+            return None  # duplicate ack, or for a packet already counted lost
+        self._sent_ns[seq] = _ACKED
+        self.acks += 1
+        self.last_ack_ns = t_ns
+        rtt_ms = (t_ns - sent) / 1e6
+        self._rtt_ms[self._rtt_index] = rtt_ms
+        self._rtt_index = (self._rtt_index + 1) % self.window
+        self._rtt_count = min(self._rtt_count + 1, self.window)
+        return rtt_ms
+
+    def expire(self, now_ns):
+        """Resolve packets that were acked or timed out, oldest first"""
+        sent_ns = self._sent_ns
+        while self._oldest is not None and self._oldest != self._next:
+            sent = sent_ns[self._oldest]
+            if sent == _ACKED:
+                self._add_outcome(1)
+            elif sent > 0 and now_ns - sent > self.ack_timeout_ns:
+                self.lost += 1
+                self._add_outcome(0)
+            elif sent > 0:
+                break
+            sent_ns[self._oldest] = 0
+            self._oldest = (self._oldest + 1) % SEQ_SPACE
+
+    def _add_outcome(self, acked):
+        i = self._outcome_index
+        if self._outcome_count == self.window:
+            self._outcome_sum -= self._outcomes[i]
+        else:
+            self._outcome_count += 1
+        self._outcomes[i] = acked
+        self._outcome_sum += acked
+        self._outcome_index = (i + 1) % self.window
+
+    def loss_rate(self):
+        """Fraction of recent packets that were never acked"""
+        if self._outcome_count == 0:
+            return None
+        return 1.0 - self._outcome_sum / self._outcome_count
+
+    def percentiles(self):
+        """RTT (p50, p95, p99) in ms over the recent window"""
+        n = self._rtt_count
+        if n == 0:
+            return None, None, None
+        values = sorted(self._rtt_ms[:n])
+        return tuple(values[min(n - 1, int(q * n))] for q in (0.50, 0.95, 0.99))
+
+    def refresh(self, now):
+        """Republish the snapshot if refresh_interval has passed (recording thread only)"""
+        if now - self._snapshot_at >= self.refresh_interval:
+            self._snapshot = self.percentiles() + (self.loss_rate(),)
+            self._snapshot_at = now
+
+    def snapshot(self):
+        """(p50, p95, p99, loss) as last published by refresh(); safe from any thread"""
+        return self._snapshot
+
+
+# Upper bounds of the latency histogram buckets (ms); the last is open-ended
+LATENCY_BUCKETS_MS = (0.25, 0.5, 1, 2, 5, 10, 20, 50, 100)
+
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram with exact count, mean and max"""
+
+    def __init__(self, bounds_ms=LATENCY_BUCKETS_MS):
+        self.bounds_ms = tuple(bounds_ms)
+        self._bounds_ns = tuple(int(b * 1e6) for b in self.bounds_ms)
+        self.counts = array("q", bytes(8 * (len(self.bounds_ms) + 1)))
+        self.count = 0
+        self.total_ns = 0
+        self.max_ns = 0
+
+    def record(self, latency_ns):
+        """Count one sample"""
+        i = 0
+        for bound in self._bounds_ns:
+            if latency_ns <= bound:
+                break
+            i += 1
+        self.counts[i] += 1
+        self.count += 1
+        self.total_ns += latency_ns
+        if latency_ns > self.max_ns:
+            self.max_ns = latency_ns
+
+    def mean_ms(self):
+        return self.total_ns / self.count / 1e6 if self.count else None
+
+    def percentile_ms(self, q):
+        """Upper bound of the bucket holding the q-quantile (max for the last one)"""
+        if self.count == 0:
+            return None
+        target = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= target and n:
+                return self.bounds_ms[i] if i < len(self.bounds_ms) else self.max_ns / 1e6
+        return self.max_ns / 1e6
+
+    def format_lines(self, width=40):
+        """Text rendering, one line per bucket"""
+        if self.count == 0:
+            return ["  (no samples)"]
+        peak = max(self.counts)
+        labels = [f"<= {b:g} ms" for b in self.bounds_ms] + [f" > {self.bounds_ms[-1]:g} ms"]
+        return [f"  {label:>11} {'#' * round(n / peak * width):<{width}} {n}"
+                for label, n in zip(labels, self.counts)]
@@ -0,0 +1,244 @@
+import argparse
+import socket
+import threading
+import time
+
+from link_stats import LatencyHistogram
+from protocol import (
+    CMD_STOP, CMD_FORWARD, CMD_BACKWARD, CMD_LEFT, CMD_RIGHT, CMD_DRIVE, COMMAND_NAMES,
+    MAX_SPEED, DEFAULT_SPEED, clamp_speed, motor_pwm,
+)
+
+# ============================================
+# Timed Maneuvers
+# ============================================
+# Scripted moves ("full forward 400 ms, spin right 150 ms") for the events
+# that reward exact, repeatable bursts. Each named sequence of
+# (command, speed, duration_ms) is compiled once into a schedule of
+# absolute offsets from the start, with steps that wouldn't change the
+# motors merged and a STOP appended at the end.
+#
+# ManeuverRunner plays schedules on its own thread, independent of the
+# frame rate. Every step is timed against the start of the run rather than
+# the previous step, so lateness never accumulates: it sleeps until just
+# before a step is due, spins the last stretch, then publishes the step and
+# wakes the sender so it goes out at once. Starting another maneuver or
+# cancel() aborts the one running. The runner checks that its run is still
+# current and publishes a step under the same lock cancel() takes, so once
+# cancel() returns no step of the old run can overwrite the command the
+# caller publishes next. run() marks the maneuver active under that lock
+# too, so manual input published before the runner thread picks the run up
+# already leaves the sender to it.
+#
+#   python maneuvers.py --bench          # timing jitter at the receiver emulator
+
+SPIN_WINDOW = 0.0015  # s before a step is due to stop sleeping and spin
+
+DEFAULT_MANEUVERS = {
+    "burst": [(CMD_FORWARD, MAX_SPEED, 400)],
+    "spin_right": [(CMD_RIGHT, 800, 150)],
+    "spin_left": [(CMD_LEFT, 800, 150)],
+    "pop": [(CMD_FORWARD, MAX_SPEED, 400), (CMD_RIGHT, 800, 150), (CMD_FORWARD, MAX_SPEED, 250)],
+    "tug": [(CMD_BACKWARD, MAX_SPEED, 300), (CMD_STOP, DEFAULT_SPEED, 100)] * 3,
+}
+
+
+def compile_maneuver(steps):
+    """Schedule of (offset_ns, cmd, speed) for (cmd, speed, duration_ms) steps"""
+    schedule = []
+    offset_ns = 0
+    last_pwm = None
+    for cmd, speed, duration_ms in steps:
+        if cmd not in range(CMD_DRIVE) or duration_ms <= 0:  # DRIVE has no fixed mix
+            raise ValueError(f"bad maneuver step {(cmd, speed, duration_ms)!r}")
+        speed = clamp_speed(speed)
+        pwm = motor_pwm(cmd, speed)
+        if pwm != last_pwm:  # same motor output: just extend the previous step
+            schedule.append((offset_ns, cmd, speed))
+            last_pwm = pwm
+        offset_ns += int(duration_ms * 1_000_000)
+    if last_pwm != (0, 0):
+        schedule.append((offset_ns, CMD_STOP, DEFAULT_SPEED))
+    return tuple(schedule)
+
+
+class ManeuverRunner:
+    """Plays compiled maneuvers into a CommandSender on a timer thread"""
+
+    def __init__(self, sender, maneuvers=DEFAULT_MANEUVERS, wake=None):
+        self.sender = sender
+        self.schedules = {name: compile_maneuver(steps) for name, steps in maneuvers.items()}
+        self.wake = wake if wake is not None else sender.wake
+        self.active = None      # name of the running maneuver
+        self.step = None        # (cmd, speed) of its current step
+        self.lateness = LatencyHistogram()  # step due -> published
+        self.last_due_ns = []   # due times of the last run's steps
+        self.runs = 0
+        self.cancelled = 0
+
+        self._request = None
+        self._generation = 0
+        self._lock = threading.Lock()  # generation vs. publishing a step
+        self._signal = threading.Event()
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        """Start the timer thread"""
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="maneuvers", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Abort any maneuver and stop the thread"""
+        self._running = False
+        self.cancel()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def run(self, name):
+        """Start maneuver name now, aborting any other"""
+        if name not in self.schedules:
+            raise KeyError(f"unknown maneuver {name!r}")
+        with self._lock:
+            self._generation += 1
+            self._request = name
+            self.active = name
+            self.step = None
+        self._signal.set()
+
+    def cancel(self):
+        """Abort the running maneuver; manual input takes over again"""
+        with self._lock:
+            self._generation += 1
+            self._request = None
+            if self.active is not None:
+                self.cancelled += 1
+            self.active = None
+            self.step = None
+        self._signal.set()
+
+    def label(self):
+        """e.g. 'pop: RIGHT' for the UI"""
+        step = self.step
+        return f"{self.active}: {COMMAND_NAMES[step[0]]}" if step is not None else str(self.active)
+
+    def _wait_until(self, due_ns):
+        # False if interrupted by run() or cancel()
+        while True:
+            remaining = (due_ns - time.perf_counter_ns()) / 1e9
+            if remaining <= 0:
+                return True
+            if remaining > SPIN_WINDOW:
+                if self._signal.wait(remaining - SPIN_WINDOW):
+                    return False
+            else:
+                while time.perf_counter_ns() < due_ns:
+                    pass
+                return not self._signal.is_set()
+
+    def _execute(self, name, generation):
+        schedule = self.schedules[name]
+        self.runs += 1
+        due_times = []
+        t0 = time.perf_counter_ns()
+        try:
+            for offset_ns, cmd, speed in schedule:
+                due_ns = t0 + offset_ns
+                if not self._wait_until(due_ns):
+                    return
+                with self._lock:
+                    if generation != self._generation:
+                        return
+                    self.sender.set_command(cmd, speed)
+                    self.step = (cmd, speed)
+                self.wake()
+                self.lateness.record(time.perf_counter_ns() - due_ns)
+                due_times.append(due_ns)
+            self.last_due_ns = due_times
+        finally:
+            # Finished or aborted: leave nothing stale for the UI, unless
+            # the next run is already waiting to replace it
+            with self._lock:
+                self.step = None
+                if self._request is None:
+                    self.active = None
+
+    def _run(self):
+        while self._running:
+            self._signal.wait()
+            self._signal.clear()
+            with self._lock:
+                name, generation = self._request, self._generation
+                self._request = None
+            if name is not None and self._running:
+                self._execute(name, generation)
+
+
+def bench(runs):
+    """Play every maneuver against the receiver emulator; jitter at the motors"""
+    from receiver_emulator import ReceiverEmulator
+    from sender import CommandSender, MODE_CHANGE
+
+    emulator = ReceiverEmulator(port=0).start()
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setblocking(False)
+    sender = CommandSender(sock, ("127.0.0.1", emulator.port), mode=MODE_CHANGE)
+    runner = ManeuverRunner(sender)
+    sender.start()
+    runner.start()
+    time.sleep(0.1)
+
+    jitter = LatencyHistogram()
+    offsets_ms = []
+    for name in runner.schedules:
+        for _ in range(runs):
+            first = len(emulator.trace)
+            runner.run(name)
+            while runner.active is not None:
+                time.sleep(0.01)
+            time.sleep(0.02)  # let the last packet land
+            # Each scheduled step changes the motors exactly once
+            samples = emulator.trace[first:]
+            for due_ns, sample in zip(runner.last_due_ns, samples):
+                offset_ns = int(sample.t * 1e9) - due_ns
+                offsets_ms.append(offset_ns / 1e6)
+                jitter.record(max(0, offset_ns))
+            time.sleep(0.05)
+
+    runner.stop()
+    sender.stop()
+    sock.close()
+    emulator.stop()
+
+    offsets_ms.sort()
+    n = len(offsets_ms)
+    mean = sum(offsets_ms) / n
+    spread = (sum((x - mean) ** 2 for x in offsets_ms) / n) ** 0.5
+    print(f"{len(runner.schedules)} maneuvers x {runs} runs, {n} step transitions at the emulator")
+    print(f"  due -> motors changed: mean {mean:.3f} ms, std dev {spread:.3f} ms, "
+          f"p50 {offsets_ms[n // 2]:.3f} ms, p99 {offsets_ms[min(n - 1, int(0.99 * n))]:.3f} ms, "
+          f"max {offsets_ms[-1]:.3f} ms")
+    print(f"  due -> published on the runner thread: mean {runner.lateness.mean_ms():.3f} ms, "
+          f"max {runner.lateness.max_ns / 1e6:.3f} ms")
+    print("\n".join(jitter.format_lines()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Timed maneuvers")
+    parser.add_argument("--bench", action="store_true", help="measure timing against the receiver emulator")
+    parser.add_argument("--runs", type=int, default=10, help="runs per maneuver for --bench")
+    args = parser.parse_args()
+    if args.bench:
+        bench(args.runs)
+    else:
+        for name, steps in DEFAULT_MANEUVERS.items():
+            schedule = compile_maneuver(steps)
+            steps = ", ".join(f"{COMMAND_NAMES[cmd]}@{speed} +{offset / 1e6:g}ms"
+                              for offset, cmd, speed in schedule)
+            print(f"{name:<11} {steps}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+from link_stats import LatencyHistogram
+from protocol import CMD_STOP, COMMAND_NAMES, DEFAULT_SPEED
+
+# ============================================
+# Metrics Endpoint
+# ============================================
+# Serves the controller's link and frame numbers on a local HTTP endpoint
+# in the Prometheus text format, so the pit crew can watch link health on
+# a dashboard (or with curl) instead of over the operator's shoulder.
+#
+# Nothing on the control or render paths waits for it. The UI thread
+# writes plain attributes of a ControllerMetrics (single writer, so no
+# lock); the sender thread already keeps its own counters. The server
+# thread only reads them when scraped, which at worst shows a command
+# together with the previous speed for one scrape. The send rate is the
+# packet count difference since the previous scrape; scrapes are served
+# one at a time on the server thread.
+#
+#   curl http://localhost:9108/metrics
+
+METRICS_HOST = "127.0.0.1"  # "0.0.0.0" to let the pit laptop scrape over the LAN
+METRICS_PORT = 9108
+FRAME_BUCKETS_MS = (5, 10, 20, 35, 50, 100, 250)  # 30 FPS lands in <= 35
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class ControllerMetrics:
+    """Frame and command numbers written by the UI thread, read by the server"""
+
+    def __init__(self):
+        self.frames = 0
+        self.frame_time = LatencyHistogram(FRAME_BUCKETS_MS)
+        self.command = CMD_STOP
+        self.speed = DEFAULT_SPEED
+        self.command_changes = 0
+        self._last_frame_ns = None
+
+    def frame(self, t_ns):
+        """Count a frame starting at t_ns; frame time is the start-to-start interval"""
+        if self._last_frame_ns is not None:
+            self.frame_time.record(t_ns - self._last_frame_ns)
+        self._last_frame_ns = t_ns
+        self.frames += 1
+
+    def set_command(self, cmd, speed):
+        """The command and speed just handed to the sender"""
+        if cmd != self.command:
+            self.command_changes += 1
+        self.command = cmd
+        self.speed = speed
+
+
+def _metric(lines, name, kind, help_text, samples):
+    # samples: iterable of (labels, value)
+    lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} {kind}")
+    for labels, value in samples:
+        label_text = "{" + ",".join(f'{k}="{v}"' for k, v in labels) + "}" if labels else ""
+        lines.append(f"{name}{label_text} {value:g}" if isinstance(value, float)
+                     else f"{name}{label_text} {value}")
+
+
+def _histogram(lines, name, help_text, histogram):
+    # LatencyHistogram -> cumulative buckets in seconds
+    counts = list(histogram.counts)  # one copy, so the buckets agree with each other
+    lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} histogram")
+    seen = 0
+    for bound, n in zip(histogram.bounds_ms, counts):
+        seen += n
+        lines.append(f'{name}_bucket{{le="{bound / 1000:g}"}} {seen}')
+    seen += counts[-1]
+    lines.append(f'{name}_bucket{{le="+Inf"}} {seen}')
+    lines.append(f"{name}_sum {histogram.total_ns / 1e9:g}")
+    lines.append(f"{name}_count {seen}")
+
+
+def render_metrics(sender, metrics, send_rate):
+    """Prometheus text exposition of a CommandSender and ControllerMetrics"""
+    lines = []
+    _metric(lines, "rc_packets_sent_total", "counter", "Packets put on the wire",
+            [((), sender.packets_sent)])
+    _metric(lines, "rc_bytes_sent_total", "counter", "Bytes put on the wire, IP/UDP headers included",
+            [((), sender.bytes_sent)])
+    _metric(lines, "rc_send_rate_hz", "gauge", "Packets per second since the previous scrape",
+            [((), float(send_rate))])
+    _metric(lines, "rc_sends_total", "counter", "Packets by reason",
+            [((("reason", "change"),), sender.changes), ((("reason", "heartbeat"),), sender.heartbeats)])
+    _metric(lines, "rc_link_up", "gauge", "1 while the sender reports CONNECTED",
+            [((), int(sender.status == "CONNECTED"))])
+
+    link = sender.link
+    if link is not None:
+        _metric(lines, "rc_acks_total", "counter", "Packets acked by the receiver", [((), link.acks)])
+        _metric(lines, "rc_lost_total", "counter", "Packets never acked", [((), link.lost)])
+        # The sender thread's published snapshot: never sort its rings from here
+        p50, p95, p99, loss = link.snapshot()
+        if loss is not None:
+            _metric(lines, "rc_loss_ratio", "gauge", "Loss over the recent window", [((), float(loss))])
+        if p50 is not None:
+            _metric(lines, "rc_rtt_seconds", "gauge", "Round-trip time percentiles over the recent window",
+                    [((("percentile", p),), ms / 1000) for p, ms in (("50", p50), ("95", p95), ("99", p99))])
+    manager = sender.manager
+    if manager is not None:
+        _metric(lines, "rc_heartbeat_interval_seconds", "gauge", "Heartbeat interval planned by the link manager",
+                [((), float(manager.heartbeat_interval))])
+        _metric(lines, "rc_critical_copies", "gauge", "Extra copies planned per critical send",
+                [((), manager.copies)])
+
+    telemetry = sender.telemetry
+    state = None if telemetry is None else telemetry.state
+    if state is not None:
+        _metric(lines, "rc_telemetry_bytes_total", "counter", "Telemetry bytes received, IP/UDP headers included",
+                [((), telemetry.bytes)])
+        _metric(lines, "rc_bot_pwm", "gauge", "Signed motor PWM the bot reports driving",
+                [((("motor", "left"),), state.left), ((("motor", "right"),), state.right)])
+        _metric(lines, "rc_bot_uptime_seconds", "gauge", "Bot uptime at its latest telemetry",
+                [((), state.uptime_ms / 1000)])
+        _metric(lines, "rc_bot_timeouts_total", "counter", "Command timeout stops since the bot booted",
+                [((), state.timeouts)])
+        if state.lag is not None:
+            _metric(lines, "rc_bot_seq_lag", "gauge", "Packets sent after the one the bot last applied",
+                    [((), state.lag)])
+
+    _histogram(lines, "rc_input_latency_seconds", "Input edge to sendto", sender.input_latency)
+    _metric(lines, "rc_frames_total", "counter", "UI frames drawn", [((), metrics.frames)])
+    _histogram(lines, "rc_frame_time_seconds", "Start-to-start UI frame time", metrics.frame_time)
+    _metric(lines, "rc_command", "gauge", "Current command (1 for the active one)",
+            [((("command", COMMAND_NAMES[metrics.command]),), 1)])
+    _metric(lines, "rc_speed", "gauge", "Current speed setting (PWM)", [((), metrics.speed)])
+    _metric(lines, "rc_command_changes_total", "counter", "Command changes handed to the sender",
+            [((), metrics.command_changes)])
+    return "\n".join(lines) + "\n"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = self.server.owner.scrape().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # one line per scrape would bury the controller's console
+
+
+class MetricsServer:
+    """Prometheus endpoint for a CommandSender, served on its own thread"""
+
+    def __init__(self, sender, metrics, host=METRICS_HOST, port=METRICS_PORT):
+        self.sender = sender
+        self.metrics = metrics
+        self.scrapes = 0
+        self._httpd = HTTPServer((host, port), _Handler)  # one scrape at a time
+        self._httpd.owner = self
+        self.address = self._httpd.server_address
+        self._last = (time.perf_counter(), 0)  # (time, packets_sent) at the previous scrape
+        self._thread = None
+
+    def scrape(self):
+        """The current exposition text"""
+        now = time.perf_counter()
+        packets = self.sender.packets_sent
+        last_t, last_packets = self._last
+        rate = (packets - last_packets) / (now - last_t) if now > last_t else 0.0
+        self._last = (now, packets)
+        self.scrapes += 1
+        return render_metrics(self.sender, self.metrics, rate)
+
+    def start(self):
+        """Start serving"""
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="metrics", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop serving and close the socket"""
+        if self._thread is not None:
+            self._httpd.shutdown()
+            self._thread.join()
+            self._thread = None
+        self._httpd.server_close()
+
+
+def open_metrics_server(sender, metrics, host=METRICS_HOST, port=METRICS_PORT):
+    """A started MetricsServer, or None (with a warning) if the port can't be bound"""
+    try:
+        server = MetricsServer(sender, metrics, host, port)
+    except OSError as e:
+        print(f"Warning: metrics endpoint disabled, can't listen on {host}:{port}: {e}")
+        return None
+    return server.start()
@@ -0,0 +1,357 @@
+import argparse
+import random
+import socket
+import time
+
+import pygame
+
+from protocol import (
+    CMD_STOP, CMD_FORWARD, CMD_BACKWARD, CMD_LEFT, CMD_RIGHT, CMD_DRIVE, COMMAND_NAMES,
+    DEFAULT_SPEED, MAX_SPEED, SPEED_STEP, PROTO_BINARY, clamp_speed,
+)
+from frame_clock import FrameClock
+from gamepad import open_gamepad
+from keymap import Keymap, check_keymaps
+from link_manager import report_lines
+from recorder import SessionRecorder, session_path
+from render_engine import Label, RenderEngine
+from sender import CommandSender, MultiSender, MODE_CHANGE
+
+# ============================================
+# CONFIGURATION - ONE ENTRY PER BOT
+# ============================================
+# Every bot gets its own keymap (action -> tuple of keys), speed and link
+# stats. All of them are sent from one thread over one shared socket, each
+# tick serving every bot.
+# Add "gamepad": <joystick index> to a bot to drive it with an analog stick.
+#
+#   python multi_bot.py --emulate    # every bot on a local receiver emulator
+#   python multi_bot.py --selftest   # input-to-wire latency per bot for 1, 4 and 8 bots
+BOTS = [
+    {"name": "TUG OF WAR", "ip": "10.67.214.228", "port": 4210,
+     "keys": {"up": (pygame.K_w,), "down": (pygame.K_s,), "left": (pygame.K_a,), "right": (pygame.K_d,),
+              "faster": (pygame.K_e,), "slower": (pygame.K_q,)}},
+    {"name": "SOCCER", "ip": "10.67.214.229", "port": 4210,
+     "keys": {"up": (pygame.K_UP,), "down": (pygame.K_DOWN,), "left": (pygame.K_LEFT,),
+              "right": (pygame.K_RIGHT,), "faster": (pygame.K_PERIOD,), "slower": (pygame.K_COMMA,)}},
+    {"name": "WRESTLING", "ip": "10.67.214.230", "port": 4210,
+     "keys": {"up": (pygame.K_i,), "down": (pygame.K_k,), "left": (pygame.K_j,), "right": (pygame.K_l,),
+              "faster": (pygame.K_o,), "slower": (pygame.K_u,)}},
+    {"name": "BALLOON POP", "ip": "10.67.214.231", "port": 4210,
+     "keys": {"up": (pygame.K_KP8,), "down": (pygame.K_KP5,), "left": (pygame.K_KP4,),
+              "right": (pygame.K_KP6,), "faster": (pygame.K_KP9,), "slower": (pygame.K_KP7,)}},
+]
+
+SEND_RATE = 100  # Hz - one tick serves every bot
+SEND_MODE = MODE_CHANGE
+HEARTBEAT_INTERVAL = 0.1  # s
+PROTOCOL = PROTO_BINARY
+ACK_MODE = True
+ADAPTIVE_LINK = True  # see link_manager.py
+FPS = 30
+RECORD_DIR = "recordings"  # one log per bot (None to disable)
+
+# ============================================
+# Colors / Layout
+# ============================================
+BLACK = (0, 0, 0)
+WHITE = (255, 255, 255)
+GREEN = (0, 255, 0)
+RED = (255, 0, 0)
+GRAY = (100, 100, 100)
+DARK_GRAY = (40, 40, 40)
+GOLD = (255, 215, 0)
+
+COLUMNS = 2
+PANEL_WIDTH, PANEL_HEIGHT = 290, 130
+MARGIN = 10
+HEADER_HEIGHT = 50
+
+
+class Bot:
+    """One bot: its keys, speed and sender"""
+
+    def __init__(self, config, sock):
+        self.name = config["name"]
+        self.keymap = Keymap(config["keys"])
+        self.address = (config["ip"], config["port"])
+        self.gamepad_index = config.get("gamepad")
+        self.gamepad = None
+        self.speed = DEFAULT_SPEED
+        self.command = CMD_STOP
+        self.drive = None
+        self.labels = None  # panel text, set up once the fonts exist
+        self._link_label_cache = (None, ("RTT off", ""))  # (snapshot, labels made from it)
+        slug = self.name.lower().replace(" ", "-")
+        recorder = SessionRecorder(session_path(RECORD_DIR, slug)) if RECORD_DIR else None
+        self.sender = CommandSender(sock, self.address, SEND_RATE, mode=SEND_MODE,
+                                    heartbeat_interval=HEARTBEAT_INTERVAL,
+                                    protocol=PROTOCOL, ack=ACK_MODE, recorder=recorder,
+                                    adaptive=ADAPTIVE_LINK)
+
+    def update(self, keys, input_ns=None):
+        """Pick this bot's command from the shared key state and publish it"""
+        self.command = self.keymap.command(self.keymap.mask(keys))
+
+        # Analog stick drives when this bot's keys are idle
+        self.drive = None
+        if self.gamepad is not None and self.command == CMD_STOP:
+            drive = self.gamepad.read()
+            if drive != (0, 0):
+                self.drive = drive
+        if self.drive is not None:
+            self.command = CMD_DRIVE
+            self.sender.set_drive(*self.drive, input_ns=input_ns)
+        else:
+            self.sender.set_command(self.command, self.speed, input_ns)
+
+    def on_key(self, key):
+        """Speed keys; returns True if the key belonged to this bot"""
+        action = self.keymap.edge_action(key)
+        if action == "faster":
+            self.speed = clamp_speed(self.speed + SPEED_STEP)
+        elif action == "slower":
+            self.speed = clamp_speed(self.speed - SPEED_STEP)
+        else:
+            return False
+        if self.gamepad is not None:
+            self.gamepad.mixer.set_max_pwm(self.speed)
+        return True
+
+    def link_labels(self):
+        """RTT percentiles and loss labels for the panel (formatted once per snapshot)"""
+        if self.sender.link is None:
+            return self._link_label_cache[1]
+        snapshot = self.sender.link.snapshot()
+        if snapshot is not self._link_label_cache[0]:
+            p50, p95, p99, loss = snapshot
+            rtt = "RTT --" if p50 is None else f"RTT {p50:.1f}/{p95:.1f}/{p99:.1f}ms"
+            loss_text = "" if loss is None else f"  loss {loss:.1%}"
+            self._link_label_cache = (snapshot, (rtt, loss_text))
+        return self._link_label_cache[1]
+
+
+def panel_rect(index):
+    """Screen rect of a bot's panel"""
+    col, row = index % COLUMNS, index // COLUMNS
+    return pygame.Rect(MARGIN + col * (PANEL_WIDTH + MARGIN),
+                       HEADER_HEIGHT + row * (PANEL_HEIGHT + MARGIN),
+                       PANEL_WIDTH, PANEL_HEIGHT)
+
+
+def selftest(counts=(1, 4, 8), edges=300):
+    """Input-to-wire latency per bot with 1, 4 and 8 bots on receiver emulators"""
+    from receiver_emulator import ReceiverEmulator
+
+    commands = (CMD_FORWARD, CMD_BACKWARD, CMD_LEFT, CMD_RIGHT, CMD_STOP)
+    print(f"One MultiSender at {SEND_RATE} Hz ({SEND_MODE}), {edges} key edges on random bots")
+    for count in counts:
+        emulators = [ReceiverEmulator(port=0).start() for _ in range(count)]
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.setblocking(False)
+        senders = [CommandSender(sock, ("127.0.0.1", emulator.port), SEND_RATE, mode=SEND_MODE,
+                                 heartbeat_interval=HEARTBEAT_INTERVAL, protocol=PROTOCOL,
+                                 ack=ACK_MODE, adaptive=ADAPTIVE_LINK)
+                   for emulator in emulators]
+        multi_sender = MultiSender(sock, senders, SEND_RATE)
+        multi_sender.start()
+        time.sleep(0.1)
+
+        # A key edge on one bot, as handle_event() publishes it
+        last = [CMD_STOP] * count
+        for _ in range(edges):
+            i = random.randrange(count)
+            last[i] = random.choice([cmd for cmd in commands if cmd != last[i]])
+            senders[i].set_command(last[i], DEFAULT_SPEED, time.perf_counter_ns())
+            multi_sender.wake()
+            time.sleep(random.uniform(0.002, 0.02))
+
+        multi_sender.stop(final=CMD_STOP)
+        sock.close()
+        for emulator in emulators:
+            emulator.stop()
+
+        latencies = [sender.input_latency for sender in senders]
+        worst = max(latencies, key=lambda latency: latency.max_ns)
+        print(f"  {count} bot(s): worst bot max {worst.max_ns / 1e6:.3f} ms")
+        for i, latency in enumerate(latencies):
+            if latency.count:
+                print(f"    bot{i + 1}: {latency.count} edges, mean {latency.mean_ms():.3f} ms, "
+                      f"p95 <= {latency.percentile_ms(0.95):g} ms, max {latency.max_ns / 1e6:.3f} ms")
+            else:
+                print(f"    bot{i + 1}: no edges")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Drive several bots from one controller")
+    parser.add_argument("--emulate", action="store_true",
+                        help="point every bot at a local receiver emulator (127.0.0.1:4210+i)")
+    parser.add_argument("--selftest", action="store_true",
+                        help="measure input-to-wire latency per bot for 1, 4 and 8 emulated bots")
+    args = parser.parse_args()
+    if args.selftest:
+        selftest()
+        return
+
+    configs = [dict(config) for config in BOTS]
+    emulators = []
+    if args.emulate:
+        from receiver_emulator import ReceiverEmulator
+        for i, config in enumerate(configs):
+            config["ip"], config["port"] = "127.0.0.1", 4210 + i
+            emulators.append(ReceiverEmulator(port=config["port"]).start())
+
+    # One non-blocking socket for every bot
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setblocking(False)
+    bots = [Bot(config, sock) for config in configs]
+    multi_sender = MultiSender(sock, [bot.sender for bot in bots], SEND_RATE)
+
+    pygame.init()
+    rows = (len(bots) + COLUMNS - 1) // COLUMNS
+    width = MARGIN + COLUMNS * (PANEL_WIDTH + MARGIN)
+    height = HEADER_HEIGHT + rows * (PANEL_HEIGHT + MARGIN)
+    screen = pygame.display.set_mode((width, height))
+    pygame.display.set_caption(f"Multi-Bot Controller - {len(bots)} bots")
+    clock = FrameClock(FPS)
+    title_font = pygame.font.Font(None, 40)
+    font = pygame.font.Font(None, 28)
+    small_font = pygame.font.Font(None, 20)
+    line = small_font.get_height()
+
+    for bot in bots:
+        if bot.gamepad_index is not None and PROTOCOL == PROTO_BINARY:
+            bot.gamepad = open_gamepad(bot.gamepad_index, bot.speed)
+        # Text is rendered again only when what it shows changes
+        bot.labels = {
+            "cmd": Label(font, "{}  @ {}", WHITE),
+            "drive": Label(font, "DRIVE {}/{}", WHITE),
+            "status": Label(small_font, "{}{}", GREEN),
+            "link": Label(small_font, "{}   pkts {}", WHITE),
+        }
+
+    def draw_static_layer(surface):
+        surface.fill(DARK_GRAY)
+        title = title_font.render("MULTI-BOT CONTROL", True, GOLD)
+        surface.blit(title, (width//2 - title.get_width()//2, 12))
+        for i, bot in enumerate(bots):
+            rect = panel_rect(i)
+            pygame.draw.rect(surface, BLACK, rect, border_radius=8)
+            pygame.draw.rect(surface, GOLD, rect, 2, border_radius=8)
+            surface.blit(font.render(bot.name, True, GOLD), (rect.x + 10, rect.y + 8))
+            target = small_font.render(f"{bot.address[0]}:{bot.address[1]}", True, GRAY)
+            surface.blit(target, (rect.right - target.get_width() - 10, rect.y + 12))
+
+    def draw_text(text_surf, x, y):
+        screen.blit(text_surf, (x, y))
+
+    def draw_speed_bar(rect, speed):
+        pygame.draw.rect(screen, DARK_GRAY, rect)
+        pygame.draw.rect(screen, GREEN, (rect.x, rect.y, int(speed / MAX_SPEED * rect.width), rect.height))
+        pygame.draw.rect(screen, WHITE, rect, 1)
+
+    engine = RenderEngine(screen)
+    engine.build_background(draw_static_layer)
+
+    # Widget rects per panel
+    layouts = []
+    for i in range(len(bots)):
+        rect = panel_rect(i)
+        layouts.append({
+            "cmd": pygame.Rect(rect.x + 10, rect.y + 36, rect.width - 20, font.get_height()),
+            "status": pygame.Rect(rect.x + 10, rect.y + 64, rect.width - 20, line),
+            "link": pygame.Rect(rect.x + 10, rect.y + 84, rect.width - 20, line),
+            "bar": pygame.Rect(rect.x + 10, rect.y + 106, rect.width - 20, 12),
+        })
+
+    def draw_panels():
+        for i, bot in enumerate(bots):
+            layout = layouts[i]
+            labels = bot.labels
+            sender = bot.sender
+            if bot.drive is not None:
+                cmd_text = labels["drive"].get(*bot.drive)
+            else:
+                cmd_text = labels["cmd"].get(COMMAND_NAMES[bot.command], bot.speed)
+            engine.widget(f"cmd{i}", layout["cmd"], cmd_text,
+                          draw_text, cmd_text, layout["cmd"].x, layout["cmd"].y)
+
+            rtt, loss_text = bot.link_labels()
+            labels["status"].color = GREEN if sender.status == "CONNECTED" else RED
+            status_text = labels["status"].get(sender.status, loss_text)
+            engine.widget(f"status{i}", layout["status"], status_text,
+                          draw_text, status_text, layout["status"].x, layout["status"].y)
+
+            link_text = labels["link"].get(rtt, sender.packets_sent)
+            engine.widget(f"link{i}", layout["link"], link_text,
+                          draw_text, link_text, layout["link"].x, layout["link"].y)
+
+            engine.widget(f"bar{i}", layout["bar"], bot.speed, draw_speed_bar, layout["bar"], bot.speed)
+
+    print("=" * 60)
+    print(f"Multi-Bot Controller - {len(bots)} bots, one socket, {SEND_RATE} Hz")
+    print("=" * 60)
+    for bot in bots:
+        pad = f"  (gamepad: {bot.gamepad.name})" if bot.gamepad is not None else ""
+        print(f"  {bot.name:<12} -> {bot.address[0]}:{bot.address[1]}{pad}")
+    for problem in check_keymaps((bot.name, bot.keymap) for bot in bots):
+        print(f"Warning: keymap: {problem}")
+    print("=" * 60)
+
+    # Key edges are sent from the handler, not at the next frame
+    key_owner = {}
+    for bot in bots:
+        for key in list(bot.keymap.key_bits) + list(bot.keymap.key_actions):
+            key_owner.setdefault(key, bot)
+    running = True
+
+    def handle_event(event):
+        nonlocal running
+        if event.type == pygame.QUIT:
+            running = False
+        elif event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE:
+            running = False
+        elif event.type in (pygame.KEYDOWN, pygame.KEYUP) and event.key in key_owner:
+            input_ns = time.perf_counter_ns()
+            bot = key_owner[event.key]
+            if event.type == pygame.KEYDOWN:
+                bot.on_key(event.key)
+            bot.update(pygame.key.get_pressed(), input_ns)
+            multi_sender.wake()
+
+    multi_sender.start()
+    try:
+        while running:
+            for event in pygame.event.get():
+                handle_event(event)
+
+            # One key-state read serves every bot (and catches a lost KEYUP)
+            keys = pygame.key.get_pressed()
+            for bot in bots:
+                bot.update(keys)
+
+            draw_panels()
+            engine.present()
+            clock.wait(handle_event)
+    except KeyboardInterrupt:
+        print("\n\nInterrupted by user")
+    finally:
+        multi_sender.stop(final=CMD_STOP)  # Stop every bot before exiting
+        pygame.quit()
+        sock.close()
+        for emulator in emulators:
+            emulator.stop()
+
+    for bot in bots:
+        stats = bot.sender.session_stats()
+        print(f"{bot.name:<12} sent {stats['packets_sent']} "
+              f"(saved {stats['saved_vs_stream']} vs streaming)")
+        for line in report_lines(stats):
+            print(f"{'':<12} {line}")
+        if bot.sender.recorder is not None:
+            print(f"{'':<12} recorded to {bot.sender.recorder.path}")
+    print("\n✓ Controller stopped.")
+
+
+if __name__ == "__main__":
+    main()
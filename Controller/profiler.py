@@ -0,0 +1,153 @@
+import csv
+import time
+from array import array
+
+# ============================================
+# Frame Profiler
+# ============================================
+# Times each phase of the main loop with perf_counter_ns into fixed-size
+# ring buffers (one array('q') per phase, one slot per frame), so a long
+# session never grows memory or allocates on the hot path.
+#
+#   profiler.begin_frame()
+#   ...poll events...
+#   profiler.mark(P_EVENTS)     # time since the previous mark
+#   ...
+#   profiler.end_frame()
+#
+# While disabled, begin_frame/mark/end_frame are bound to a no-op, so the
+# instrumentation left in the loop costs one attribute lookup and an empty
+# call per mark. The overlay summary (averages over the last frames and the
+# worst frame) is recomputed at most every refresh_interval.
+
+PHASES = ("events", "input", "send", "draw", "flip", "idle")
+P_EVENTS, P_INPUT, P_SEND, P_DRAW, P_FLIP, P_IDLE = range(len(PHASES))
+
+DEFAULT_CAPACITY = 3600  # frames kept for the CSV (2 min at 30 FPS)
+OVERLAY_WINDOW = 90  # frames averaged on the overlay
+
+
+def _noop(*args):
+    pass
+
+
+class FrameProfiler:
+    """Per-phase frame timings in ring buffers, with overlay and CSV export"""
+
+    def __init__(self, phases=PHASES, capacity=DEFAULT_CAPACITY, enabled=False,
+                 window=OVERLAY_WINDOW, refresh_interval=0.25):
+        self.phases = tuple(phases)
+        self.capacity = capacity
+        self.window = min(window, capacity)
+        self.refresh_interval = refresh_interval
+        self.frames = 0
+        self._samples = [array("q", bytes(8 * capacity)) for _ in self.phases]
+        self._starts = array("q", bytes(8 * capacity))
+        self._slot = 0
+        self._last = 0
+        self._t0 = time.perf_counter_ns()
+        self._summary = None
+        self._summary_at = 0.0
+        self.enabled = False
+        self.begin_frame = self.mark = self.end_frame = _noop
+        if enabled:
+            self.toggle()
+
+    def toggle(self):
+        """Switch timing (and the overlay) on or off; returns the new state"""
+        self.enabled = not self.enabled
+        if self.enabled:
+            self.begin_frame, self.mark, self.end_frame = self._begin_frame, self._mark, self._end_frame
+            self._begin_frame()  # toggled mid-frame: time the rest of it
+        else:
+            self.begin_frame = self.mark = self.end_frame = _noop
+        self._summary = None
+        return self.enabled
+
+    # ----- Hot path -----
+
+    def _begin_frame(self):
+        self._last = time.perf_counter_ns()
+        self._starts[self._slot] = self._last - self._t0
+        # A phase skipped this frame (e.g. no mark) must not keep an old sample
+        for row in self._samples:
+            row[self._slot] = 0
+
+    def _mark(self, phase):
+        now = time.perf_counter_ns()
+        self._samples[phase][self._slot] = now - self._last
+        self._last = now
+
+    def _end_frame(self):
+        self._slot = (self._slot + 1) % self.capacity
+        self.frames += 1
+
+    # ----- Results -----
+
+    def _recent_slots(self, count):
+        # Ring slots of the last count frames, oldest first
+        count = min(count, self.frames, self.capacity)
+        return [(self._slot - count + i) % self.capacity for i in range(count)]
+
+    def summary(self):
+        """(average ms per phase, average frame ms, worst frame ms, its slowest phase)
+
+        Over the last window frames; None before the first frame.
+        """
+        now = time.perf_counter()
+        if self._summary is not None and now - self._summary_at < self.refresh_interval:
+            return self._summary
+        slots = self._recent_slots(self.window)
+        if not slots:
+            return None
+        rows = self._samples
+        averages = tuple(sum(row[i] for i in slots) / len(slots) / 1e6 for row in rows)
+        totals = [sum(row[i] for row in rows) for i in slots]
+        worst = max(range(len(slots)), key=totals.__getitem__)
+        worst_phase = max(range(len(rows)), key=lambda p: rows[p][slots[worst]])
+        self._summary = (averages, sum(totals) / len(totals) / 1e6, totals[worst] / 1e6,
+                         self.phases[worst_phase])
+        self._summary_at = now
+        return self._summary
+
+    def overlay_lines(self):
+        """Text lines for the on-screen overlay"""
+        summary = self.summary()
+        if summary is None:
+            return ("profiling...",)
+        averages, frame_ms, worst_ms, worst_phase = summary
+        lines = [f"{name:<7}{ms:6.2f} ms" for name, ms in zip(self.phases, averages)]
+        lines.append(f"frame  {frame_ms:6.2f} ms")
+        lines.append(f"worst  {worst_ms:6.2f} ms")
+        lines.append(f"  ({worst_phase})")  # own line keeps the box narrow
+        return tuple(lines)
+
+    def save_csv(self, path):
+        """Write every frame still in the ring (times in microseconds); returns rows"""
+        slots = self._recent_slots(self.capacity)
+        with open(path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(("frame", "t_ms") + tuple(f"{name}_us" for name in self.phases)
+                            + ("total_us",))
+            first = self.frames - len(slots)
+            for n, i in enumerate(slots):
+                values = [row[i] / 1000 for row in self._samples]
+                writer.writerow([first + n, f"{self._starts[i] / 1e6:.3f}"]
+                                + [f"{v:.1f}" for v in values] + [f"{sum(values):.1f}"])
+        return len(slots)
+
+
+def draw_overlay(surface, font, lines, x, y, color=(255, 255, 255), background=(0, 0, 0)):
+    """Draw the overlay text block with a dark box behind it"""
+    import pygame
+    line = font.get_linesize()
+    rect = pygame.Rect((x, y), overlay_size(font))
+    pygame.draw.rect(surface, background, rect)
+    for n, text in enumerate(lines):
+        surface.blit(font.render(text, True, color), (x + 6, y + 4 + n * line))
+    return rect
+
+
+def overlay_size(font, phases=PHASES):
+    """(width, height) of the overlay box for font, sized for the full summary"""
+    return font.size("events 000.00 ms")[0] + 12, font.get_linesize() * (len(phases) + 3) + 8
@@ -0,0 +1,309 @@
+import struct
+import time
+from collections import namedtuple
+
+# ============================================
+# Command Protocol
+# ============================================
+# Binary packet (little-endian, 14 bytes), mirrored in Reciever/src/main.cpp:
+#
+#   offset  size  field
+#   0       1     version   PROTOCOL_VERSION (never a printable ASCII command)
+#   1       1     type      PKT_COMMAND
+#   2       1     flags     FLAG_ACK_REQUEST asks the receiver to echo seq
+#   3       1     cmd       CMD_* code (for logging; the PWM fields rule)
+#                           CMD_DRIVE = free left/right mix from analog input
+#   4       2     seq       uint16, +1 per packet, wraps
+#   6       2     left      int16 absolute PWM, sign = direction (-1023..1023)
+#   8       2     right     int16 absolute PWM, sign = direction (-1023..1023)
+#   10      4     time_ms   uint32 sender clock in ms, wraps
+#
+# Speed is absolute in every packet, so a lost packet can no longer leave
+# the controller and the bot disagreeing about the speed. The old one-letter
+# ASCII packets still work as a fallback (PROTO_ASCII).
+#
+# Ack packet (receiver -> controller, 4 bytes), sent for every command
+# packet that has FLAG_ACK_REQUEST set:
+#
+#   0       1     version   PROTOCOL_VERSION
+#   1       1     type      PKT_ACK
+#   2       2     seq       echoed sequence number
+#
+# Discovery (discovery.py): the controller sends a probe, usually to the
+# broadcast address, and every receiver answers with a hello:
+#
+#   probe (6 bytes)           hello (11 bytes + name)
+#   0   1  version            0   1  version
+#   1   1  PKT_PROBE          1   1  PKT_HELLO
+#   2   4  nonce              2   4  nonce, echoed from the probe
+#                             6   4  bot_id (ESP chip ID)
+#                             10  1  caps, CAP_* bits
+#                             11  -  name, UTF-8, up to HELLO_NAME_MAX bytes
+#
+# Telemetry (receiver -> controller), streamed to whoever sends command
+# packets with FLAG_TELEMETRY set, until none arrive for TELEMETRY_IDLE_MS.
+# The receiver samples its motor PWM every TELEMETRY_SAMPLE_MS and sends
+# the samples in batches of TELEMETRY_BATCH (sooner when a timeout stops
+# the motors), so the uplink is one small packet per batch instead of one
+# per sample:
+#
+#   0       1     version          PROTOCOL_VERSION
+#   1       1     type             PKT_TELEMETRY
+#   2       1     count            samples in this batch
+#   3       1     flags            TELEM_* bits
+#   4       4     uptime_ms        millis() at the last sample
+#   8       2     last_seq         sequence number last applied
+#   10      2     timeouts         COMMAND_TIMEOUT stops since boot
+#   12      4     last_timeout_ms  millis() of the latest of those
+#   16      4*n   samples          int16 left, int16 right signed PWM,
+#                                  oldest first, TELEMETRY_SAMPLE_MS apart
+
+PROTOCOL_VERSION = 0xA1
+PKT_COMMAND = 0x01
+PKT_ACK = 0x02
+PKT_PROBE = 0x03
+PKT_HELLO = 0x04
+PKT_TELEMETRY = 0x05
+
+FLAG_ACK_REQUEST = 0x01
+FLAG_TELEMETRY = 0x02  # stream telemetry back to this sender
+
+# Receiver capabilities announced in a hello
+CAP_ASCII = 0x01
+CAP_BINARY = 0x02
+CAP_ACK = 0x04
+CAP_TELEMETRY = 0x08
+
+# Telemetry flags
+TELEM_TIMED_OUT = 0x01   # the motors are stopped by the command timeout
+TELEM_SEQ_VALID = 0x02   # last_seq holds an applied packet
+
+COMMAND_PACKET = struct.Struct("<BBBBHhhI")
+ACK_PACKET = struct.Struct("<BBH")
+PROBE_PACKET = struct.Struct("<BBI")
+HELLO_PACKET = struct.Struct("<BBIIB")
+HELLO_NAME_MAX = 32
+TELEMETRY_HEADER = struct.Struct("<BBBBIHHI")
+TELEMETRY_SAMPLE = struct.Struct("<hh")
+TELEMETRY_SAMPLE_MS = 20
+TELEMETRY_BATCH = 10  # samples per packet: 56 bytes every 200 ms
+TELEMETRY_IDLE_MS = 1000
+
+PROTO_BINARY = "binary"
+PROTO_ASCII = "ascii"
+
+# Command codes
+CMD_STOP = 0
+CMD_FORWARD = 1
+CMD_BACKWARD = 2
+CMD_LEFT = 3
+CMD_RIGHT = 4
+CMD_UP_LEFT = 5
+CMD_UP_RIGHT = 6
+CMD_DOWN_LEFT = 7
+CMD_DOWN_RIGHT = 8
+CMD_DRIVE = 9  # binary only: left/right come straight from the analog mixer
+
+COMMAND_NAMES = (
+    "STOPPED", "FORWARD", "BACKWARD", "LEFT", "RIGHT",
+    "UPPER_LEFT", "UPPER_RIGHT", "DOWN_LEFT", "DOWN_RIGHT", "DRIVE",
+)
+
+# ASCII letters as understood by executeCommand() in the firmware
+# (CMD_DRIVE has no ASCII form)
+ASCII_LETTERS = ("S", "F", "K", "L", "E", "R", "Y", "C", "B")
+ASCII_PAYLOADS = tuple(letter.encode() for letter in ASCII_LETTERS)
+ASCII_TO_COMMAND = {letter: code for code, letter in enumerate(ASCII_LETTERS)}
+ASCII_SPEED_UP = b"+"
+ASCII_SPEED_DOWN = b"-"
+
+# Speed settings (same as the firmware)
+DEFAULT_SPEED = 512
+MIN_SPEED = 400
+MAX_SPEED = 1023
+SPEED_STEP = 100
+TURN_OFFSET = 400  # `sm` in the firmware
+
+# Per-command (direction, turn offset sign) for the left and right motor,
+# matching forward()/backward()/left()/right()/ul()/ur()/dl()/dr():
+# PWM magnitude = speed + offset sign * sm
+MOTOR_MIX = (
+    (0, 0, 0, 0),      # STOP
+    (1, 0, 1, 0),      # FORWARD
+    (-1, 0, -1, 0),    # BACKWARD
+    (-1, 0, 1, 0),     # LEFT
+    (1, 0, -1, 0),     # RIGHT
+    (1, -1, 1, 1),     # UPPER_LEFT
+    (1, 1, 1, -1),     # UPPER_RIGHT
+    (-1, -1, -1, 1),   # DOWN_LEFT
+    (-1, 1, -1, -1),   # DOWN_RIGHT
+)
+
+CommandPacket = namedtuple("CommandPacket", "version type flags cmd seq left right time_ms")
+Hello = namedtuple("Hello", "nonce bot_id caps name")
+Telemetry = namedtuple("Telemetry", "flags uptime_ms last_seq timeouts last_timeout_ms samples")
+
+
+def now_ms():
+    """Sender clock for the time_ms field"""
+    return (time.monotonic_ns() // 1_000_000) & 0xFFFFFFFF
+
+
+def clamp_speed(speed):
+    """Clamp a speed to the firmware's MIN_SPEED..MAX_SPEED"""
+    return max(MIN_SPEED, min(MAX_SPEED, speed))
+
+
+def _clamp_pwm(value, sign):
+    # The PWM output can't go below 0 or above MAX_SPEED
+    return sign * max(0, min(MAX_SPEED, value))
+
+
+def motor_pwm(cmd, speed, turn_offset=TURN_OFFSET):
+    """Signed (left, right) PWM the firmware would drive for cmd at speed"""
+    left_dir, left_turn, right_dir, right_turn = MOTOR_MIX[cmd]
+    left = _clamp_pwm(speed + left_turn * turn_offset, left_dir)
+    right = _clamp_pwm(speed + right_turn * turn_offset, right_dir)
+    return left, right
+
+
+class PacketEncoder:
+    """Packs command packets into one preallocated buffer"""
+
+    def __init__(self):
+        self.buffer = bytearray(COMMAND_PACKET.size)
+        self.seq = 0
+
+    def encode(self, cmd, left, right, flags=0):
+        """Pack the next packet; the returned buffer is reused by the next call"""
+        self.seq = (self.seq + 1) & 0xFFFF
+        COMMAND_PACKET.pack_into(self.buffer, 0, PROTOCOL_VERSION, PKT_COMMAND,
+                                 flags, cmd, self.seq, left, right, now_ms())
+        return self.buffer
+
+
+def encode_ack(seq):
+    """Ack packet echoing seq"""
+    return ACK_PACKET.pack(PROTOCOL_VERSION, PKT_ACK, seq)
+
+
+def decode_ack(data):
+    """Echoed sequence number of an ack packet, or None if it isn't one"""
+    if len(data) != ACK_PACKET.size or data[0] != PROTOCOL_VERSION or data[1] != PKT_ACK:
+        return None
+    return ACK_PACKET.unpack_from(data)[2]
+
+
+def encode_probe(nonce):
+    """Discovery probe carrying nonce"""
+    return PROBE_PACKET.pack(PROTOCOL_VERSION, PKT_PROBE, nonce)
+
+
+def decode_probe(data):
+    """Nonce of a probe packet, or None if it isn't one"""
+    if len(data) != PROBE_PACKET.size or data[0] != PROTOCOL_VERSION or data[1] != PKT_PROBE:
+        return None
+    return PROBE_PACKET.unpack_from(data)[2]
+
+
+def encode_hello(nonce, bot_id, caps, name):
+    """Reply to a probe: who this receiver is and what it understands"""
+    return (HELLO_PACKET.pack(PROTOCOL_VERSION, PKT_HELLO, nonce, bot_id, caps)
+            + name.encode()[:HELLO_NAME_MAX])
+
+
+def decode_hello(data):
+    """Hello from a hello packet, or None if it isn't one"""
+    if (len(data) < HELLO_PACKET.size or len(data) > HELLO_PACKET.size + HELLO_NAME_MAX
+            or data[0] != PROTOCOL_VERSION or data[1] != PKT_HELLO):
+        return None
+    _, _, nonce, bot_id, caps = HELLO_PACKET.unpack_from(data)
+    name = bytes(data[HELLO_PACKET.size:]).decode(errors="replace")
+    return Hello(nonce, bot_id, caps, name)
+
+
+def encode_telemetry(flags, uptime_ms, last_seq, timeouts, last_timeout_ms, samples):
+    """Telemetry batch; samples are (left, right) pairs, oldest first"""
+    packet = bytearray(TELEMETRY_HEADER.size + TELEMETRY_SAMPLE.size * len(samples))
+    TELEMETRY_HEADER.pack_into(packet, 0, PROTOCOL_VERSION, PKT_TELEMETRY, len(samples), flags,
+                               uptime_ms & 0xFFFFFFFF, last_seq, timeouts & 0xFFFF,
+                               last_timeout_ms & 0xFFFFFFFF)
+    for i, (left, right) in enumerate(samples):
+        TELEMETRY_SAMPLE.pack_into(packet, TELEMETRY_HEADER.size + i * TELEMETRY_SAMPLE.size,
+                                   left, right)
+    return packet
+
+
+def decode_telemetry(data):
+    """Telemetry from a telemetry packet, or None if it isn't one"""
+    if (len(data) < TELEMETRY_HEADER.size or data[0] != PROTOCOL_VERSION
+            or data[1] != PKT_TELEMETRY
+            or len(data) != TELEMETRY_HEADER.size + data[2] * TELEMETRY_SAMPLE.size):
+        return None
+    _, _, count, flags, uptime_ms, last_seq, timeouts, last_timeout_ms = \
+        TELEMETRY_HEADER.unpack_from(data)
+    samples = tuple(TELEMETRY_SAMPLE.iter_unpack(bytes(data[TELEMETRY_HEADER.size:])))
+    return Telemetry(flags, uptime_ms, last_seq, timeouts, last_timeout_ms, samples)
+
+
+def seq_newer(seq, last):
+    """True if seq comes after last in uint16 serial-number order"""
+    return 0 < ((seq - last) & 0xFFFF) < 0x8000
+
+
+class PacketDecoder:
+    """Decodes command packets, rejecting stale and out-of-order ones"""
+
+    def __init__(self, max_delay_ms=300, resync_after_ms=1000):
+        self.max_delay_ms = max_delay_ms
+        self.resync_after_ms = resync_after_ms
+        self.last_seq = None
+        self.last_accept_ms = None
+        self.min_offset = None
+        self.accepted = 0
+        self.duplicates = 0
+        self.out_of_order = 0
+        self.stale = 0
+        self.malformed = 0
+
+    def decode(self, data, local_ms=None):
+        """Return a CommandPacket, or None if it must not be applied"""
+        if len(data) != COMMAND_PACKET.size or data[0] != PROTOCOL_VERSION:
+            self.malformed += 1
+            return None
+        packet = CommandPacket._make(COMMAND_PACKET.unpack(data))
+        if packet.type != PKT_COMMAND:
+            self.malformed += 1
+            return None
+
+        if local_ms is None:
+            local_ms = now_ms()
+
+        # After a long silence (e.g. controller restart) accept whatever
+        # comes next and relearn the sequence and clock offset
+        if (self.last_accept_ms is not None
+                and ((local_ms - self.last_accept_ms) & 0xFFFFFFFF) > self.resync_after_ms):
+            self.last_seq = None
+            self.min_offset = None
+
+        if self.last_seq is not None and not seq_newer(packet.seq, self.last_seq):
+            if packet.seq == self.last_seq:
+                self.duplicates += 1
+            else:
+                self.out_of_order += 1
+            return None
+
+        # The smallest clock offset seen is the fastest delivery; anything
+        # arriving much later than that has sat in a queue too long
+        offset = (local_ms - packet.time_ms) & 0xFFFFFFFF
+        delay = None if self.min_offset is None else (offset - self.min_offset) & 0xFFFFFFFF
+        if delay is None or delay > 0x7FFFFFFF:
+            self.min_offset = offset
+        elif delay > self.max_delay_ms:
+            self.stale += 1
+            return None
+
+        self.last_seq = packet.seq
+        self.last_accept_ms = local_ms
+        self.accepted += 1
+        return packet
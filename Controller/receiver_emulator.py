@@ -0,0 +1,349 @@
+import argparse
+import csv
+import selectors
+import socket
+import threading
+import time
+from collections import namedtuple
+
+from protocol import (
+    PROTOCOL_VERSION, COMMAND_PACKET, FLAG_ACK_REQUEST, DEFAULT_SPEED,
+    MIN_SPEED, MAX_SPEED, SPEED_STEP, TURN_OFFSET, CAP_ASCII, CAP_BINARY, CAP_ACK,
+    CAP_TELEMETRY, FLAG_TELEMETRY, TELEM_TIMED_OUT, TELEM_SEQ_VALID, TELEMETRY_SAMPLE_MS,
+    TELEMETRY_BATCH, TELEMETRY_IDLE_MS, PacketDecoder, encode_ack, decode_probe, encode_hello,
+    encode_telemetry,
+)
+
+# ============================================
+# ESP8266 Receiver Emulator
+# ============================================
+# A local stand-in for Reciever/src/main.cpp, so the controllers can be run
+# and benchmarked without a flashed board. It follows the firmware step by
+# step: each loop() drains every pending datagram, dispatches binary packets
+# (with the same sequence/staleness checks and ack echo) or one-letter ASCII
+# commands through executeCommand(), then applies the COMMAND_TIMEOUT stop.
+# Every change of the motor pins is appended to a timestamped trace.
+#
+# Discovery probes are answered with a hello like the firmware's. The
+# emulator's bot ID defaults to one derived from its port, so a restarted
+# emulator on the same port is the same bot to the controller's cache.
+# Bind to 0.0.0.0 to be found by broadcast probes.
+#
+# Telemetry is sampled and batched like the firmware does it: every
+# TELEMETRY_SAMPLE_MS the signed motor PWM is appended to a batch that goes
+# to the last sender of a FLAG_TELEMETRY packet when it is full, or at once
+# when the command timeout stops the motors.
+#
+#   python receiver_emulator.py                  # listen on 127.0.0.1:4210
+#   python receiver_emulator.py --trace run.csv  # save the motor trace
+#   python receiver_emulator.py --host 0.0.0.0   # discoverable by broadcast
+
+LOCAL_PORT = 4210
+EMULATOR_ID_BASE = 0xE0000000  # | port, when no bot_id is given
+CAPABILITIES = CAP_ASCII | CAP_BINARY | CAP_ACK | CAP_TELEMETRY
+COMMAND_TIMEOUT_MS = 300
+RESYNC_AFTER_MS = 1000
+
+# direction: 1 = FWD pin high, -1 = BWD pin high, 0 = both low
+MotorSample = namedtuple("MotorSample", "t cause left_dir left_pwm right_dir right_pwm")
+
+
+def analog_write(value):
+    """ESP8266 analogWrite clamps to 0..analogScale (1023)"""
+    return max(0, min(MAX_SPEED, value))
+
+
+class ReceiverEmulator:
+    """Runs the firmware's loop() against a UDP socket on its own thread"""
+
+    def __init__(self, host="127.0.0.1", port=LOCAL_PORT, loop_interval=0.001,
+                 verbose=False, bot_id=None, name=None):
+        self.host = host
+        self.port = port
+        self.bot_id = bot_id
+        self.name = name
+        self.loop_interval = loop_interval
+        self.verbose = verbose
+
+        # Firmware state
+        self.current_speed = DEFAULT_SPEED
+        self.sm = TURN_OFFSET
+        self.last_command = "S"
+        self.last_command_time = 0
+        self.decoder = PacketDecoder(COMMAND_TIMEOUT_MS, RESYNC_AFTER_MS)
+        self.left_dir = 0
+        self.left_pwm = 0
+        self.right_dir = 0
+        self.right_pwm = 0
+        self.last_timeout_ms = 0
+        self.timed_out = False  # stopped by the timeout, no command since
+        self.telemetry_to = None  # address of the controller asking for telemetry
+        self.telemetry_request_ms = 0
+        self.samples = []
+        self.next_sample_ms = 0
+        self.flush_telemetry = False
+
+        # Instrumentation
+        self.trace = []
+        self.packets_received = 0
+        self.acks_sent = 0
+        self.hellos_sent = 0
+        self.telemetry_sent = 0
+        self.timeouts = 0
+        self.loops = 0
+        self.max_drain = 0
+
+        self._dispatch = {
+            "R": self.ul, "Y": self.ur, "C": self.dl, "B": self.dr,
+            "F": self.forward, "K": self.backward, "L": self.left, "E": self.right,
+            "S": self.stop_motors, "+": self.increase_speed, "-": self.decrease_speed,
+        }
+
+        self.sock = None
+        self._selector = None
+        self._buffer = bytearray(255)
+        self._running = False
+        self._thread = None
+        self._t0 = time.perf_counter()
+
+    # ----- Arduino runtime -----
+
+    def millis(self):
+        return int((time.perf_counter() - self._t0) * 1000)
+
+    def _write_motors(self, cause, left_dir, left_pwm, right_dir, right_pwm):
+        left_pwm = analog_write(left_pwm)
+        right_pwm = analog_write(right_pwm)
+        state = (left_dir, left_pwm, right_dir, right_pwm)
+        if state != (self.left_dir, self.left_pwm, self.right_dir, self.right_pwm):
+            self.trace.append(MotorSample(time.perf_counter(), cause, *state))
+        self.left_dir, self.left_pwm, self.right_dir, self.right_pwm = state
+
+    def _serial(self, text):
+        if self.verbose:
+            print(text, end="", flush=True)
+
+    # ----- Lifecycle -----
+
+    def start(self):
+        """Bind the UDP port and start loop() on a background thread"""
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind((self.host, self.port))
+        self.port = self.sock.getsockname()[1]  # resolve port 0
+        if self.bot_id is None:
+            self.bot_id = EMULATOR_ID_BASE | self.port
+        if self.name is None:
+            self.name = f"emulator-{self.port}"
+        self.sock.setblocking(False)
+        self._selector = selectors.DefaultSelector()
+        self._selector.register(self.sock, selectors.EVENT_READ)
+        self._t0 = time.perf_counter()
+        self.last_command_time = self.millis()
+        self.stop_motors("setup")
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="receiver-emulator", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop loop() and release the port"""
+        self._running = False
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._selector is not None:
+            self._selector.close()
+            self._selector = None
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _run(self):
+        while self._running:
+            self.loop()
+            # yield(): wait for traffic instead of spinning a core
+            self._selector.select(self.loop_interval)
+
+    # ----- Firmware -----
+
+    def loop(self):
+        """One pass of loop(): drain all pending packets, then timeout check"""
+        self.loops += 1
+        drained = 0
+        while True:
+            try:
+                length, address = self.sock.recvfrom_into(self._buffer)
+            except (BlockingIOError, InterruptedError):
+                break
+            drained += 1
+            self.packets_received += 1
+            self.handle_packet(self._buffer[:length], address)
+        self.max_drain = max(self.max_drain, drained)
+
+        # Safety timeout - auto-stop if no command received
+        if self.millis() - self.last_command_time > COMMAND_TIMEOUT_MS:
+            if self.last_command != "S":
+                self.stop_motors("timeout")
+                self.last_command = "S"
+                self.timeouts += 1
+                self.last_timeout_ms = self.millis()
+                self.timed_out = True
+                self.flush_telemetry = True
+                self._serial("\n[TIMEOUT - STOPPED]\n")
+
+        self.telemetry()
+
+    def telemetry(self):
+        """Sample the motors on schedule and send a batch when full or flushed"""
+        if self.telemetry_to is None:
+            return
+        now = self.millis()
+        if now - self.telemetry_request_ms > TELEMETRY_IDLE_MS:
+            self.telemetry_to = None  # the controller has gone; stop talking
+            self.samples.clear()
+            return
+        if now >= self.next_sample_ms or self.flush_telemetry:
+            self.samples.append((self.left_dir * self.left_pwm, self.right_dir * self.right_pwm))
+            self.next_sample_ms = now + TELEMETRY_SAMPLE_MS
+        if len(self.samples) >= TELEMETRY_BATCH or self.flush_telemetry:
+            flags = TELEM_TIMED_OUT if self.timed_out else 0
+            last_seq = self.decoder.last_seq
+            if last_seq is not None:
+                flags |= TELEM_SEQ_VALID
+            packet = encode_telemetry(flags, now, last_seq or 0, self.timeouts,
+                                      self.last_timeout_ms, self.samples)
+            self.sock.sendto(packet, self.telemetry_to)
+            self.telemetry_sent += 1
+            self.samples.clear()
+            self.flush_telemetry = False
+
+    def handle_packet(self, data, address):
+        """Dispatch one datagram the way the firmware's drain loop does"""
+        nonce = decode_probe(data)
+        if len(data) == COMMAND_PACKET.size and data[0] == PROTOCOL_VERSION:
+            packet = self.decoder.decode(data, self.millis())
+            if packet is not None:
+                self.drive(packet.left, packet.right, "binary")
+                self.last_command = "S" if packet.left == 0 and packet.right == 0 else "D"
+                self.last_command_time = self.millis()
+                self.timed_out = False
+            if data[2] & FLAG_TELEMETRY:
+                if self.telemetry_to is None:
+                    self.next_sample_ms = self.millis()
+                self.telemetry_to = address
+                self.telemetry_request_ms = self.millis()
+            # Echo the sequence number so the controller can measure RTT and loss
+            if data[2] & FLAG_ACK_REQUEST:
+                seq = COMMAND_PACKET.unpack_from(data)[4]
+                self.sock.sendto(encode_ack(seq), address)
+                self.acks_sent += 1
+        elif nonce is not None:
+            # Discovery: say who we are; motors and timeout are untouched
+            hello = encode_hello(nonce, self.bot_id, CAPABILITIES, self.name)
+            self.sock.sendto(hello, address)
+            self.hellos_sent += 1
+        elif len(data) > 0:
+            cmd = chr(data[0])
+            self.execute_command(cmd)
+            self.last_command = cmd
+            self.last_command_time = self.millis()
+            self.timed_out = False
+
+    def execute_command(self, cmd):
+        """executeCommand(): one-letter ASCII dispatch"""
+        self._serial(f"{cmd} ")
+        action = self._dispatch.get(cmd)
+        if action is not None:  # Ignore unknown commands
+            action(cmd)
+
+    def drive(self, left, right, cause):
+        dir_left = 1 if left > 0 else -1 if left < 0 else 0
+        dir_right = 1 if right > 0 else -1 if right < 0 else 0
+        self._write_motors(cause, dir_left, abs(left), dir_right, abs(right))
+
+    def forward(self, cause):
+        self._write_motors(cause, 1, self.current_speed, 1, self.current_speed)
+
+    def backward(self, cause):
+        self._write_motors(cause, -1, self.current_speed, -1, self.current_speed)
+
+    def right(self, cause):
+        self._write_motors(cause, 1, self.current_speed, -1, self.current_speed)
+
+    def left(self, cause):
+        self._write_motors(cause, -1, self.current_speed, 1, self.current_speed)
+
+    def ul(self, cause):
+        self._write_motors(cause, 1, self.current_speed - self.sm, 1, self.current_speed + self.sm)
+
+    def ur(self, cause):
+        self._write_motors(cause, 1, self.current_speed + self.sm, 1, self.current_speed - self.sm)
+
+    def dl(self, cause):
+        self._write_motors(cause, -1, self.current_speed - self.sm, -1, self.current_speed + self.sm)
+
+    def dr(self, cause):
+        self._write_motors(cause, -1, self.current_speed + self.sm, -1, self.current_speed - self.sm)
+
+    def stop_motors(self, cause):
+        self._write_motors(cause, 0, 0, 0, 0)
+
+    def increase_speed(self, cause):
+        self.current_speed = min(MAX_SPEED, self.current_speed + SPEED_STEP)
+        self._serial(f"[SPD+: {self.current_speed}]\n")
+
+    def decrease_speed(self, cause):
+        self.current_speed = max(MIN_SPEED, self.current_speed - SPEED_STEP)
+        self._serial(f"[SPD-: {self.current_speed}]\n")
+
+    # ----- Results -----
+
+    def motor_state(self):
+        """Current (left_dir, left_pwm, right_dir, right_pwm)"""
+        return self.left_dir, self.left_pwm, self.right_dir, self.right_pwm
+
+    def save_trace(self, path):
+        """Write the motor trace as CSV (t relative to start, in seconds)"""
+        with open(path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(MotorSample._fields)
+            for sample in self.trace:
+                writer.writerow((f"{sample.t - self._t0:.6f}",) + sample[1:])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Emulate the ESP8266 receiver on a local UDP port")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=LOCAL_PORT)
+    parser.add_argument("--trace", help="save the motor trace to this CSV file")
+    parser.add_argument("--id", type=lambda text: int(text, 0), help="bot ID in hellos (default: from the port)")
+    parser.add_argument("--name", help="bot name in hellos")
+    parser.add_argument("--quiet", action="store_true", help="don't mirror the Serial output")
+    args = parser.parse_args()
+
+    emulator = ReceiverEmulator(args.host, args.port, verbose=not args.quiet,
+                                bot_id=args.id, name=args.name)
+    emulator.start()
+    print(f"Emulating ESP8266 receiver {emulator.name} ({emulator.bot_id:08x}) "
+          f"on UDP {args.host}:{emulator.port} (Ctrl+C to stop)")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    emulator.stop()
+    print(f"\nPackets: {emulator.packets_received}  Timeouts: {emulator.timeouts}  "
+          f"Max drained per loop: {emulator.max_drain}")
+    if args.trace:
+        emulator.save_trace(args.trace)
+        print(f"Trace ({len(emulator.trace)} samples) saved to {args.trace}")
+
+
+if __name__ == "__main__":
+    main()
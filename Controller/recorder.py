@@ -0,0 +1,169 @@
+import mmap
+import os
+import queue
+import struct
+import threading
+import time
+from collections import namedtuple
+
+# ============================================
+# Session Recorder
+# ============================================
+# Appends every packet a CommandSender puts on the wire to a compact binary
+# log: a 16-byte header, then one fixed 20-byte record per packet.
+# Records are packed into a preallocated buffer on the sender thread; when
+# it fills or flush_interval has passed the buffer is handed to a writer
+# thread through a queue and packing carries on in a spare one (double
+# buffering: written buffers come back on a second queue, a new one is only
+# allocated if the disk falls behind). The send path never touches the
+# file, so a slow disk can't stall a packet.
+#
+# SessionLog memory-maps a finished log and hands out records without
+# copying the file; replay.py uses it to put a session back on the wire.
+#
+#   header: magic "TKRC", format version, record size, start (unix ns)
+#   record: t_ns since start, seq, speed, left, right, cmd, flags, lead byte
+#
+# lead is the first byte that went on the wire: PROTOCOL_VERSION for a
+# binary packet, otherwise the ASCII letter (including '+'/'-' speed steps,
+# which are recorded with cmd NO_COMMAND).
+
+MAGIC = b"TKRC"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<4sHHQ")
+RECORD = struct.Struct("<QHHhhBBBx")
+NO_COMMAND = 0xFF
+
+DEFAULT_BUFFER_RECORDS = 4096  # 80 KB
+DEFAULT_FLUSH_INTERVAL = 1.0  # s
+
+Record = namedtuple("Record", "t_ns seq speed left right cmd flags lead")
+
+
+class SessionRecorder:
+    """Buffered binary log of outbound packets"""
+
+    def __init__(self, path, buffer_records=DEFAULT_BUFFER_RECORDS,
+                 flush_interval=DEFAULT_FLUSH_INTERVAL):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.records = 0
+        self.flushes = 0
+        self.buffers = 2       # allocated so far; more than 2 means the disk fell behind
+        self._file = open(path, "wb")
+        self._file.write(HEADER.pack(MAGIC, FORMAT_VERSION, RECORD.size, time.time_ns()))
+        self._t0 = time.perf_counter_ns()
+        self._buffer_size = RECORD.size * buffer_records
+        self._buffer = bytearray(self._buffer_size)
+        self._offset = 0
+        self._flush_interval_ns = int(flush_interval * 1e9)
+        self._last_flush = self._t0
+        self._full = queue.SimpleQueue()  # (buffer, length) to write; None ends the writer
+        self._free = queue.SimpleQueue()  # written buffers, ready to refill
+        self._free.put(bytearray(self._buffer_size))
+        self._writer = threading.Thread(target=self._write_loop, name="recorder", daemon=True)
+        self._writer.start()
+
+    def record(self, t_ns, seq, cmd, speed, left, right, flags, lead):
+        """Append one packet sent at perf_counter_ns() time t_ns"""
+        RECORD.pack_into(self._buffer, self._offset, t_ns - self._t0, seq, speed,
+                         left, right, cmd, flags, lead)
+        self._offset += RECORD.size
+        self.records += 1
+        if self._offset == len(self._buffer) or t_ns - self._last_flush >= self._flush_interval_ns:
+            self.flush()
+
+    def flush(self):
+        """Hand buffered records to the writer thread and carry on in a spare buffer"""
+        if self._file is None or self._offset == 0:
+            return
+        self._full.put((self._buffer, self._offset))
+        try:
+            self._buffer = self._free.get_nowait()
+        except queue.Empty:
+            self._buffer = bytearray(self._buffer_size)
+            self.buffers += 1
+        self._offset = 0
+        self._last_flush = time.perf_counter_ns()
+        self.flushes += 1
+
+    def close(self):
+        """Write what's buffered, stop the writer thread and close the log"""
+        if self._file is not None:
+            self.flush()
+            self._full.put(None)
+            self._writer.join()
+            self._file.close()
+            self._file = None
+
+    def _write_loop(self):
+        failed = False
+        while True:
+            item = self._full.get()
+            if item is None:
+                return
+            buffer, length = item
+            if not failed:
+                try:
+                    self._file.write(memoryview(buffer)[:length])
+                    self._file.flush()
+                except OSError as e:
+                    print(f"Warning: recording to {self.path} stopped: {e}")
+                    failed = True
+            self._free.put(buffer)
+
+
+class SessionLog:
+    """Read-only, memory-mapped view of a recorded session"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._map) < HEADER.size:
+            raise ValueError(f"{path}: not a session log")
+        magic, version, record_size, self.started_unix_ns = HEADER.unpack_from(self._map)
+        if magic != MAGIC or version != FORMAT_VERSION or record_size != RECORD.size:
+            raise ValueError(f"{path}: not a version {FORMAT_VERSION} session log")
+        # A crash can leave a partial record at the end; ignore it
+        count = (len(self._map) - HEADER.size) // RECORD.size
+        self._view = memoryview(self._map)[HEADER.size:HEADER.size + count * RECORD.size]
+
+    def __len__(self):
+        return len(self._view) // RECORD.size
+
+    def __iter__(self):
+        """Records as plain tuples (t_ns, seq, speed, left, right, cmd, flags, lead)"""
+        return RECORD.iter_unpack(self._view)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        return Record._make(RECORD.unpack_from(self._view, index * RECORD.size))
+
+    def raw(self):
+        """All records as one packed buffer, without copying"""
+        return self._view
+
+    def duration_s(self):
+        """Time from the first to the last record"""
+        if len(self) == 0:
+            return 0.0
+        return (self[-1].t_ns - self[0].t_ns) / 1e9
+
+    def close(self):
+        self._view.release()
+        self._map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def session_path(directory, name="session"):
+    """Timestamped log path, e.g. recordings/session-20250101-120000.tkr"""
+    return os.path.join(directory, f"{name}-{time.strftime('%Y%m%d-%H%M%S')}.tkr")
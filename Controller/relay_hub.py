@@ -0,0 +1,438 @@
+import argparse
+import asyncio
+import hmac
+import ipaddress
+import socket
+import time
+
+from link_stats import LatencyHistogram
+from protocol import (
+    PROTOCOL_VERSION, PKT_COMMAND, COMMAND_PACKET, CMD_STOP, ASCII_PAYLOADS,
+    CAP_ASCII, CAP_BINARY, CAP_ACK, CAP_TELEMETRY, ASCII_SPEED_UP, ASCII_SPEED_DOWN,
+    decode_probe, encode_hello,
+)
+
+# ============================================
+# Relay Hub
+# ============================================
+# For tournament rounds: one arena machine on the bots' Wi-Fi, operators on
+# their own laptops. Every bot gets a port on the hub; an operator points
+# Controller.py's ESP_IP/ESP_PORT at the hub and that port, so the
+# operator -> bot map is simply the port sent to. The first source address
+# on a port owns it; another one can only take over after the owner has
+# been silent for OPERATOR_IDLE (a restarted laptop comes back on a new
+# source port), and is counted as foreign until then.
+#
+# A discovery probe (discovery.py) on an operator port is answered by the
+# hub itself, as bot HUB_ID | port named "hub/<bot>", and never forwarded:
+# a controller that found the hub keeps driving through it instead of
+# being retargeted straight at the bot. Probes don't take or refresh port
+# ownership.
+#
+# Packets are forwarded untouched from datagram_received(): no await, no
+# queue, one sendto on the bot's connected socket. Acks (and telemetry
+# batches) come back the same way to the operator, so RTT and loss in the
+# operator's UI include the hub.
+#
+# Arbitration stop: "stop" on the control port (or stop_all()) drops every
+# operator's packets and sends each bot a STOP at once - in binary, a packet
+# with the sequence number after the operator's last one, sent as
+# STOP_COPIES identical copies the receiver dedupes. The firmware's
+# COMMAND_TIMEOUT keeps the motors off while packets are held. "go" lets
+# the operators through again; their next packets are already newer.
+# Whether a bot gets a binary or an ASCII STOP follows the last command its
+# operator sent; anything else (a probe, a stray datagram) doesn't count.
+#
+# The control port listens on CONTROL_HOST (loopback) unless --control-host
+# says otherwise, separately from the operator ports, so an operator on the
+# arena Wi-Fi can't stop or release everyone else. With --token every
+# control command must carry it ("stop <token>"); a control port off
+# loopback without one gets a warning at startup.
+#
+# Per bot the hub measures its own added latency (datagram in -> sendto
+# returned) on both paths and the forwarded packet/byte rate.
+#
+#   python relay_hub.py --bot alice=192.168.4.10 --bot bob=192.168.4.11
+#   python relay_hub.py --control stop        # arbitration stop, "go" to resume
+#   python relay_hub.py --bot ... --control-host 0.0.0.0 --token s3cret   # remote referee
+#   python relay_hub.py --selftest            # everything on localhost
+
+BASE_PORT = 4300       # bot i listens for its operator on BASE_PORT + i
+CONTROL_PORT = 4299    # "stop" / "go" / "status" text datagrams
+CONTROL_HOST = "127.0.0.1"  # the control port is only reachable from the hub machine by default
+OPERATOR_IDLE = 1.0    # s of silence before another address may take a port
+STOP_COPIES = 3
+REPORT_INTERVAL = 5.0  # s between console reports
+BOT_PORT = 4210
+HUB_ID = 0x48000000    # hub bot IDs are HUB_ID | operator port
+HUB_CAPS = CAP_BINARY | CAP_ACK | CAP_TELEMETRY | CAP_ASCII  # whatever the bot speaks passes through
+ASCII_COMMANDS = frozenset(ASCII_PAYLOADS) | {ASCII_SPEED_UP, ASCII_SPEED_DOWN}
+
+
+class OperatorPort(asyncio.DatagramProtocol):
+    """The hub port one operator sends to"""
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, address):
+        self.bot.from_operator(data, address, time.perf_counter_ns())
+
+
+class BotLink(asyncio.DatagramProtocol):
+    """Connected socket to one bot; forwards operator packets and relays its acks"""
+
+    def __init__(self, hub, name, address, listen_port):
+        self.hub = hub
+        self.name = name
+        self.address = address
+        self.listen_port = listen_port
+        self.transport = None
+        self.operator_port = None   # OperatorPort
+        self.operator = None        # owning operator's address
+        self.operator_seen = 0.0
+
+        self.forwarded = 0
+        self.bytes = 0
+        self.acks = 0
+        self.held = 0               # dropped while stopped
+        self.foreign = 0            # from an address that doesn't own the port
+        self.stops_sent = 0
+        self.forward_latency = LatencyHistogram()
+        self.ack_latency = LatencyHistogram()
+
+        self._last_seq = None       # newest binary seq and time_ms from the operator
+        self._last_time_ms = 0
+        self._last_at = 0.0
+        self._ascii = False
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def from_operator(self, data, address, t_ns):
+        nonce = decode_probe(data)
+        if nonce is not None:
+            self.operator_port.transport.sendto(
+                encode_hello(nonce, HUB_ID | self.listen_port, HUB_CAPS, f"hub/{self.name}"), address)
+            return
+        now = time.perf_counter()
+        if address != self.operator:
+            if self.operator is not None and now - self.operator_seen < OPERATOR_IDLE:
+                self.foreign += 1
+                return
+            if self.operator is not None:
+                print(f"{self.name}: operator {self.operator[0]}:{self.operator[1]} "
+                      f"replaced by {address[0]}:{address[1]}")
+            self.operator = address
+        self.operator_seen = now
+
+        # Remember where the operator's sequence is, held or not, so a STOP
+        # can slot in right after it
+        if len(data) == COMMAND_PACKET.size and data[0] == PROTOCOL_VERSION:
+            packet = COMMAND_PACKET.unpack(data)
+            self._last_seq, self._last_time_ms, self._last_at = packet[4], packet[7], now
+            self._ascii = False
+        elif data in ASCII_COMMANDS:
+            self._ascii = True
+
+        if self.hub.stopped:
+            self.held += 1
+            return
+        self.transport.sendto(data)
+        self.forward_latency.record(time.perf_counter_ns() - t_ns)
+        self.forwarded += 1
+        self.bytes += len(data)
+
+    def datagram_received(self, data, address):
+        # An ack or a telemetry batch from the bot
+        t_ns = time.perf_counter_ns()
+        if self.operator is None:
+            return
+        self.operator_port.transport.sendto(data, self.operator)
+        self.ack_latency.record(time.perf_counter_ns() - t_ns)
+        self.acks += 1
+
+    def error_received(self, exc):
+        pass  # e.g. ICMP port unreachable while the bot reboots
+
+    def send_stop(self):
+        """STOP the bot now, in whichever protocol its operator speaks"""
+        if self._ascii:
+            packet = ASCII_PAYLOADS[CMD_STOP]
+        elif self._last_seq is not None:
+            elapsed_ms = int((time.perf_counter() - self._last_at) * 1000)
+            packet = COMMAND_PACKET.pack(PROTOCOL_VERSION, PKT_COMMAND, 0, CMD_STOP,
+                                         (self._last_seq + 1) & 0xFFFF, 0, 0,
+                                         (self._last_time_ms + elapsed_ms) & 0xFFFFFFFF)
+        else:
+            return  # never driven: nothing to stop
+        for _ in range(STOP_COPIES):
+            self.transport.sendto(packet)
+        self.stops_sent += 1
+
+
+class ControlPort(asyncio.DatagramProtocol):
+    """Arbitration commands as text datagrams; replies with the hub state"""
+
+    def __init__(self, hub):
+        self.hub = hub
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, address):
+        command, _, token = data.decode(errors="replace").strip().partition(" ")
+        command = command.lower()
+        if self.hub.token is not None and not hmac.compare_digest(token.encode(), self.hub.token.encode()):
+            self.transport.sendto(b"error: bad token", address)
+            return
+        if command == "stop":
+            self.hub.stop_all(f"control from {address[0]}")
+        elif command == "go":
+            self.hub.go(f"control from {address[0]}")
+        elif command != "status":
+            self.transport.sendto(f"error: unknown command {command!r}".encode(), address)
+            return
+        self.transport.sendto(("STOPPED" if self.hub.stopped else "RUNNING").encode(), address)
+
+
+class RelayHub:
+    """Operator ports forwarding to bots, with a global arbitration stop"""
+
+    def __init__(self, bots, host="0.0.0.0", base_port=BASE_PORT, control_port=CONTROL_PORT,
+                 control_host=CONTROL_HOST, token=None):
+        # bots: [(name, (host, port))]; base_port 0 picks free ports
+        self.host = host
+        self.base_port = base_port
+        self.control_port = control_port
+        self.control_host = control_host
+        self.token = token  # control commands must carry it, if set
+        self.bots = [BotLink(self, name, address, base_port + i if base_port else 0)
+                     for i, (name, address) in enumerate(bots)]
+        self.stopped = False
+        self.stopped_at = None
+        self._transports = []
+        self._started = None
+        self._last_report = None
+
+    async def start(self):
+        """Open the operator, bot and control sockets"""
+        loop = asyncio.get_running_loop()
+        for bot in self.bots:
+            transport, _ = await loop.create_datagram_endpoint(
+                lambda bot=bot: bot, remote_addr=bot.address)
+            self._transports.append(transport)
+            transport, port = await loop.create_datagram_endpoint(
+                lambda bot=bot: OperatorPort(bot), local_addr=(self.host, bot.listen_port))
+            bot.operator_port = port
+            bot.listen_port = transport.get_extra_info("sockname")[1]
+            self._transports.append(transport)
+        if self.control_port is not None:
+            transport, _ = await loop.create_datagram_endpoint(
+                lambda: ControlPort(self), local_addr=(self.control_host, self.control_port))
+            self.control_port = transport.get_extra_info("sockname")[1]
+            self._transports.append(transport)
+        self._started = time.perf_counter()
+        self._last_report = (self._started, [0] * len(self.bots))
+
+    def close(self):
+        """Close every socket"""
+        for transport in self._transports:
+            transport.close()
+        self._transports = []
+
+    def stop_all(self, reason="arbitration"):
+        """Hold every operator's packets and STOP every bot"""
+        self.stopped = True
+        self.stopped_at = time.perf_counter()
+        for bot in self.bots:
+            bot.send_stop()
+        print(f"■ ALL STOP ({reason})")
+
+    def go(self, reason="arbitration"):
+        """Let operators drive again"""
+        self.stopped = False
+        print(f"▶ GO ({reason})")
+
+    def report_lines(self):
+        """Per-bot rates since the previous report and added latency so far"""
+        now = time.perf_counter()
+        last_t, last_counts = self._last_report
+        elapsed = now - last_t
+        lines = []
+        for bot, last in zip(self.bots, last_counts):
+            rate = (bot.forwarded - last) / elapsed if elapsed > 0 else 0.0
+            operator = f"{bot.operator[0]}:{bot.operator[1]}" if bot.operator else "no operator"
+            latency = bot.forward_latency
+            lines.append(f"  {bot.name:<10} :{bot.listen_port} <- {operator:<21} "
+                         f"{rate:7.1f} pkt/s, {bot.forwarded} fwd, {bot.acks} acks, {bot.held} held, "
+                         f"{bot.foreign} foreign, added "
+                         + (f"mean {latency.mean_ms() * 1000:.0f} us, p99 <= {latency.percentile_ms(0.99):g} ms"
+                            if latency.count else "--"))
+        self._last_report = (now, [bot.forwarded for bot in self.bots])
+        return lines
+
+    async def serve(self, report_interval=REPORT_INTERVAL):
+        """Run until cancelled, printing a report every report_interval"""
+        while True:
+            await asyncio.sleep(report_interval)
+            state = "STOPPED" if self.stopped else "RUNNING"
+            print("\n".join([f"Hub {state}:"] + self.report_lines()))
+
+
+def parse_bot(text):
+    """'name=host[:port]' -> (name, (host, port))"""
+    name, sep, target = text.partition("=")
+    if not sep or not name or not target:
+        raise argparse.ArgumentTypeError(f"expected name=host[:port], got {text!r}")
+    host, _, port = target.partition(":")
+    return name, (host, int(port) if port else BOT_PORT)
+
+
+def is_loopback(host):
+    """True if host is a loopback address (names count as not)"""
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return host == "localhost"
+
+
+def send_control(command, hub_host, control_port, timeout=1.0, token=None):
+    """Send a control command to a running hub; returns its reply"""
+    if token is not None:
+        command = f"{command} {token}"
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.settimeout(timeout)
+        sock.sendto(command.encode(), (hub_host, control_port))
+        try:
+            return sock.recv(256).decode()
+        except socket.timeout:
+            return "no reply"
+
+
+async def selftest(bots, seconds):
+    """Operators -> hub -> receiver emulators on localhost"""
+    from receiver_emulator import ReceiverEmulator
+    from sender import CommandSender, MODE_STREAM
+    from protocol import CMD_FORWARD, DEFAULT_SPEED
+
+    emulators = [ReceiverEmulator(port=0).start() for _ in range(bots + 1)]
+    direct_emulator = emulators.pop()
+    hub = RelayHub([(f"bot{i + 1}", ("127.0.0.1", emulator.port)) for i, emulator in enumerate(emulators)],
+                   host="127.0.0.1", base_port=0, control_port=0)
+    await hub.start()
+
+    # One operator per bot through the hub, plus one straight to an emulator
+    # as the baseline; all stream with acks so RTT is measured on every packet
+    sockets, senders = [], []
+    for address in [("127.0.0.1", bot.listen_port) for bot in hub.bots] + [("127.0.0.1", direct_emulator.port)]:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.setblocking(False)
+        sender = CommandSender(sock, address, mode=MODE_STREAM, ack=True)
+        sender.set_command(CMD_FORWARD, DEFAULT_SPEED)
+        sender.start()
+        sockets.append(sock)
+        senders.append(sender)
+    direct = senders.pop()
+
+    await asyncio.sleep(seconds / 2)
+    marks = [len(emulator.trace) for emulator in emulators]
+    hub.stop_all("selftest")
+    await asyncio.sleep(0.5)
+    stop_ms = []
+    for emulator, mark in zip(emulators, marks):
+        stops = [s for s in emulator.trace[mark:] if s.left_pwm == 0 and s.right_pwm == 0]
+        stop_ms.append((stops[0].t - hub.stopped_at) * 1000 if stops else None)
+    still = [e.left_pwm or e.right_pwm for e in emulators]
+    hub.go("selftest")
+    await asyncio.sleep(seconds / 2)
+    moving = [bool(e.left_pwm and e.right_pwm) for e in emulators]
+
+    for sender in senders + [direct]:
+        sender.stop(final=CMD_STOP)
+    for sock in sockets:
+        sock.close()
+    hub.close()
+    for emulator in emulators + [direct_emulator]:
+        emulator.stop()
+
+    direct_p50 = direct.link.percentiles()[0]
+    print(f"{bots} operators -> hub -> {bots} receiver emulators, {seconds:g}s, "
+          f"{direct.rate_hz} Hz streams with acks")
+    print(f"  direct RTT p50 (baseline): {direct_p50:.3f} ms")
+    for bot, sender, ms, off, resumed in zip(hub.bots, senders, stop_ms, still, moving):
+        p50, p95, p99 = sender.link.percentiles()
+        print(f"  {bot.name}: {bot.forwarded / seconds:.0f} pkt/s forwarded, RTT p50 {p50:.3f} ms "
+              f"(+{p50 - direct_p50:.3f} via hub), p99 {p99:.3f} ms, unacked {sender.link.lost} "
+              f"(held while stopped: {bot.held})")
+        print(f"    hub forward: mean {bot.forward_latency.mean_ms() * 1000:.0f} us, "
+              f"max {bot.forward_latency.max_ns / 1000:.0f} us; ack relay: mean "
+              f"{bot.ack_latency.mean_ms() * 1000:.0f} us, max {bot.ack_latency.max_ns / 1000:.0f} us")
+        print(f"    arbitration stop: motors off after "
+              + (f"{ms:.2f} ms" if ms is not None else "never")
+              + f", held {bot.held} packets, {'stayed off' if not off else 'MOVING while stopped'}, "
+              f"{'resumed' if resumed else 'did NOT resume'} after go")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Relay operators' command streams to their bots")
+    parser.add_argument("--bot", action="append", type=parse_bot, default=[],
+                        metavar="NAME=HOST[:PORT]", help="a bot; operators for the Nth use BASE_PORT + N - 1")
+    parser.add_argument("--host", default="0.0.0.0", help="address the operator ports listen on")
+    parser.add_argument("--base-port", type=int, default=BASE_PORT)
+    parser.add_argument("--control-host", default=CONTROL_HOST,
+                        help="address the control port listens on (default: loopback only)")
+    parser.add_argument("--control-port", type=int, default=CONTROL_PORT)
+    parser.add_argument("--token", help="shared secret every control command must carry")
+    parser.add_argument("--control", choices=("stop", "go", "status"),
+                        help="send an arbitration command to a running hub and exit")
+    parser.add_argument("--hub", default="127.0.0.1", help="hub address for --control")
+    parser.add_argument("--selftest", type=int, nargs="?", const=4, metavar="BOTS",
+                        help="run operators, hub and receiver emulators on localhost")
+    parser.add_argument("--seconds", type=float, default=4.0, help="selftest duration")
+    args = parser.parse_args()
+
+    if args.control:
+        print(send_control(args.control, args.hub, args.control_port, token=args.token))
+        return
+    if args.selftest:
+        asyncio.run(selftest(args.selftest, args.seconds))
+        return
+    if not args.bot:
+        parser.error("give at least one --bot (or --selftest)")
+
+    async def run():
+        hub = RelayHub(args.bot, args.host, args.base_port, args.control_port,
+                       args.control_host, args.token)
+        await hub.start()
+        print("=" * 60)
+        print("Relay hub")
+        print("=" * 60)
+        for bot in hub.bots:
+            print(f"  {bot.name:<10} operators send to port {bot.listen_port} -> "
+                  f"{bot.address[0]}:{bot.address[1]}")
+        print(f"  control: {hub.control_host}:{hub.control_port} (relay_hub.py --control stop|go"
+              + (" --token ...)" if hub.token else ")"))
+        if hub.token is None and not is_loopback(hub.control_host):
+            print("Warning: the control port is reachable from the network without a --token; "
+                  "anyone on it can stop or release every bot")
+        print("=" * 60)
+        try:
+            await hub.serve()
+        finally:
+            hub.stop_all("hub shutting down")
+            hub.close()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        print("\n✓ Hub stopped.")
+
+
+if __name__ == "__main__":
+    main()
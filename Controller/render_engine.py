@@ -0,0 +1,103 @@
+import pygame
+
+# ============================================
+# Render Engine
+# ============================================
+# The static parts of the UI (logo, overlay, banner, titles, guide) are
+# drawn once into a cached background surface. Each frame only widgets
+# whose state changed are restored from that background, redrawn, and
+# pushed to the display with pygame.display.update(dirty_rects).
+#
+# A Label keeps the surface of one formatted text and renders it again only
+# when its values change, so an unchanged label costs a tuple comparison
+# per frame instead of a string format and a font render.
+
+class RenderEngine:
+    """Cached background layer with per-widget dirty-rect redraws"""
+
+    def __init__(self, screen):
+        self.screen = screen
+        self.background = None
+        self._widget_state = {}
+        self._frame = []
+        self._dirty = []
+        self._full_redraw = True
+
+    def build_background(self, draw_static):
+        """Render the static layer once by calling draw_static(surface)"""
+        self.background = pygame.Surface(self.screen.get_size()).convert()
+        draw_static(self.background)
+        self.invalidate()
+
+    def invalidate(self):
+        """Force a full redraw on the next frame"""
+        self._widget_state.clear()
+        self._full_redraw = True
+
+    def widget(self, name, rect, state, draw, *args):
+        """Queue a widget; it is redrawn in present() only if needed"""
+        changed = self._full_redraw or self._widget_state.get(name) != state
+        if changed:
+            self._widget_state[name] = state
+        self._frame.append((rect, changed, draw, args))
+
+    def present(self):
+        """Redraw changed widgets and push only their rects to the display"""
+        frame = self._frame
+        dirty = self._dirty
+
+        if self._full_redraw:
+            self.screen.blit(self.background, (0, 0))
+            redraw = [True] * len(frame)
+        else:
+            redraw = [changed for _, changed, _, _ in frame]
+            for rect, changed, _, _ in frame:
+                if changed:
+                    dirty.append(rect)
+            # A widget overlapping a dirty rect must be redrawn too, or the
+            # background restore would erase part of it
+            grown = bool(dirty)
+            while grown:
+                grown = False
+                for i, (rect, _, _, _) in enumerate(frame):
+                    if not redraw[i] and rect.collidelist(dirty) != -1:
+                        redraw[i] = True
+                        dirty.append(rect)
+                        grown = True
+            for rect in dirty:
+                self.screen.blit(self.background, rect, rect)
+
+        # Draw in submission order so overlapping widgets stack as before
+        for i, (rect, _, draw, args) in enumerate(frame):
+            if redraw[i]:
+                self.screen.set_clip(rect)
+                draw(*args)
+                self.screen.set_clip(None)
+
+        if self._full_redraw:
+            pygame.display.flip()
+            self._full_redraw = False
+        elif dirty:
+            pygame.display.update(dirty)
+        frame.clear()
+        dirty.clear()
+
+
+class Label:
+    """A text surface rendered again only when its values or color change"""
+
+    def __init__(self, font, fmt, color):
+        self.font = font
+        self.fmt = fmt
+        self.color = color
+        self.values = None
+        self.surface = None
+        self._rendered_color = None
+
+    def get(self, *values):
+        """The surface for fmt.format(*values); unchanged values reuse the last one"""
+        if values != self.values or self.color != self._rendered_color:
+            self.values = values
+            self._rendered_color = self.color
+            self.surface = self.font.render(self.fmt.format(*values), True, self.color)
+        return self.surface
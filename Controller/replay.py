@@ -0,0 +1,116 @@
+import argparse
+import socket
+import time
+
+from protocol import PROTOCOL_VERSION, PKT_COMMAND, COMMAND_PACKET, now_ms
+from recorder import SessionLog
+
+# ============================================
+# Session Replay
+# ============================================
+# Puts a recorded session (recorder.py) back on the wire with its original
+# timing, or faster/slower with --rate. Packets are sent on an absolute
+# schedule from the start of the replay: sleep until just before each one
+# is due, then spin the last stretch, so timing errors don't accumulate.
+# Binary packets keep their flags and sequence order but get a fresh
+# time_ms, otherwise the receiver would drop them as stale. With --loop the
+# sequence numbers are shifted on every pass so the receiver doesn't drop
+# the repeats as old.
+#
+#   python replay.py recordings/session-....tkr --ip 10.67.214.228
+#   python replay.py session.tkr --emulate --trace replay.csv   # local emulator
+#   python replay.py session.tkr --emulate --rate 10            # stress test
+
+SPIN_WINDOW = 0.001  # s before a packet is due to stop sleeping and spin
+
+
+def replay(log, sock, address, rate=1.0, seq_offset=0):
+    """Send every record of log to address; returns lateness stats in ms"""
+    packet = bytearray(COMMAND_PACKET.size)
+    ascii_payloads = {}
+    late_total = 0.0
+    late_max = 0.0
+    sent = 0
+    t0_ns = None
+    start = time.perf_counter()
+    for t_ns, seq, speed, left, right, cmd, flags, lead in log:
+        if t0_ns is None:
+            t0_ns = t_ns
+        due = start + (t_ns - t0_ns) / 1e9 / rate
+        delay = due - time.perf_counter()
+        if delay > SPIN_WINDOW:
+            time.sleep(delay - SPIN_WINDOW)
+        while time.perf_counter() < due:
+            pass
+
+        if lead == PROTOCOL_VERSION:
+            COMMAND_PACKET.pack_into(packet, 0, PROTOCOL_VERSION, PKT_COMMAND, flags, cmd,
+                                     (seq + seq_offset) & 0xFFFF, left, right, now_ms())
+            payload = packet
+        else:
+            payload = ascii_payloads.get(lead)
+            if payload is None:
+                payload = ascii_payloads[lead] = bytes((lead,))
+        sock.sendto(payload, address)
+
+        late = (time.perf_counter() - due) * 1000
+        late_total += late
+        late_max = max(late_max, late)
+        sent += 1
+    return {
+        "sent": sent,
+        "elapsed_s": time.perf_counter() - start,
+        "late_mean_ms": late_total / sent if sent else 0.0,
+        "late_max_ms": late_max,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a recorded controller session")
+    parser.add_argument("log", help="session log written by recorder.py")
+    parser.add_argument("--ip", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=4210)
+    parser.add_argument("--rate", type=float, default=1.0,
+                        help="playback speed multiplier (2 = twice as fast)")
+    parser.add_argument("--loop", type=int, default=1, help="replay this many times")
+    parser.add_argument("--emulate", action="store_true",
+                        help="replay into a local receiver emulator instead of --ip/--port")
+    parser.add_argument("--trace", help="with --emulate, save the emulator's motor trace to this CSV")
+    args = parser.parse_args()
+    if args.rate <= 0:
+        parser.error("--rate must be positive")
+
+    emulator = None
+    address = (args.ip, args.port)
+    if args.emulate:
+        from receiver_emulator import ReceiverEmulator
+        emulator = ReceiverEmulator(port=0).start()
+        address = ("127.0.0.1", emulator.port)
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    with SessionLog(args.log) as log:
+        print(f"Replaying {len(log)} packets ({log.duration_s():.1f}s recorded) "
+              f"to {address[0]}:{address[1]} at {args.rate:g}x")
+        seq_span = (log[-1].seq - log[0].seq + 1) & 0xFFFF if len(log) else 0
+        try:
+            for i in range(args.loop):
+                result = replay(log, sock, address, args.rate, i * seq_span)
+                print(f"  sent {result['sent']} in {result['elapsed_s']:.2f}s, "
+                      f"late by {result['late_mean_ms']:.3f} ms mean, "
+                      f"{result['late_max_ms']:.3f} ms max")
+        except KeyboardInterrupt:
+            print("\nInterrupted by user")
+    sock.close()
+
+    if emulator is not None:
+        time.sleep(0.05)  # let the emulator drain the tail
+        emulator.stop()
+        print(f"Emulator: {emulator.packets_received} packets, "
+              f"{emulator.decoder.accepted} binary accepted, {len(emulator.trace)} motor changes")
+        if args.trace:
+            emulator.save_trace(args.trace)
+            print(f"Trace saved to {args.trace}")
+
+
+if __name__ == "__main__":
+    main()
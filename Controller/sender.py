@@ -0,0 +1,545 @@
+import selectors
+import socket
+import threading
+import time
+
+from link_manager import LinkManager
+from link_stats import LinkStats, LatencyHistogram
+from protocol import (
+    PROTO_BINARY, PROTO_ASCII, CMD_STOP, DEFAULT_SPEED, MIN_SPEED, MAX_SPEED,
+    SPEED_STEP, ASCII_PAYLOADS, ASCII_SPEED_UP, ASCII_SPEED_DOWN,
+    CMD_DRIVE, FLAG_ACK_REQUEST, FLAG_TELEMETRY, PROTOCOL_VERSION, PacketEncoder, motor_pwm,
+    decode_ack, decode_telemetry,
+)
+from recorder import NO_COMMAND
+from telemetry import BotTelemetry
+
+# ============================================
+# Command Sender
+# ============================================
+# Puts commands on the wire from its own thread at a fixed rate, so a slow
+# draw or flip in the render loop never delays a packet. The main loop
+# publishes the latest (command, speed) into a single slot; rebinding an
+# attribute is atomic in CPython, so neither side ever waits on a lock.
+#
+# Two transmit modes:
+#   "stream" - send the current command on every tick
+#   "change" - send on the first tick after the command changes, otherwise
+#              only a heartbeat every heartbeat_interval to keep the
+#              receiver's COMMAND_TIMEOUT from stopping the motors
+#
+# With PROTO_BINARY every packet carries the absolute motor PWM. With
+# PROTO_ASCII the command goes out as one letter and speed changes are
+# turned into the firmware's relative '+'/'-' packets.
+#
+# In ack mode (binary only) every packet asks the receiver to echo its
+# sequence number. Between ticks the sender waits on the socket with a
+# selector instead of sleeping, so acks are timestamped as they arrive and
+# feed LinkStats (RTT percentiles and loss). The socket must be non-blocking.
+#
+# With telemetry=True (binary only) every packet also asks the receiver to
+# stream its telemetry batches back; the same selector wait picks them up
+# and feeds a BotTelemetry (telemetry.py), so nobody else reads the socket.
+#
+# Input edges don't have to wait for the next tick: set_command(...,
+# input_ns=t) followed by wake() makes the thread put the new command on
+# the wire right away, and the time from t to sendto returning goes into
+# the input_latency histogram. The thread waits on a selector that also
+# watches a socketpair, so wake() is one byte written, no lock.
+#
+# With adaptive=True a LinkManager (link_manager.py) sets the heartbeat
+# interval from the measured loss and jitter, and has critical transitions
+# (STOP, speed changes, reversals) repeated as spaced identical copies that
+# the receiver dedupes by sequence number. Copies go out on the ticks after
+# the original and are dropped as soon as a newer packet is sent (so they
+# only matter in change mode; stream mode re-sends every tick anyway).
+#
+# A SessionRecorder, if given, logs every packet that went out (see
+# recorder.py); it is closed by stop(). A PacketStore (analytics.py) gets
+# every send and ack time for the post-match summaries.
+#
+# MultiSender runs the ticks of several CommandSenders (one per bot) from a
+# single thread over one shared socket, and routes acks and telemetry back
+# by address.
+#
+# address may be None while discovery (discovery.py) is still looking for
+# the bot; nothing goes out and the status reads SEARCHING... until the
+# finder sets it.
+
+DEFAULT_SEND_RATE = 100  # Hz
+DEFAULT_HEARTBEAT_INTERVAL = 0.100  # s
+RECEIVER_COMMAND_TIMEOUT = 0.300  # s, COMMAND_TIMEOUT in Reciever/src/main.cpp
+NO_REPLY_AFTER = 1.0  # s without acks before the link is reported down
+LEGACY_FRAME_RATE = 20  # Hz, the old one-packet-per-frame loop
+UDP_OVERHEAD = 28  # bytes of IPv4 + UDP header per datagram, for bandwidth
+
+MODE_STREAM = "stream"
+MODE_CHANGE = "change"
+
+
+class Waker:
+    """Self-pipe that interrupts a selector wait from another thread"""
+
+    def __init__(self, selector):
+        self.reader, self._writer = socket.socketpair()
+        self.reader.setblocking(False)
+        self._writer.setblocking(False)
+        selector.register(self.reader, selectors.EVENT_READ)
+
+    def wake(self):
+        try:
+            self._writer.send(b"\0")
+        except OSError:
+            pass  # a wakeup is already pending, or we're shutting down
+
+    def drain(self):
+        try:
+            while self.reader.recv(64):
+                pass
+        except BlockingIOError:
+            pass
+
+    def close(self):
+        self.reader.close()
+        self._writer.close()
+
+
+class CommandSender:
+    """Sends the latest published command at a fixed rate on its own thread"""
+
+    def __init__(self, sock, address, rate_hz=DEFAULT_SEND_RATE,
+                 mode=MODE_STREAM, heartbeat_interval=DEFAULT_HEARTBEAT_INTERVAL,
+                 protocol=PROTO_BINARY, ack=False, recorder=None, analytics=None,
+                 adaptive=False, telemetry=False):
+        if mode not in (MODE_STREAM, MODE_CHANGE):
+            raise ValueError(f"unknown send mode: {mode!r}")
+        if protocol not in (PROTO_BINARY, PROTO_ASCII):
+            raise ValueError(f"unknown protocol: {protocol!r}")
+        if ack and protocol != PROTO_BINARY:
+            raise ValueError("ack mode needs the binary protocol")
+        if telemetry and protocol != PROTO_BINARY:
+            raise ValueError("telemetry needs the binary protocol")
+        # Leave room for one lost heartbeat before the receiver times out
+        if heartbeat_interval > RECEIVER_COMMAND_TIMEOUT / 2:
+            raise ValueError(
+                f"heartbeat_interval {heartbeat_interval}s must be at most half "
+                f"the receiver timeout ({RECEIVER_COMMAND_TIMEOUT}s)")
+        self.sock = sock
+        self.address = address
+        self.rate_hz = rate_hz
+        self.period = 1.0 / rate_hz
+        self.mode = mode
+        self.heartbeat_interval = heartbeat_interval
+        self.protocol = protocol
+        self.encoder = PacketEncoder()
+        self.link = LinkStats() if ack else None
+        self.telemetry = BotTelemetry() if telemetry else None
+        self.flags = (FLAG_ACK_REQUEST if ack else 0) | (FLAG_TELEMETRY if telemetry else 0)
+        self.manager = LinkManager(self.link, RECEIVER_COMMAND_TIMEOUT,
+                                   redundancy=protocol == PROTO_BINARY) if adaptive else None
+        self.recorder = recorder
+        self.analytics = analytics
+        self.input_latency = LatencyHistogram()
+        self.packets_sent = 0
+        self.bytes_sent = 0     # including IP/UDP headers
+        self.first_send_at = None  # perf_counter() of the first packet out
+        self.status = "CONNECTING..."
+
+        # Session counters
+        self.ticks = 0          # packets "stream" mode would have sent
+        self.wakeups = 0        # extra ticks for input edges
+        self.changes = 0        # sends caused by a command change
+        self.heartbeats = 0     # keepalive sends of an unchanged command
+        self.started_at = None
+        self.stopped_at = None
+
+        self._slot = (CMD_STOP, DEFAULT_SPEED, 0, 0)  # cmd, speed, left, right
+        self._pending_input = None  # (slot, input_ns) awaiting its first send
+        self._last_slot = None
+        self._last_send = 0.0
+        self._copy = None         # (packet, seq, cmd, speed, left, right) to repeat
+        self._copy_due = ()       # perf_counter() times of its remaining copies
+        self._ascii_speed = DEFAULT_SPEED
+        self._running = False
+        self._thread = None
+        self._selector = None
+        self._waker = None
+        self._recv_buffer = bytearray(64)  # an ack or a full telemetry batch
+
+    def set_command(self, cmd, speed, input_ns=None):
+        """Publish the command and speed to send from now on (lock-free)
+
+        input_ns is the perf_counter_ns() time of the input that caused it,
+        for the input-to-wire latency histogram.
+        """
+        left, right = motor_pwm(cmd, speed)
+        self._publish((cmd, speed, left, right), input_ns)
+
+    def set_drive(self, left, right, input_ns=None):
+        """Publish absolute signed motor PWM from analog input (binary only)"""
+        if self.protocol != PROTO_BINARY:
+            raise ValueError("analog drive needs the binary protocol")
+        self._publish((CMD_DRIVE, self._slot[1], left, right), input_ns)
+
+    def _publish(self, slot, input_ns):
+        # The pending input goes first, so the thread never sees the slot
+        # without it
+        if input_ns is not None:
+            self._pending_input = (slot, input_ns)
+        elif slot == self._slot:
+            return  # unchanged; keep the pending input's slot current
+        self._slot = slot
+
+    def wake(self):
+        """Send the published command now instead of at the next tick"""
+        if self._waker is not None:
+            self._waker.wake()
+
+    def start(self):
+        """Start the sender thread"""
+        self.started_at = time.perf_counter()
+        self._selector = selectors.DefaultSelector()
+        self._waker = Waker(self._selector)
+        if self.link is not None or self.telemetry is not None:
+            self._selector.register(self.sock, selectors.EVENT_READ)
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="command-sender", daemon=True)
+        self._thread.start()
+
+    def stop(self, final=CMD_STOP):
+        """Stop the sender thread, then send one last command (None to skip)"""
+        self._running = False
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+            self.stopped_at = time.perf_counter()
+        if self._selector is not None:
+            self._waker.close()
+            self._waker = None
+            self._selector.close()
+            self._selector = None
+        if final is not None:
+            self._send_final(final)
+        if self.recorder is not None:
+            self.recorder.close()
+
+    def session_stats(self):
+        """Packets sent this session and how many the mode saved"""
+        end = self.stopped_at if self.stopped_at is not None else time.perf_counter()
+        elapsed = end - self.started_at if self.started_at is not None else 0.0
+        legacy = int(elapsed * LEGACY_FRAME_RATE)
+        link = self.link
+        resolved = link.acks + link.lost if link is not None else 0
+        stats = {
+            "mode": self.mode,
+            "protocol": self.protocol,
+            "elapsed_s": elapsed,
+            "packets_sent": self.packets_sent,
+            "changes": self.changes,
+            "heartbeats": self.heartbeats,
+            "wakeups": self.wakeups,
+            "stream_equivalent": self.ticks,
+            "saved_vs_stream": self.ticks - self.packets_sent,
+            "legacy_per_frame": legacy,
+            "saved_vs_legacy": legacy - self.packets_sent,
+            "bytes_sent": self.bytes_sent,
+            "bandwidth_bps": self.bytes_sent * 8 / elapsed if elapsed else 0.0,
+            "delivery": link.acks / resolved if resolved else None,
+        }
+        if self.manager is not None:
+            stats["link_manager"] = self.manager.stats()
+        return stats
+
+    def _send(self, payload):
+        address = self.address
+        if address is None:
+            self.status = "SEARCHING..."  # discovery hasn't found the bot yet
+            return False
+        try:
+            self.sock.sendto(payload, address)
+        except OSError as e:
+            self.status = f"ERROR: {e}"
+            return False
+        if self.first_send_at is None:
+            self.first_send_at = time.perf_counter()
+        self.packets_sent += 1
+        self.bytes_sent += len(payload) + UDP_OVERHEAD
+        if self.link is None:
+            self.status = "CONNECTED"
+        return True
+
+    def _send_final(self, cmd):
+        speed = self._slot[1]
+        self._send_command(cmd, speed, *motor_pwm(cmd, speed))
+
+    def _send_copy(self):
+        # Repeat the critical packet as is; the receiver keeps one copy
+        packet, seq, cmd, speed, left, right = self._copy
+        self._copy_due = self._copy_due[1:]
+        if not self._send(packet):
+            return
+        self.manager.copies_sent += 1
+        if self.recorder is not None:
+            self.recorder.record(time.perf_counter_ns(), seq, cmd, speed, left, right,
+                                 packet[2], PROTOCOL_VERSION)
+
+    def _send_command(self, cmd, speed, left, right):
+        # Returns the perf_counter_ns() time sendto returned, or None
+        self._copy_due = ()  # a newer packet makes pending copies stale
+        if self.protocol == PROTO_BINARY:
+            flags = self.flags
+            if not self._send(self.encoder.encode(cmd, left, right, flags)):
+                return None
+            t_ns = time.perf_counter_ns()
+            if self.link is not None:
+                self.link.record_send(self.encoder.seq, t_ns)
+            if self.recorder is not None:
+                self.recorder.record(t_ns, self.encoder.seq, cmd, speed, left, right,
+                                     flags, PROTOCOL_VERSION)
+            if self.analytics is not None:
+                self.analytics.record(t_ns, self.encoder.seq, cmd, speed, flags)
+            return t_ns
+        return self._send_ascii(ASCII_PAYLOADS[cmd], cmd, speed)
+
+    def _send_ascii(self, payload, cmd, speed):
+        if not self._send(payload):
+            return None
+        t_ns = time.perf_counter_ns()
+        if self.recorder is not None:
+            self.recorder.record(t_ns, 0, cmd, speed, 0, 0, 0, payload[0])
+        if self.analytics is not None:
+            self.analytics.record(t_ns, 0, cmd, speed, 0)
+        return t_ns
+
+    def handle_ack(self, seq):
+        """Feed an echoed sequence number to the link stats"""
+        t_ns = time.perf_counter_ns()
+        if self.link.record_ack(seq, t_ns) is not None:
+            self.status = "CONNECTED"
+        if self.manager is not None:
+            self.manager.on_ack(seq)
+        if self.analytics is not None:
+            self.analytics.record_ack(seq, t_ns)
+
+    def handle_reply(self, data):
+        """Feed an ack or a telemetry batch from the receiver"""
+        seq = decode_ack(data)
+        if seq is not None:
+            if self.link is not None:
+                self.handle_ack(seq)
+        elif self.telemetry is not None:
+            telemetry = decode_telemetry(data)
+            if telemetry is not None:
+                self.telemetry.update(telemetry, len(data) + UDP_OVERHEAD, time.perf_counter(),
+                                      self.encoder.seq)
+
+    def _wait(self, timeout):
+        # Returns True if woken for an input edge. Acks are drained as soon
+        # as they arrive so their RTT isn't rounded to a tick.
+        deadline = time.perf_counter() + timeout
+        while timeout > 0:
+            for key, _ in self._selector.select(timeout):
+                if key.fileobj is self._waker.reader:
+                    self._waker.drain()
+                    return True
+                self._drain_replies()
+            timeout = deadline - time.perf_counter()
+        return False
+
+    def _drain_replies(self):
+        buf = self._recv_buffer
+        while True:
+            try:
+                n = self.sock.recv_into(buf)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                # e.g. ICMP port unreachable surfacing as ECONNREFUSED
+                return
+            self.handle_reply(buf[:n])
+
+    def _check_link(self):
+        now_ns = time.perf_counter_ns()
+        self.link.expire(now_ns)
+        self.link.refresh(now_ns / 1e9)  # publish RTT and loss for the UI and metrics
+        if self.address is None:
+            return
+        if (now_ns - self.link.last_ack_ns > NO_REPLY_AFTER * 1e9
+                and time.perf_counter() - self.started_at > NO_REPLY_AFTER):
+            self.status = "NO REPLY"
+
+    def _sync_ascii_speed(self, speed):
+        # Step the receiver's speed with '+'/'-' the same way the firmware
+        # clamps it, so both sides land on the same value
+        if speed > self._ascii_speed:
+            while self._ascii_speed < speed:
+                self._ascii_speed = min(MAX_SPEED, self._ascii_speed + SPEED_STEP)
+                self._send_ascii(ASCII_SPEED_UP, NO_COMMAND, self._ascii_speed)
+        else:
+            while self._ascii_speed > speed:
+                self._ascii_speed = max(MIN_SPEED, self._ascii_speed - SPEED_STEP)
+                self._send_ascii(ASCII_SPEED_DOWN, NO_COMMAND, self._ascii_speed)
+
+    def tick(self, now):
+        """One sender tick: decide whether to send, then check the link"""
+        self.ticks += 1
+        self.service(now)
+
+    def service(self, now):
+        """Send if the slot changed or a send is due (tick() without counting it)"""
+        slot = self._slot
+        last_slot = self._last_slot
+        cmd, speed, left, right = slot
+        sent_ns = None
+        manager = self.manager
+        if manager is not None:
+            manager.update(now, time.perf_counter_ns())
+        heartbeat_interval = self.heartbeat_interval if manager is None else manager.heartbeat_interval
+
+        if self.protocol == PROTO_ASCII and (last_slot is None or speed != last_slot[1]):
+            self._sync_ascii_speed(speed)
+            self._last_send = now
+
+        if self.mode == MODE_STREAM:
+            sent_ns = self._send_command(cmd, speed, left, right)
+            self._last_send = now
+        elif slot != last_slot:
+            self.changes += 1
+            sent_ns = self._send_command(cmd, speed, left, right)
+            self._last_send = now
+            if manager is not None and sent_ns is not None and self.protocol == PROTO_BINARY:
+                offsets = manager.on_change(last_slot, slot, self.encoder.seq, sent_ns)
+                if offsets:
+                    self._copy = (bytes(self.encoder.buffer), self.encoder.seq, cmd, speed, left, right)
+                    self._copy_due = tuple(now + offset for offset in offsets)
+        elif now - self._last_send >= heartbeat_interval:
+            self.heartbeats += 1
+            sent_ns = self._send_command(cmd, speed, left, right)
+            self._last_send = now
+        elif self._copy_due and now >= self._copy_due[0]:
+            self._send_copy()
+        self._last_slot = slot
+
+        # First sight of an input's slot: it went out now, or didn't need to
+        pending = self._pending_input
+        if pending is not None and pending[0] is slot:
+            self._pending_input = None
+            if sent_ns is not None:
+                self.input_latency.record(sent_ns - pending[1])
+
+        if self.link is not None:
+            self._check_link()
+
+    def _run(self):
+        next_tick = time.perf_counter()
+        while self._running:
+            self.tick(time.perf_counter())
+
+            # Wait until the next tick on an absolute schedule; if we fell
+            # behind, restart the schedule instead of bursting to catch up
+            next_tick += self.period
+            delay = next_tick - time.perf_counter()
+            if delay <= 0:
+                next_tick = time.perf_counter()
+                continue
+            # An input edge sends at once, then the schedule carries on
+            while self._wait(delay):
+                self.wakeups += 1
+                self.service(time.perf_counter())
+                delay = next_tick - time.perf_counter()
+
+
+class MultiSender:
+    """Drives several CommandSenders that share one socket from one thread"""
+
+    def __init__(self, sock, senders, rate_hz=DEFAULT_SEND_RATE):
+        self.sock = sock
+        self.senders = list(senders)
+        self.rate_hz = rate_hz
+        self.period = 1.0 / rate_hz
+        self._by_address = {}
+        self._selector = None
+        self._waker = None
+        self._recv_buffer = bytearray(64)  # an ack or a full telemetry batch
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        """Start the shared sender thread"""
+        now = time.perf_counter()
+        for sender in self.senders:
+            sender.started_at = now
+        # Acks and telemetry are routed back to their bot by source address
+        self._by_address = {
+            (socket.gethostbyname(sender.address[0]), sender.address[1]): sender
+            for sender in self.senders if sender.link is not None or sender.telemetry is not None
+        }
+        self._selector = selectors.DefaultSelector()
+        self._selector.register(self.sock, selectors.EVENT_READ)
+        self._waker = Waker(self._selector)
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="multi-sender", daemon=True)
+        self._thread.start()
+
+    def wake(self):
+        """Serve every bot now instead of at the next tick"""
+        if self._waker is not None:
+            self._waker.wake()
+
+    def stop(self, final=CMD_STOP):
+        """Stop the thread, then send every bot one last command (None to skip)"""
+        self._running = False
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._selector is not None:
+            self._waker.close()
+            self._waker = None
+            self._selector.close()
+            self._selector = None
+        now = time.perf_counter()
+        for sender in self.senders:
+            sender.stopped_at = now
+            if final is not None:
+                sender._send_final(final)
+            if sender.recorder is not None:
+                sender.recorder.close()
+
+    def _drain_replies(self):
+        buf = self._recv_buffer
+        while True:
+            try:
+                n, address = self.sock.recvfrom_into(buf)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                return
+            sender = self._by_address.get(address)
+            if sender is not None:
+                sender.handle_reply(buf[:n])
+
+    def _run(self):
+        next_tick = time.perf_counter()
+        while self._running:
+            # All bots are served in the same tick, back to back
+            now = time.perf_counter()
+            for sender in self.senders:
+                sender.tick(now)
+
+            next_tick += self.period
+            timeout = next_tick - time.perf_counter()
+            if timeout <= 0:
+                next_tick = time.perf_counter()
+                continue
+            while timeout > 0:
+                for key, _ in self._selector.select(timeout):
+                    if key.fileobj is self._waker.reader:
+                        # An input edge: serve every bot at once
+                        self._waker.drain()
+                        now = time.perf_counter()
+                        for sender in self.senders:
+                            sender.wakeups += 1
+                            sender.service(now)
+                    else:
+                        self._drain_replies()
+                timeout = next_tick - time.perf_counter()
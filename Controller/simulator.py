@@ -0,0 +1,434 @@
+import argparse
+import csv
+import math
+import time
+
+import numpy as np
+
+from protocol import (
+    CMD_STOP, CMD_FORWARD, CMD_RIGHT, CMD_UP_RIGHT, CMD_DRIVE, COMMAND_NAMES,
+    DEFAULT_SPEED, MIN_SPEED, MAX_SPEED, SPEED_STEP, TURN_OFFSET, MOTOR_MIX,
+    PROTOCOL_VERSION,
+)
+from recorder import NO_COMMAND
+
+# ============================================
+# Differential-Drive Simulator
+# ============================================
+# A kinematic model of the two-BO-motor bot for tuning the firmware's
+# speed constants (currentSpeed, sm, MIN_SPEED and the +/-100 step in
+# Reciever/src/main.cpp) without driving the real thing.
+#
+# DiffDriveSim holds one bot per parameter candidate, every state and
+# parameter a NumPy array over candidates, so a step advances thousands of
+# bots with a handful of array operations. It consumes the same stream the
+# controller produces - commands, '+'/'-' speed steps and DRIVE PWM - and
+# turns commands into motor PWM with the firmware's mix (MOTOR_MIX), each
+# candidate with its own speed and sm.
+#
+# Motor model: a BO motor doesn't turn below STALL_PWM; above it wheel
+# speed rises linearly to WHEEL_SPEED_MAX at full PWM and follows the
+# target with a first-order lag of MOTOR_TAU. The driver (or the
+# controller) releases the key REACTION_TIME after the target is reached.
+#
+#   python simulator.py --sweep                 # rank a grid of candidates
+#   python simulator.py --sweep --csv sweep.csv
+#   python simulator.py                         # drive it live with the keymap
+#   python simulator.py --sm 250 --log recordings/session-....tkr
+
+# ----- Robot (measure yours and change these) -----
+WHEEL_BASE = 0.14        # m between the wheels
+WHEEL_SPEED_MAX = 0.50   # m/s at PWM 1023 (150 RPM, 65 mm wheels)
+STALL_PWM = 350          # below this a BO motor doesn't turn
+MOTOR_TAU = 0.12         # s, wheel speed lag behind the PWM
+REACTION_TIME = 0.05     # s from reaching a target to STOP taking effect
+
+SIM_DT = 0.005  # s
+
+# ----- Sweep scenarios -----
+STRAIGHT_TARGET = 1.0    # m driven FORWARD at the candidate's speed
+SPIN_TARGET = 90.0       # deg turned in place with RIGHT
+SLOW_PRESSES = 2         # '-' presses before the precision approach
+SLOW_TARGET = 0.30       # m driven FORWARD after them
+SCENARIO_TIMEOUT = 10.0  # s; a candidate that hasn't arrived by then failed
+ARC_TARGET = 0.30        # m, UPPER_LEFT/RIGHT turning radius wanted
+
+# Grid swept by default: (start, stop inclusive, step)
+SWEEP_GRID = {
+    "speed": (400, 1000, 50),
+    "sm": (0, 500, 50),
+    "min_speed": (300, 600, 50),
+    "step": (50, 200, 25),
+}
+
+# Ranking: seconds of time-to-target, plus penalties for overshoot and for
+# the arc radius being off ARC_TARGET (|log ratio|: 2x too wide or too
+# tight costs 0.69 x its weight)
+COST_WEIGHTS = {"straight_m": 10.0, "spin_deg": 1 / 30, "slow_m": 20.0, "arc": 2.0}
+
+# MOTOR_MIX with an all-zero row for DRIVE, whose PWM comes with the packet
+_MIX = np.array(MOTOR_MIX + ((0, 0, 0, 0),), dtype=np.float64)
+
+
+def sweep_grid(grid=SWEEP_GRID):
+    """Every combination of grid as flat arrays, skipping speed < min_speed"""
+    axes = [np.arange(start, stop + 1, step) for start, stop, step in grid.values()]
+    mesh = [a.ravel() for a in np.meshgrid(*axes, indexing="ij")]
+    params = dict(zip(grid, mesh))
+    keep = params["speed"] >= params["min_speed"]
+    return {name: values[keep] for name, values in params.items()}
+
+
+def wheel_speed(pwm):
+    """Steady-state wheel speed (m/s) for signed PWM"""
+    magnitude = np.clip((np.abs(pwm) - STALL_PWM) / (MAX_SPEED - STALL_PWM), 0.0, 1.0)
+    return np.sign(pwm) * magnitude * WHEEL_SPEED_MAX
+
+
+class DiffDriveSim:
+    """A differential-drive bot per parameter candidate, stepped as arrays"""
+
+    def __init__(self, speed=DEFAULT_SPEED, sm=TURN_OFFSET, min_speed=MIN_SPEED, step=SPEED_STEP):
+        speed, sm, min_speed, step = np.broadcast_arrays(
+            *(np.asarray(p, dtype=np.float64) for p in (speed, sm, min_speed, step)))
+        self.n = speed.size
+        self.initial_speed = speed.ravel().copy()
+        self.speed = self.initial_speed.copy()
+        self.sm = sm.ravel()
+        self.min_speed = min_speed.ravel()
+        self.step_size = step.ravel()
+        self.cmd = np.zeros(self.n, dtype=np.int64)
+        self.drive_pwm = np.zeros((2, self.n))
+        self.t = 0.0
+        self.reset()
+
+    def reset(self):
+        """Back to the origin, facing +x, stopped, at the initial speed"""
+        self.x = np.zeros(self.n)
+        self.y = np.zeros(self.n)
+        self.theta = np.zeros(self.n)
+        self.v_left = np.zeros(self.n)
+        self.v_right = np.zeros(self.n)
+        self.distance = np.zeros(self.n)
+        self.speed[:] = self.initial_speed
+        self.cmd[:] = CMD_STOP
+        self.t = 0.0
+
+    # ----- Command stream -----
+
+    def command(self, cmd, where=None):
+        """Apply a command to every candidate, or those selected by where"""
+        if where is None:
+            self.cmd[:] = cmd
+        else:
+            self.cmd[where] = cmd
+
+    def faster(self):
+        """'+' as increaseSpeed() handles it"""
+        self.speed = np.minimum(self.speed + self.step_size, MAX_SPEED)
+
+    def slower(self):
+        """'-' as decreaseSpeed() handles it"""
+        self.speed = np.maximum(self.speed - self.step_size, self.min_speed)
+
+    def drive(self, left, right):
+        """CMD_DRIVE with explicit signed PWM (same for every candidate)"""
+        self.cmd[:] = CMD_DRIVE
+        self.drive_pwm[0] = left
+        self.drive_pwm[1] = right
+
+    # ----- Physics -----
+
+    def pwm(self):
+        """Signed (left, right) PWM arrays the firmware would write"""
+        mix = _MIX[self.cmd]
+        left = mix[:, 0] * np.clip(self.speed + mix[:, 1] * self.sm, 0, MAX_SPEED)
+        right = mix[:, 2] * np.clip(self.speed + mix[:, 3] * self.sm, 0, MAX_SPEED)
+        driving = self.cmd == CMD_DRIVE
+        if driving.any():
+            left = np.where(driving, self.drive_pwm[0], left)
+            right = np.where(driving, self.drive_pwm[1], right)
+        return left, right
+
+    def step(self, dt=SIM_DT):
+        """Advance every candidate by dt"""
+        left, right = self.pwm()
+        blend = min(1.0, dt / MOTOR_TAU)
+        self.v_left += (wheel_speed(left) - self.v_left) * blend
+        self.v_right += (wheel_speed(right) - self.v_right) * blend
+        v = (self.v_left + self.v_right) / 2
+        heading = self.theta + (self.v_right - self.v_left) / WHEEL_BASE * dt / 2  # midpoint
+        self.x += v * np.cos(heading) * dt
+        self.y += v * np.sin(heading) * dt
+        self.theta += (self.v_right - self.v_left) / WHEEL_BASE * dt
+        self.distance += np.abs(v) * dt
+        self.t += dt
+
+    def moving(self):
+        """Candidates whose wheels are still turning"""
+        return (np.abs(self.v_left) > 1e-4) | (np.abs(self.v_right) > 1e-4)
+
+
+# ============================================
+# Sweep
+# ============================================
+
+def run_to_target(sim, cmd, measure, target, dt=SIM_DT, timeout=SCENARIO_TIMEOUT):
+    """Drive cmd until measure(sim) reaches target, STOP after REACTION_TIME
+
+    Returns (time to target, overshoot) per candidate; NaN time if it never
+    got there.
+    """
+    sim.command(cmd)
+    reached_at = np.full(sim.n, np.nan)
+    start = sim.t
+    while sim.t - start < timeout:
+        sim.step(dt)
+        elapsed = sim.t - start
+        newly = np.isnan(reached_at) & (measure(sim) >= target)
+        reached_at[newly] = elapsed
+        sim.command(CMD_STOP, where=elapsed >= reached_at + REACTION_TIME)
+        if not np.isnan(reached_at).any() or elapsed > 1.0 and not sim.moving().any():
+            break
+    sim.command(CMD_STOP)
+    while sim.moving().any() and sim.t - start < timeout + 2.0:
+        sim.step(dt)
+    return reached_at, np.where(np.isnan(reached_at), np.nan, measure(sim) - target)
+
+
+def arc_radius(speed, sm):
+    """Steady-state turning radius (m) of UPPER_RIGHT for each candidate"""
+    mix = _MIX[CMD_UP_RIGHT]
+    left = wheel_speed(mix[0] * np.clip(speed + mix[1] * sm, 0, MAX_SPEED))
+    right = wheel_speed(mix[2] * np.clip(speed + mix[3] * sm, 0, MAX_SPEED))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        radius = WHEEL_BASE / 2 * np.abs((left + right) / (left - right))
+    return np.where(left == right, np.inf, radius)
+
+
+def sweep(params):
+    """Run every scenario for every candidate; returns a dict of metric arrays"""
+    sim = DiffDriveSim(**params)
+    results = dict(params)
+    results["arc_radius_m"] = arc_radius(sim.speed, sim.sm)
+
+    t, over = run_to_target(sim, CMD_FORWARD, lambda s: s.x, STRAIGHT_TARGET)
+    results["straight_s"], results["straight_over_m"] = t, over
+
+    sim.reset()
+    t, over = run_to_target(sim, CMD_RIGHT, lambda s: np.degrees(-s.theta), SPIN_TARGET)
+    results["spin_s"], results["spin_over_deg"] = t, over
+
+    sim.reset()
+    for _ in range(SLOW_PRESSES):
+        sim.slower()
+    results["slow_speed"] = sim.speed.copy()
+    t, over = run_to_target(sim, CMD_FORWARD, lambda s: s.x, SLOW_TARGET)
+    results["slow_s"], results["slow_over_m"] = t, over
+
+    with np.errstate(divide="ignore"):
+        arc_error = np.abs(np.log(results["arc_radius_m"] / ARC_TARGET))
+    cost = (results["straight_s"] + results["spin_s"] + results["slow_s"]
+            + COST_WEIGHTS["straight_m"] * np.abs(results["straight_over_m"])
+            + COST_WEIGHTS["spin_deg"] * np.abs(results["spin_over_deg"])
+            + COST_WEIGHTS["slow_m"] * np.abs(results["slow_over_m"])
+            + COST_WEIGHTS["arc"] * arc_error)
+    results["cost"] = np.where(np.isnan(cost), np.inf, cost)  # never arrived: last
+    return results
+
+
+def format_row(results, i):
+    """One candidate as a table row"""
+    r = {name: values[i] for name, values in results.items()}
+    return (f"{r['speed']:5.0f} {r['sm']:4.0f} {r['min_speed']:5.0f} {r['step']:4.0f} | "
+            f"{r['straight_s']:5.2f}s {r['straight_over_m'] * 100:5.1f}cm | "
+            f"{r['spin_s']:5.2f}s {r['spin_over_deg']:5.1f}deg | "
+            f"{r['slow_speed']:5.0f} {r['slow_s']:5.2f}s {r['slow_over_m'] * 100:5.1f}cm | "
+            f"{r['arc_radius_m'] * 100:6.1f}cm | {r['cost']:6.2f}")
+
+
+def print_sweep(results, top):
+    """Best candidates by cost, and the firmware's current constants for reference"""
+    print(f" speed   sm   min step | straight {STRAIGHT_TARGET:g} m  | spin {SPIN_TARGET:g} deg     | "
+          f"after {SLOW_PRESSES}x'-' {SLOW_TARGET:g} m | arc R   | cost")
+    order = np.argsort(results["cost"], kind="stable")
+    for i in order[:top]:
+        print(format_row(results, i))
+    current = np.flatnonzero((results["speed"] == DEFAULT_SPEED) & (results["sm"] == TURN_OFFSET)
+                             & (results["min_speed"] == MIN_SPEED) & (results["step"] == SPEED_STEP))
+    if len(current):
+        rank = int(np.flatnonzero(order == current[0])[0]) + 1
+        print(f"Firmware constants (rank {rank} of {len(order)}):")
+        print(format_row(results, current[0]))
+    stalled = np.isnan(results["slow_s"]).sum()
+    if stalled:
+        print(f"{stalled} candidates stall after {SLOW_PRESSES}x'-' (speed below STALL_PWM {STALL_PWM})")
+
+
+def save_sweep(results, path):
+    """Every candidate and metric as CSV"""
+    names = list(results)
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(names)
+        writer.writerows(zip(*(results[name].tolist() for name in names)))
+
+
+# ============================================
+# Recorded sessions
+# ============================================
+
+def log_events(log):
+    """(t_s, action, left, right) for each change in a SessionLog's stream
+
+    action is a command code, "+" or "-"; left/right only matter for DRIVE.
+    Binary packets carry the absolute speed, so a change of it is turned
+    back into the presses that caused it.
+    """
+    last = None
+    speed = None
+    for t_ns, seq, rec_speed, left, right, cmd, flags, lead in log:
+        t_s = t_ns / 1e9
+        if cmd == NO_COMMAND:
+            yield t_s, chr(lead), 0, 0
+            continue
+        if lead == PROTOCOL_VERSION and cmd != CMD_DRIVE and speed is not None:
+            for _ in range(abs(rec_speed - speed) // SPEED_STEP):
+                yield t_s, "+" if rec_speed > speed else "-", 0, 0
+        speed = rec_speed
+        if (cmd, left, right) != last:
+            yield t_s, cmd, left, right
+            last = (cmd, left, right)
+
+
+def apply_event(sim, action, left, right):
+    """Feed one command-stream event to the sim"""
+    if action == "+":
+        sim.faster()
+    elif action == "-":
+        sim.slower()
+    elif action == CMD_DRIVE:
+        sim.drive(left, right)
+    else:
+        sim.command(action)
+
+
+# ============================================
+# Live view
+# ============================================
+
+def live(args):
+    """Drive the simulated bot with the controller keymap"""
+    import pygame
+    from keymap import Keymap
+    from recorder import SessionLog
+
+    WIDTH, HEIGHT, SCALE = 900, 650, 200  # px, px, px per m
+    pygame.init()
+    screen = pygame.display.set_mode((WIDTH, HEIGHT))
+    pygame.display.set_caption("Bot simulator")
+    font = pygame.font.SysFont("monospace", 16)
+    clock = pygame.time.Clock()
+    keymap = Keymap()
+    sim = DiffDriveSim(args.speed, args.sm, args.min_speed, args.step)
+    events = list(log_events(SessionLog(args.log))) if args.log else None
+    next_event = 0
+    trail = []
+    origin = (WIDTH // 2, HEIGHT // 2)
+
+    def to_screen(x, y):
+        return origin[0] + x * SCALE, origin[1] - y * SCALE
+
+    last = time.perf_counter()
+    running = True
+    while running:
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                running = False
+            elif event.type == pygame.KEYDOWN:
+                action = keymap.edge_action(event.key)
+                if action == "quit":
+                    running = False
+                elif action == "faster" and events is None:
+                    sim.faster()
+                elif action == "slower" and events is None:
+                    sim.slower()
+                elif event.key == pygame.K_r:
+                    sim.reset()
+                    trail.clear()
+                    next_event = 0
+
+        # Real time: as many fixed steps as have elapsed since the last frame
+        now = time.perf_counter()
+        steps = min(int((now - last) / SIM_DT), 50)
+        last += steps * SIM_DT if steps < 50 else now - last
+        if events is None:
+            sim.command(keymap.command(keymap.mask(pygame.key.get_pressed())))
+        for _ in range(steps):
+            while events is not None and next_event < len(events) and events[next_event][0] <= sim.t:
+                apply_event(sim, *events[next_event][1:])
+                next_event += 1
+            sim.step()
+        pose = (float(sim.x[0]), float(sim.y[0]), float(sim.theta[0]))
+        if not trail or math.dist(trail[-1], pose[:2]) > 0.01:
+            trail.append(pose[:2])
+
+        screen.fill((30, 30, 30))
+        for m in range(-5, 6):  # 1 m grid
+            x, y = to_screen(m, m)
+            pygame.draw.line(screen, (50, 50, 50), (x, 0), (x, HEIGHT))
+            pygame.draw.line(screen, (50, 50, 50), (0, y), (WIDTH, y))
+        if len(trail) > 1:
+            pygame.draw.lines(screen, (0, 120, 255), False, [to_screen(*p) for p in trail], 2)
+        x, y, theta = pose
+        half_l, half_w = 0.09, WHEEL_BASE / 2
+        corners = [(x + dx * math.cos(theta) - dy * math.sin(theta),
+                    y + dx * math.sin(theta) + dy * math.cos(theta))
+                   for dx, dy in ((half_l, half_w), (half_l, -half_w), (-half_l, -half_w), (-half_l, half_w))]
+        pygame.draw.polygon(screen, (0, 255, 0), [to_screen(*c) for c in corners], 2)
+        pygame.draw.line(screen, (255, 255, 0), to_screen(x, y),
+                         to_screen(x + 0.12 * math.cos(theta), y + 0.12 * math.sin(theta)), 2)
+
+        left, right = sim.pwm()
+        lines = (
+            f"CMD {COMMAND_NAMES[sim.cmd[0]]:<12} speed {sim.speed[0]:4.0f}  sm {sim.sm[0]:3.0f}  "
+            f"min {sim.min_speed[0]:3.0f}  step {sim.step_size[0]:3.0f}",
+            f"PWM L {left[0]:5.0f}  R {right[0]:5.0f}   wheels {sim.v_left[0]:+.2f} {sim.v_right[0]:+.2f} m/s",
+            f"t {sim.t:6.1f}s  distance {sim.distance[0]:5.2f} m  heading {math.degrees(theta) % 360:5.1f} deg",
+            "replaying " + args.log if events is not None else "WASD/arrows drive, +/- speed, R reset, ESC quit",
+        )
+        for n, text in enumerate(lines):
+            screen.blit(font.render(text, True, (255, 255, 255)), (10, 10 + n * 20))
+        pygame.display.flip()
+        clock.tick(60)
+    pygame.quit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Differential-drive simulator for tuning speed constants")
+    parser.add_argument("--sweep", action="store_true", help="rank a grid of candidates (SWEEP_GRID)")
+    parser.add_argument("--top", type=int, default=10, help="candidates shown by --sweep")
+    parser.add_argument("--csv", help="with --sweep, save every candidate's metrics here")
+    parser.add_argument("--speed", type=float, default=DEFAULT_SPEED, help="currentSpeed for the live view")
+    parser.add_argument("--sm", type=float, default=TURN_OFFSET)
+    parser.add_argument("--min-speed", type=float, default=MIN_SPEED)
+    parser.add_argument("--step", type=float, default=SPEED_STEP)
+    parser.add_argument("--log", help="live view: drive from a recorded session instead of the keyboard")
+    args = parser.parse_args()
+
+    if not args.sweep:
+        live(args)
+        return
+    params = sweep_grid()
+    count = len(params["speed"])
+    start = time.perf_counter()
+    results = sweep(params)
+    print(f"{count} candidates simulated in {time.perf_counter() - start:.2f}s\n")
+    print_sweep(results, args.top)
+    if args.csv:
+        save_sweep(results, args.csv)
+        print(f"Saved to {args.csv}")
+
+
+if __name__ == "__main__":
+    main()
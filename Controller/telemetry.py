@@ -0,0 +1,129 @@
+from array import array
+from collections import deque, namedtuple
+
+from protocol import TELEM_TIMED_OUT, TELEM_SEQ_VALID, TELEMETRY_SAMPLE_MS
+
+# ============================================
+# Bot Telemetry
+# ============================================
+# What the receiver reports about itself over the telemetry back-channel
+# (see the telemetry packet in protocol.py): the PWM it is driving, the
+# last sequence number it applied, its COMMAND_TIMEOUT stops and its
+# uptime. A CommandSender created with telemetry=True asks for it with
+# FLAG_TELEMETRY, and its thread, which already waits on the socket with a
+# selector for acks, hands every batch to update(). The render loop never
+# touches the socket.
+#
+# Each batch publishes a new BotState by rebinding one attribute, so the
+# UI reads a consistent state without a lock and can tell that it changed
+# by identity (single writer, like LinkStats' snapshot). The samples are
+# kept with their bot-clock time in fixed-size array rings, so a batch adds
+# no Python objects that outlive it. A jump
+# back in uptime means the bot rebooted (e.g. a brownout); a hole between
+# batches means one was lost.
+
+TELEMETRY_STALE = 1.0  # s without a batch before the UI shows none
+HISTORY = 3000  # samples kept: 60 s at TELEMETRY_SAMPLE_MS
+TIMEOUT_EVENTS = 10  # latest timeout stops kept for the session report
+
+# lag: packets sent after last_seq when the batch arrived (None if unknown)
+BotState = namedtuple("BotState", "left right last_seq lag uptime_ms timeouts timed_out")
+
+
+class BotTelemetry:
+    """Latest bot-side state from telemetry batches (written by the sender thread)"""
+
+    def __init__(self, history=HISTORY):
+        self.state = None        # latest BotState, rebound per batch
+        self.received_at = 0.0   # perf_counter() of the latest batch
+        self.history = history
+        self._t_ms = array("I", [0]) * history  # rings of bot uptime, left, right
+        self._left = array("h", [0]) * history
+        self._right = array("h", [0]) * history
+        self._index = 0
+        # bot uptime_ms of the latest timeout, per batch reporting any; only the last few are kept
+        self.timeout_events = deque(maxlen=TIMEOUT_EVENTS)
+        self.timeouts_seen = 0
+        self.batches = 0
+        self.samples = 0
+        self.bytes = 0           # including IP/UDP headers
+        self.gaps = 0            # batches missing between two received ones
+        self.reboots = 0
+
+    def update(self, telemetry, size, now, sent_seq=None):
+        """Take one decoded Telemetry batch of size bytes received at now
+
+        sent_seq is the sequence number last sent, for the lag.
+        """
+        previous = self.state
+        samples = telemetry.samples
+        first_ms = telemetry.uptime_ms - (len(samples) - 1) * TELEMETRY_SAMPLE_MS
+        if previous is not None:
+            if telemetry.uptime_ms < previous.uptime_ms:
+                self.reboots += 1
+                previous = None
+            elif samples and first_ms - previous.uptime_ms > 2 * TELEMETRY_SAMPLE_MS:
+                self.gaps += 1
+        if previous is None:
+            # Stops before the first batch belong to an earlier session
+            new_timeouts = telemetry.timeouts if self.batches else 0
+        else:
+            new_timeouts = (telemetry.timeouts - previous.timeouts) & 0xFFFF
+        if new_timeouts:
+            # Only the latest one's time is sent; it is the one that matters
+            self.timeouts_seen += new_timeouts
+            self.timeout_events.append(telemetry.last_timeout_ms)
+
+        index = self._index
+        t_ms = first_ms
+        for left, right in samples:
+            self._t_ms[index] = t_ms & 0xFFFFFFFF
+            self._left[index] = left
+            self._right[index] = right
+            t_ms += TELEMETRY_SAMPLE_MS
+            index = (index + 1) % self.history
+        self._index = index
+        if samples:
+            left, right = samples[-1]
+        elif previous is not None:
+            left, right = previous.left, previous.right
+        else:
+            left = right = 0
+        self.batches += 1
+        self.samples += len(samples)
+        self.bytes += size
+        self.received_at = now
+        last_seq = lag = None
+        if telemetry.flags & TELEM_SEQ_VALID:
+            last_seq = telemetry.last_seq
+            if sent_seq is not None:
+                lag = (sent_seq - last_seq) & 0xFFFF
+        self.state = BotState(left, right, last_seq, lag, telemetry.uptime_ms,
+                              telemetry.timeouts, bool(telemetry.flags & TELEM_TIMED_OUT))
+
+    def recent(self):
+        """The kept samples as (uptime_ms, left, right), oldest first"""
+        count = min(self.samples, self.history)
+        start = (self._index - count) % self.history
+        return [(self._t_ms[i % self.history], self._left[i % self.history],
+                 self._right[i % self.history]) for i in range(start, start + count)]
+
+    def fresh(self, now, max_age=TELEMETRY_STALE):
+        """The latest state if it arrived within max_age seconds, else None"""
+        if self.state is None or now - self.received_at > max_age:
+            return None
+        return self.state
+
+    def report_lines(self, elapsed):
+        """Summary lines for the end-of-session report"""
+        if not self.batches:
+            return ["Telemetry: nothing received (receiver firmware without it?)"]
+        rate = self.bytes * 8 / elapsed if elapsed else 0.0
+        lines = [f"Telemetry: {self.batches} batches, {self.samples} samples, "
+                 f"{rate:.0f} bit/s uplink, {self.gaps} lost, {self.reboots} reboots"]
+        state = self.state
+        lines.append(f"Bot: up {state.uptime_ms / 1000:.1f}s, {state.timeouts} timeout stops since boot")
+        if self.timeout_events:
+            times = ", ".join(f"{t / 1000:.1f}s" for t in self.timeout_events)
+            lines.append(f"Timeout stops this session: {self.timeouts_seen} (bot uptime {times})")
+        return lines
@@ -0,0 +1,133 @@
+import json
+import socket
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from discovery import Bot, BotFinder, discover, load_cache, open_socket, remember, save_cache
+from receiver_emulator import ReceiverEmulator
+
+BOT_ID = 0x0B0700B1
+
+
+def wait_for(condition, timeout=3.0):
+    deadline = time.perf_counter() + timeout
+    while not condition():
+        if time.perf_counter() > deadline:
+            return False
+        time.sleep(0.005)
+    return True
+
+
+@pytest.fixture
+def sock():
+    sock = open_socket()
+    yield sock
+    sock.close()
+
+
+@pytest.fixture
+def quiet():
+    # A port where nobody answers
+    quiet = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    quiet.bind(("127.0.0.1", 0))
+    yield quiet.getsockname()
+    quiet.close()
+
+
+def test_discover_every_target(sock):
+    with ReceiverEmulator(port=0, name="a") as a, ReceiverEmulator(port=0, name="b") as b:
+        bots, elapsed = discover(sock, [("127.0.0.1", a.port), ("127.0.0.1", b.port)], timeout=1.0)
+    assert sorted(bot.name for bot in bots) == ["a", "b"]
+    assert {bot.bot_id for bot in bots} == {a.bot_id, b.bot_id}
+    assert all(bot.rtt_ms < 50 for bot in bots)
+    assert bots == sorted(bots, key=lambda bot: bot.rtt_ms)
+    assert elapsed < 0.5  # settles soon after the first reply
+
+
+def test_discover_times_out_quietly(sock, quiet):
+    bots, elapsed = discover(sock, [quiet], timeout=0.15)
+    assert bots == []
+    assert 0.15 <= elapsed < 0.5
+
+
+def test_cache_round_trip(tmp_path):
+    path = str(tmp_path / "bots.json")
+    cache = load_cache(path)
+    assert cache == {"last": None, "bots": {}}
+    bot = Bot(BOT_ID, "tank", 3, "10.0.0.7", 4210, 1.5)
+    assert remember(cache, bot)
+    assert not remember(cache, bot)  # nothing changed: no write needed
+    save_cache(path, cache)
+    assert load_cache(path) == {"last": "0b0700b1", "bots": {
+        "0b0700b1": {"name": "tank", "caps": 3, "host": "10.0.0.7", "port": 4210}}}
+
+
+def test_malformed_cache_is_ignored(tmp_path, capsys):
+    path = tmp_path / "bots.json"
+    path.write_text(json.dumps(["not", "a", "cache"]))
+    assert load_cache(str(path)) == {"last": None, "bots": {}}
+    assert "malformed" in capsys.readouterr().out
+
+
+def test_resolve_uses_the_cache_without_probing(tmp_path, sock, quiet):
+    path = str(tmp_path / "bots.json")
+    cache = load_cache(path)
+    remember(cache, Bot(BOT_ID, "tank", 3, "10.0.0.7", 4210, None))
+    save_cache(path, cache)
+    finder = BotFinder(sock, cache_path=path, targets=[quiet], timeout=0.1)
+    started = time.perf_counter()
+    assert finder.resolve() == ("10.0.0.7", 4210)
+    assert time.perf_counter() - started < 0.05
+    assert finder.source == "cache"
+    assert finder.bot.bot_id == BOT_ID
+
+
+def test_resolve_discovers_and_remembers(tmp_path, sock):
+    path = str(tmp_path / "bots.json")
+    with ReceiverEmulator(port=0, bot_id=BOT_ID) as emulator:
+        finder = BotFinder(sock, cache_path=path, targets=[("127.0.0.1", emulator.port)])
+        assert finder.resolve() == ("127.0.0.1", emulator.port)
+    assert finder.source == "discovery"
+    assert load_cache(path)["last"] == f"{BOT_ID:08x}"
+
+
+def test_resolve_with_nobody_answering(sock, quiet):
+    finder = BotFinder(sock, cache_path=None, targets=[quiet], timeout=0.1)
+    assert finder.resolve() is None
+    assert "still searching" in finder.summary()
+
+
+def test_follow_retargets_the_sender_when_the_bot_moves(tmp_path, quiet):
+    with ReceiverEmulator(port=0, bot_id=BOT_ID) as old, ReceiverEmulator(port=0) as other:
+        finder = BotFinder(open_socket(), cache_path=str(tmp_path / "bots.json"),
+                           targets=[("127.0.0.1", old.port), ("127.0.0.1", other.port)],
+                           timeout=0.2, interval=0.05)
+        sender = SimpleNamespace(address=finder.resolve())
+        old_port = old.port
+        finder.follow(sender)
+        try:
+            old.stop()  # the bot reboots on a new address...
+            with ReceiverEmulator(port=0, bot_id=BOT_ID) as moved:
+                finder.targets.append(("127.0.0.1", moved.port))
+                assert wait_for(lambda: sender.address == ("127.0.0.1", moved.port))
+        finally:
+            finder.stop()
+    assert finder.moves == 1
+    assert sender.address != ("127.0.0.1", old_port)  # never the other bot
+    assert sender.address != ("127.0.0.1", other.port)
+
+
+def test_follow_fills_in_an_address_once_a_bot_answers(quiet):
+    finder = BotFinder(open_socket(), cache_path=None, targets=[quiet], timeout=0.1, interval=0.05)
+    sender = SimpleNamespace(address=finder.resolve())
+    assert sender.address is None
+    finder.follow(sender)
+    try:
+        with ReceiverEmulator(port=0) as emulator:
+            finder.targets.append(("127.0.0.1", emulator.port))
+            assert wait_for(lambda: sender.address == ("127.0.0.1", emulator.port))
+    finally:
+        finder.stop()
+    assert finder.moves == 0
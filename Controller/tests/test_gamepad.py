@@ -0,0 +1,77 @@
+import pygame
+import pytest
+
+import gamepad
+from gamepad import DriveMixer, open_gamepad
+from protocol import DEFAULT_SPEED, MAX_SPEED, MIN_SPEED
+
+
+class FakeJoystick:
+    def __init__(self, index):
+        self.axes = [0.0, 0.0]
+
+    def init(self):
+        pass
+
+    def get_name(self):
+        return "fake pad"
+
+    def get_instance_id(self):
+        return 7
+
+    def get_axis(self, axis):
+        return self.axes[axis]
+
+
+@pytest.fixture
+def fake_pad(monkeypatch):
+    monkeypatch.setattr(pygame.joystick, "init", lambda: None)
+    monkeypatch.setattr(pygame.joystick, "get_count", lambda: 1)
+    monkeypatch.setattr(pygame.joystick, "Joystick", FakeJoystick)
+
+
+def test_mix_corners_and_centre():
+    mixer = DriveMixer(max_pwm=800)
+    assert mixer.mix(0.0, 0.0) == (0, 0)
+    assert mixer.mix(1.0, 0.0) == (800, 800)
+    assert mixer.mix(-1.0, 0.0) == (-800, -800)
+    assert mixer.mix(0.0, 1.0) == (800, -800)  # spin in place
+    assert mixer.mix(0.05, -0.05) == (0, 0)  # inside the deadzone
+    left, right = mixer.mix(1.0, 0.5)
+    assert left == 800 and MIN_SPEED <= right < left
+
+
+def test_small_outputs_start_at_the_motor_floor():
+    left, right = DriveMixer(max_pwm=MAX_SPEED).mix(0.1, 0.0)
+    assert left == right
+    assert MIN_SPEED <= left < MIN_SPEED + 20
+
+
+def test_set_max_pwm_caps_the_output():
+    mixer = DriveMixer()
+    assert mixer.mix(1.0, 0.0) == (MAX_SPEED, MAX_SPEED)
+    mixer.set_max_pwm(DEFAULT_SPEED)
+    assert mixer.max_pwm == DEFAULT_SPEED
+    assert mixer.mix(1.0, 0.0) == (DEFAULT_SPEED, DEFAULT_SPEED)
+
+
+def test_tables_are_built_once_and_shared():
+    first = DriveMixer(max_pwm=777)
+    second = DriveMixer(max_pwm=777)
+    assert first.table is second.table
+    assert DriveMixer(expo=0.5, max_pwm=777).table is not first.table
+    assert (0.08, 0.3, gamepad.AXIS_STEPS, 777) in gamepad._tables
+
+
+def test_open_gamepad_starts_at_the_given_speed(fake_pad):
+    pad = open_gamepad(0, DEFAULT_SPEED)
+    assert pad.name == "fake pad"
+    assert pad.mixer.max_pwm == DEFAULT_SPEED
+    pad.joystick.axes[1] = -1.0  # stick fully up
+    assert pad.read() == (DEFAULT_SPEED, DEFAULT_SPEED)
+
+
+def test_open_gamepad_without_a_pad(monkeypatch):
+    monkeypatch.setattr(pygame.joystick, "init", lambda: None)
+    monkeypatch.setattr(pygame.joystick, "get_count", lambda: 0)
+    assert open_gamepad(0, DEFAULT_SPEED) is None
@@ -0,0 +1,50 @@
+import os
+
+import pytest
+
+from headless import TerminalInput
+
+
+@pytest.fixture
+def terminal():
+    read_fd, write_fd = os.pipe()
+    source = TerminalInput(fd=read_fd, repeat_delay=0.5, repeat_gap=0.08)
+    yield source, write_fd
+    os.close(read_fd)
+    os.close(write_fd)
+
+
+def type_keys(terminal, now, text):
+    source, write_fd = terminal
+    os.write(write_fd, text)
+    return source.read(now, {"w", "UP"})
+
+
+def test_fresh_press_lasts_until_the_first_repeat(terminal):
+    source, _ = terminal
+    assert type_keys(terminal, 10.0, b"w") == ["w"]
+    assert source.held["w"]
+    assert source.expire(10.3) == pytest.approx(10.5)  # no stutter before the repeat delay
+    assert source.held["w"]
+    source.expire(10.5)
+    assert not source.held["w"]  # a tap ends after the repeat delay
+
+
+def test_release_during_repeats_stops_within_the_gap(terminal):
+    source, _ = terminal
+    type_keys(terminal, 10.0, b"w")
+    type_keys(terminal, 10.45, b"w")  # first auto-repeat
+    assert source.expire(10.46) == pytest.approx(10.53)
+    source.expire(10.53)
+    assert not source.held["w"]
+    type_keys(terminal, 11.0, b"w")  # pressed again: a fresh press
+    assert source.expire(11.1) == pytest.approx(11.5)
+
+
+def test_arrows_and_stop(terminal):
+    source, _ = terminal
+    assert type_keys(terminal, 1.0, b"\x1b[A") == ["UP"]
+    assert source.held["UP"]
+    assert type_keys(terminal, 1.1, b" ") == [" "]
+    assert not source.held["UP"]
+    assert source.expire(1.2) is None
@@ -0,0 +1,53 @@
+from collections import defaultdict
+
+from keymap import Keymap, BIT_UP, BIT_DOWN, BIT_LEFT, BIT_RIGHT, check_keymaps
+from protocol import CMD_STOP, CMD_FORWARD, CMD_LEFT, CMD_UP_LEFT, CMD_DOWN_RIGHT
+
+BINDINGS = {"up": ("w",), "down": ("s",), "left": ("a",), "right": ("d",),
+            "faster": ("+",), "slower": ("-",)}
+
+
+def held(*keys):
+    state = defaultdict(bool)
+    for key in keys:
+        state[key] = True
+    return state
+
+
+def keymap():
+    return Keymap(BINDINGS, key_name=str)
+
+
+def test_directions_map_to_commands():
+    km = keymap()
+    assert km.problems == []
+    assert km.command(km.mask(held())) == CMD_STOP
+    assert km.command(km.mask(held("w"))) == CMD_FORWARD
+    assert km.command(km.mask(held("w", "a"))) == CMD_UP_LEFT
+    assert km.command(BIT_DOWN | BIT_RIGHT) == CMD_DOWN_RIGHT
+
+
+def test_opposite_keys_cancel():
+    km = keymap()
+    assert km.command(km.mask(held("w", "s"))) == CMD_STOP
+    assert km.command(km.mask(held("a", "d"))) == CMD_STOP
+    assert km.command(BIT_UP | BIT_DOWN | BIT_LEFT) == CMD_LEFT
+    assert km.command(BIT_UP | BIT_DOWN | BIT_LEFT | BIT_RIGHT) == CMD_STOP
+
+
+def test_edge_actions():
+    km = keymap()
+    assert km.edge_action("+") == "faster"
+    assert km.edge_action("w") is None
+
+
+def test_problems_are_reported():
+    km = Keymap({"up": ("w",), "down": ("w",), "jump": ("j",)}, key_name=str)
+    assert any("bound to both" in problem for problem in km.problems)
+    assert any("unknown action" in problem for problem in km.problems)
+    assert any("unreachable" in problem for problem in km.problems)
+
+
+def test_shared_keys_across_keymaps():
+    problems = check_keymaps([("one", keymap()), ("two", keymap())])
+    assert any("used by both one and two" in problem for problem in problems)
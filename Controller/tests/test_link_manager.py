@@ -0,0 +1,93 @@
+import pytest
+
+from link_manager import (
+    LinkManager, HEARTBEAT_RANGE, MAX_COPIES, MIN_SPACING, UNKNOWN_LOSS, OUTAGE_LOSS,
+    critical_reason,
+)
+from link_stats import LinkStats
+from protocol import CMD_STOP, CMD_FORWARD, CMD_BACKWARD
+
+MS = 1_000_000
+
+
+def link_with(acked, lost, rtt_ms=1.0):
+    link = LinkStats(window=1000, ack_timeout=0.1)
+    for seq in range(1, acked + lost + 1):
+        link.record_send(seq, MS)
+    for seq in range(1, acked + 1):
+        link.record_ack(seq, MS + int(rtt_ms * MS))
+    link.expire(1000 * MS)
+    return link
+
+
+def planned(link, redundancy=True, now_ns=None):
+    # Planned just after the last ack unless now_ns says otherwise
+    if now_ns is None:
+        now_ns = (link.last_ack_ns if link is not None else 0) + MS
+    manager = LinkManager(link, 0.300, redundancy=redundancy)
+    manager.plan(1.0, now_ns)
+    return manager
+
+
+def test_clean_link_uses_longest_heartbeat_and_no_copies():
+    manager = planned(link_with(1000, 0))
+    assert manager.heartbeat_interval == HEARTBEAT_RANGE[1]
+    assert manager.copies == 0
+
+
+def test_bad_link_is_bounded():
+    manager = planned(link_with(500, 500))
+    assert manager.loss == OUTAGE_LOSS
+    assert manager.heartbeat_interval == HEARTBEAT_RANGE[0]
+    assert manager.copies == MAX_COPIES
+
+
+@pytest.mark.parametrize("lost", [0, 10, 50, 100, 300, 1000])
+def test_plan_stays_within_bounds(lost):
+    manager = planned(link_with(1000 - lost if lost < 1000 else 0, lost))
+    assert HEARTBEAT_RANGE[0] <= manager.heartbeat_interval <= HEARTBEAT_RANGE[1]
+    assert 0 <= manager.copies <= MAX_COPIES
+    assert manager.spacing >= MIN_SPACING
+
+
+def test_more_loss_never_means_fewer_heartbeats_or_copies():
+    plans = [planned(link_with(1000 - lost, lost)) for lost in (0, 20, 100, 300)]
+    intervals = [plan.heartbeat_interval for plan in plans]
+    copies = [plan.copies for plan in plans]
+    assert intervals == sorted(intervals, reverse=True)
+    assert copies == sorted(copies)
+
+
+def test_silence_counts_as_an_outage():
+    link = link_with(100, 0)
+    manager = planned(link, now_ns=link.last_ack_ns + 2000 * MS)
+    assert manager.loss == OUTAGE_LOSS
+
+
+def test_without_acks_loss_is_assumed():
+    manager = planned(None)
+    assert manager.loss == UNKNOWN_LOSS
+    assert HEARTBEAT_RANGE[0] <= manager.heartbeat_interval <= HEARTBEAT_RANGE[1]
+
+
+def test_no_copies_without_redundancy():
+    manager = planned(link_with(500, 500), redundancy=False)
+    assert manager.copies == 0
+
+
+def test_critical_transitions():
+    forward = (CMD_FORWARD, 512, 512, 512)
+    assert critical_reason(None, forward) is None
+    assert critical_reason(forward, (CMD_STOP, 512, 0, 0)) == "stop"
+    assert critical_reason((CMD_STOP, 512, 0, 0), (CMD_STOP, 512, 0, 0)) is None
+    assert critical_reason(forward, (CMD_FORWARD, 612, 612, 612)) == "speed"
+    assert critical_reason(forward, (CMD_BACKWARD, 512, -512, -512)) == "reverse"
+
+
+def test_copies_are_spaced_and_followed_to_their_ack():
+    manager = planned(link_with(500, 500))
+    offsets = manager.on_change((CMD_FORWARD, 512, 512, 512), (CMD_STOP, 512, 0, 0), 7, MS)
+    assert len(offsets) == manager.copies
+    assert offsets == tuple(manager.spacing * (i + 1) for i in range(manager.copies))
+    manager.on_ack(7)
+    assert manager.stats()["critical_delivery"] == 1.0
@@ -0,0 +1,84 @@
+import pytest
+
+from link_stats import LatencyHistogram, LinkStats
+
+MS = 1_000_000
+
+
+def test_rtt_percentiles_and_loss():
+    link = LinkStats(window=100, ack_timeout=1.0)
+    for seq in range(1, 11):
+        link.record_send(seq, seq * MS)
+    for seq in range(1, 9):
+        assert link.record_ack(seq, seq * MS + seq * MS) == pytest.approx(seq)
+    assert link.record_ack(3, 20 * MS) is None  # duplicate
+    assert link.acks == 8
+
+    link.expire(5000 * MS)
+    assert link.lost == 2
+    assert link.loss_rate() == pytest.approx(0.2)
+    p50, p95, p99 = link.percentiles()
+    assert (p50, p95, p99) == (5.0, 8.0, 8.0)
+
+
+def test_unresolved_packets_are_not_counted_yet():
+    link = LinkStats(ack_timeout=1.0)
+    link.record_send(1, MS)
+    link.record_send(2, MS)
+    link.expire(500 * MS)
+    assert link.loss_rate() is None
+    assert link.percentiles() == (None, None, None)
+
+
+def test_late_ack_for_a_lost_packet_is_ignored():
+    link = LinkStats(ack_timeout=0.1)
+    link.record_send(1, MS)
+    link.expire(500 * MS)
+    assert link.lost == 1
+    assert link.record_ack(1, 501 * MS) is None
+    assert link.acks == 0
+
+
+def test_window_keeps_recent_outcomes():
+    link = LinkStats(window=4, ack_timeout=0.1)
+    for seq in range(1, 9):
+        link.record_send(seq, MS)
+    for seq in range(5, 9):
+        link.record_ack(seq, 2 * MS)
+    link.expire(1000 * MS)
+    assert link.lost == 4
+    assert link.loss_rate() == 0.0  # only the last 4, all acked
+
+
+def test_sequence_wrap():
+    link = LinkStats(ack_timeout=1.0)
+    for i, seq in enumerate((0xFFFE, 0xFFFF, 0, 1)):
+        link.record_send(seq, (i + 1) * MS)
+    for seq in (0xFFFE, 0xFFFF, 0, 1):
+        link.record_ack(seq, 10 * MS)
+    link.expire(11 * MS)
+    assert link.loss_rate() == 0.0
+    assert link.acks == 4
+
+
+def test_snapshot_is_published_by_refresh():
+    link = LinkStats(refresh_interval=0.25)
+    link.record_send(1, MS)
+    link.record_ack(1, 3 * MS)
+    link.expire(3 * MS)
+    assert link.snapshot() == (None, None, None, None)
+    link.refresh(1.0)
+    assert link.snapshot() == (2.0, 2.0, 2.0, 0.0)
+    published = link.snapshot()
+    link.refresh(1.1)  # too soon: the same tuple stays published
+    assert link.snapshot() is published
+
+
+def test_latency_histogram():
+    histogram = LatencyHistogram(bounds_ms=(1, 10))
+    for ms in (0.5, 0.5, 5, 50):
+        histogram.record(int(ms * MS))
+    assert histogram.count == 4
+    assert histogram.mean_ms() == pytest.approx(14.0)
+    assert histogram.max_ns == 50 * MS
+    assert histogram.percentile_ms(0.5) == 1
@@ -0,0 +1,99 @@
+import time
+
+import pytest
+
+from maneuvers import ManeuverRunner, compile_maneuver
+from protocol import (
+    CMD_BACKWARD, CMD_DRIVE, CMD_FORWARD, CMD_RIGHT, CMD_STOP, DEFAULT_SPEED, MAX_SPEED,
+)
+
+MS = 1_000_000
+
+
+class FakeSender:
+    def __init__(self):
+        self.commands = []
+
+    def set_command(self, cmd, speed):
+        self.commands.append((cmd, speed))
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.perf_counter() + timeout
+    while not condition():
+        if time.perf_counter() > deadline:
+            return False
+        time.sleep(0.002)
+    return True
+
+
+@pytest.fixture
+def runner():
+    runner = ManeuverRunner(FakeSender(), {
+        "short": [(CMD_FORWARD, MAX_SPEED, 20), (CMD_RIGHT, 800, 10)],
+        "long": [(CMD_BACKWARD, MAX_SPEED, 5000)],
+    }, wake=lambda: None)
+    runner.start()
+    yield runner
+    runner.stop()
+
+
+def test_compile_offsets_and_final_stop():
+    schedule = compile_maneuver([(CMD_FORWARD, MAX_SPEED, 400), (CMD_RIGHT, 800, 150)])
+    assert schedule == ((0, CMD_FORWARD, MAX_SPEED), (400 * MS, CMD_RIGHT, 800),
+                        (550 * MS, CMD_STOP, DEFAULT_SPEED))
+
+
+def test_compile_merges_steps_with_the_same_motor_output():
+    schedule = compile_maneuver([(CMD_FORWARD, MAX_SPEED, 100), (CMD_FORWARD, 5000, 100),
+                                 (CMD_STOP, DEFAULT_SPEED, 50), (CMD_STOP, MAX_SPEED, 50)])
+    # 5000 clamps to MAX_SPEED; a trailing STOP needs no extra one
+    assert schedule == ((0, CMD_FORWARD, MAX_SPEED), (200 * MS, CMD_STOP, DEFAULT_SPEED))
+
+
+@pytest.mark.parametrize("step", [(CMD_DRIVE, MAX_SPEED, 100), (CMD_FORWARD, MAX_SPEED, 0),
+                                  (99, MAX_SPEED, 100)])
+def test_compile_refuses_bad_steps(step):
+    with pytest.raises(ValueError):
+        compile_maneuver([step])
+
+
+def test_run_plays_every_step_then_goes_idle(runner):
+    runner.run("short")
+    assert runner.active == "short"  # before the runner thread picks it up
+    assert wait_for(lambda: runner.active is None)
+    assert runner.sender.commands == [(CMD_FORWARD, MAX_SPEED), (CMD_RIGHT, 800),
+                                      (CMD_STOP, DEFAULT_SPEED)]
+    assert runner.runs == 1
+    assert runner.step is None
+    due = runner.last_due_ns
+    assert [(t - due[0]) // MS for t in due] == [0, 20, 30]
+    assert runner.lateness.count == 3
+
+
+def test_cancel_aborts_and_nothing_follows(runner):
+    runner.run("long")
+    assert wait_for(lambda: runner.step is not None)
+    runner.cancel()
+    assert runner.active is None and runner.step is None
+    assert runner.cancelled == 1
+    commands = list(runner.sender.commands)
+    time.sleep(0.05)
+    assert runner.sender.commands == commands == [(CMD_BACKWARD, MAX_SPEED)]
+
+
+def test_run_replaces_the_running_maneuver(runner):
+    runner.run("long")
+    assert wait_for(lambda: runner.step is not None)
+    runner.run("short")
+    assert runner.active == "short"
+    assert wait_for(lambda: runner.runs == 2 and runner.active is None)
+    assert runner.sender.commands[0] == (CMD_BACKWARD, MAX_SPEED)
+    assert runner.sender.commands[1:] == [(CMD_FORWARD, MAX_SPEED), (CMD_RIGHT, 800),
+                                          (CMD_STOP, DEFAULT_SPEED)]
+
+
+def test_unknown_maneuver(runner):
+    with pytest.raises(KeyError):
+        runner.run("nope")
+    assert runner.active is None
@@ -0,0 +1,47 @@
+from types import SimpleNamespace
+
+from link_stats import LatencyHistogram, LinkStats
+from metrics_server import ControllerMetrics, render_metrics
+from protocol import CMD_FORWARD
+
+MS = 1_000_000
+
+
+def fake_sender(link=None):
+    return SimpleNamespace(packets_sent=10, bytes_sent=420, changes=2, heartbeats=8,
+                           status="CONNECTED", link=link, manager=None, telemetry=None,
+                           input_latency=LatencyHistogram())
+
+
+def samples(text):
+    return dict(line.rsplit(" ", 1) for line in text.splitlines() if not line.startswith("#"))
+
+
+def test_counters_and_command():
+    metrics = ControllerMetrics()
+    metrics.set_command(CMD_FORWARD, 700)
+    metrics.frame(0)
+    metrics.frame(30 * MS)
+    values = samples(render_metrics(fake_sender(), metrics, 12.5))
+    assert values["rc_packets_sent_total"] == "10"
+    assert values['rc_sends_total{reason="heartbeat"}'] == "8"
+    assert values["rc_send_rate_hz"] == "12.5"
+    assert values["rc_link_up"] == "1"
+    assert values['rc_command{command="FORWARD"}'] == "1"
+    assert values["rc_speed"] == "700"
+    assert values['rc_frame_time_seconds_bucket{le="0.035"}'] == "1"
+    assert values["rc_frame_time_seconds_count"] == "1"
+
+
+def test_rtt_gauge_uses_a_percentile_label():
+    link = LinkStats()
+    link.record_send(1, MS)
+    link.record_ack(1, 5 * MS)
+    link.refresh(1.0)
+    text = render_metrics(fake_sender(link), ControllerMetrics(), 0.0)
+    assert "# TYPE rc_rtt_seconds gauge" in text
+    assert "quantile" not in text  # reserved for summaries
+    values = samples(text)
+    assert values['rc_rtt_seconds{percentile="50"}'] == "0.004"
+    assert values['rc_rtt_seconds{percentile="99"}'] == "0.004"
+    assert values["rc_acks_total"] == "1"
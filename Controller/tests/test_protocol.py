@@ -0,0 +1,92 @@
+from protocol import (
+    PROTOCOL_VERSION, PKT_COMMAND, COMMAND_PACKET, CMD_FORWARD, CMD_LEFT, CMD_STOP,
+    CMD_UP_RIGHT, FLAG_ACK_REQUEST, MAX_SPEED, PacketEncoder, PacketDecoder, motor_pwm, seq_newer,
+    CAP_ACK, CAP_BINARY, encode_ack, decode_ack, encode_probe, decode_probe, encode_hello,
+    decode_hello, encode_telemetry, decode_telemetry,
+)
+
+
+def command_packet(seq, time_ms, version=PROTOCOL_VERSION, cmd=CMD_FORWARD, left=512, right=512):
+    return COMMAND_PACKET.pack(version, PKT_COMMAND, 0, cmd, seq, left, right, time_ms)
+
+
+def test_command_round_trip():
+    encoder = PacketEncoder()
+    left, right = motor_pwm(CMD_FORWARD, 700)
+    data = bytes(encoder.encode(CMD_FORWARD, left, right, FLAG_ACK_REQUEST))
+    assert len(data) == 14
+    packet = PacketDecoder().decode(data)
+    assert packet is not None
+    assert (packet.cmd, packet.seq, packet.left, packet.right) == (CMD_FORWARD, 1, left, right)
+    assert packet.flags == FLAG_ACK_REQUEST
+
+
+def test_motor_pwm_matches_the_firmware_mix():
+    assert motor_pwm(CMD_STOP, 700) == (0, 0)
+    assert motor_pwm(CMD_LEFT, 600) == (-600, 600)
+    assert motor_pwm(CMD_UP_RIGHT, 900) == (MAX_SPEED, 500)  # speed + sm clamps
+
+
+def test_encoder_sequence_wraps():
+    encoder = PacketEncoder()
+    encoder.seq = 0xFFFF
+    encoder.encode(CMD_STOP, 0, 0)
+    assert encoder.seq == 0
+    assert seq_newer(0, 0xFFFF)
+    assert not seq_newer(0xFFFF, 0)
+
+
+def test_ack_round_trip():
+    assert decode_ack(encode_ack(0xBEEF)) == 0xBEEF
+    assert decode_ack(encode_ack(1)[:-1]) is None
+    assert decode_ack(command_packet(1, 0)) is None
+
+
+def test_probe_and_hello_round_trips():
+    assert decode_probe(encode_probe(12345)) == 12345
+    hello = decode_hello(encode_hello(7, 0xE0001234, CAP_BINARY | CAP_ACK, "bot"))
+    assert hello == (7, 0xE0001234, CAP_BINARY | CAP_ACK, "bot")
+    # Each decoder refuses the others' packets
+    assert decode_ack(encode_probe(1)) is None
+    assert decode_probe(encode_ack(1)) is None
+    assert decode_hello(encode_probe(1)) is None
+
+
+def test_telemetry_round_trip():
+    samples = ((512, 512), (-1023, 400))
+    telemetry = decode_telemetry(encode_telemetry(1, 5000, 42, 3, 4000, samples))
+    assert telemetry == (1, 5000, 42, 3, 4000, samples)
+    assert decode_telemetry(encode_telemetry(0, 0, 0, 0, 0, samples)[:-1]) is None
+
+
+def test_decoder_rejects_old_version():
+    decoder = PacketDecoder()
+    assert decoder.decode(command_packet(1, 1000, version=PROTOCOL_VERSION - 1), 1000) is None
+    assert decoder.decode(b"F", 1000) is None
+    assert decoder.malformed == 2
+    assert decoder.accepted == 0
+
+
+def test_decoder_rejects_duplicate_and_out_of_order():
+    decoder = PacketDecoder()
+    assert decoder.decode(command_packet(5, 1000), 1000) is not None
+    assert decoder.decode(command_packet(5, 1000), 1001) is None
+    assert decoder.decode(command_packet(4, 1000), 1002) is None
+    assert (decoder.duplicates, decoder.out_of_order, decoder.accepted) == (1, 1, 1)
+    assert decoder.decode(command_packet(6, 1010), 1010) is not None
+
+
+def test_decoder_rejects_stale_packet():
+    decoder = PacketDecoder(max_delay_ms=300)
+    assert decoder.decode(command_packet(1, 1000), 1000) is not None
+    # Sent 10 ms after the first but arriving 400 ms later: sat in a queue
+    assert decoder.decode(command_packet(2, 1010), 1410) is None
+    assert decoder.stale == 1
+    assert decoder.decode(command_packet(3, 1400), 1420) is not None
+
+
+def test_decoder_resyncs_after_silence():
+    decoder = PacketDecoder(resync_after_ms=1000)
+    assert decoder.decode(command_packet(500, 1000), 1000) is not None
+    # A restarted controller starts its sequence over
+    assert decoder.decode(command_packet(1, 90000), 5000) is not None
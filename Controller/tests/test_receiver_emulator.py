@@ -0,0 +1,81 @@
+import socket
+import time
+
+import pytest
+
+from protocol import (
+    PROTOCOL_VERSION, PKT_COMMAND, COMMAND_PACKET, CMD_FORWARD, FLAG_ACK_REQUEST, DEFAULT_SPEED,
+    SPEED_STEP, decode_ack, decode_hello, encode_probe, motor_pwm, now_ms,
+)
+from receiver_emulator import ReceiverEmulator, COMMAND_TIMEOUT_MS, EMULATOR_ID_BASE
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.perf_counter() + timeout
+    while not condition():
+        if time.perf_counter() > deadline:
+            return False
+        time.sleep(0.002)
+    return True
+
+
+@pytest.fixture
+def emulator():
+    with ReceiverEmulator(port=0) as emulator:
+        yield emulator
+
+
+@pytest.fixture
+def sock():
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.settimeout(1.0)
+    yield sock
+    sock.close()
+
+
+def command(seq, left, right, flags=0):
+    return COMMAND_PACKET.pack(PROTOCOL_VERSION, PKT_COMMAND, flags, CMD_FORWARD, seq,
+                               left, right, now_ms())
+
+
+def test_binary_command_drives_and_is_acked(emulator, sock):
+    left, right = motor_pwm(CMD_FORWARD, DEFAULT_SPEED)
+    sock.sendto(command(1, left, right, FLAG_ACK_REQUEST), ("127.0.0.1", emulator.port))
+    assert decode_ack(sock.recv(64)) == 1
+    assert emulator.motor_state() == (1, left, 1, right)
+
+
+def test_duplicate_is_acked_but_not_applied_twice(emulator, sock):
+    address = ("127.0.0.1", emulator.port)
+    sock.sendto(command(7, 600, 600, FLAG_ACK_REQUEST), address)
+    sock.recv(64)
+    sock.sendto(command(7, -600, -600, FLAG_ACK_REQUEST), address)
+    assert decode_ack(sock.recv(64)) == 7
+    assert emulator.motor_state() == (1, 600, 1, 600)
+    assert emulator.decoder.duplicates == 1
+
+
+def test_probe_gets_a_hello(emulator, sock):
+    sock.sendto(encode_probe(99), ("127.0.0.1", emulator.port))
+    hello = decode_hello(sock.recv(64))
+    assert hello.nonce == 99
+    assert hello.bot_id == EMULATOR_ID_BASE | emulator.port
+    assert emulator.motor_state() == (0, 0, 0, 0)  # motors untouched
+
+
+def test_ascii_commands_and_speed_steps(emulator, sock):
+    address = ("127.0.0.1", emulator.port)
+    sock.sendto(b"+", address)
+    sock.sendto(b"F", address)
+    speed = DEFAULT_SPEED + SPEED_STEP
+    assert wait_for(lambda: emulator.motor_state() == (1, speed, 1, speed))
+
+
+def test_silence_stops_the_motors(emulator, sock):
+    sock.sendto(command(1, 512, 512), ("127.0.0.1", emulator.port))
+    assert wait_for(lambda: emulator.left_pwm == 512)
+    started = time.perf_counter()
+    assert wait_for(lambda: emulator.left_pwm == 0)
+    assert time.perf_counter() - started >= COMMAND_TIMEOUT_MS / 1000 * 0.9
+    assert emulator.timeouts == 1
+    assert emulator.trace[-1].cause == "timeout"
@@ -0,0 +1,97 @@
+import socket
+import time
+
+import pytest
+
+from protocol import CMD_FORWARD, CMD_STOP, DEFAULT_SPEED, PROTOCOL_VERSION, motor_pwm
+from receiver_emulator import ReceiverEmulator
+from recorder import HEADER, RECORD, NO_COMMAND, SessionLog, SessionRecorder
+from replay import replay
+
+MS = 1_000_000
+
+
+def record_drive(path, count, **kwargs):
+    # count forward packets 5 ms apart, then a STOP
+    recorder = SessionRecorder(str(path), **kwargs)
+    t0 = time.perf_counter_ns()
+    left, right = motor_pwm(CMD_FORWARD, DEFAULT_SPEED)
+    for seq in range(1, count + 1):
+        recorder.record(t0 + seq * 5 * MS, seq, CMD_FORWARD, DEFAULT_SPEED, left, right, 0,
+                        PROTOCOL_VERSION)
+    recorder.record(t0 + (count + 1) * 5 * MS, count + 1, CMD_STOP, DEFAULT_SPEED, 0, 0, 0,
+                    PROTOCOL_VERSION)
+    recorder.close()
+    return recorder
+
+
+def test_recorded_packets_read_back(tmp_path):
+    path = tmp_path / "session.tkr"
+    recorder = record_drive(path, 9, buffer_records=4)
+    assert recorder.records == 10
+    assert recorder.flushes == 3  # two full buffers and the rest on close
+
+    with SessionLog(str(path)) as log:
+        assert len(log) == 10
+        first, last = log[0], log[-1]
+        assert (first.seq, first.cmd, first.speed) == (1, CMD_FORWARD, DEFAULT_SPEED)
+        assert (first.left, first.right) == motor_pwm(CMD_FORWARD, DEFAULT_SPEED)
+        assert (last.seq, last.cmd, last.left, last.right) == (10, CMD_STOP, 0, 0)
+        assert log.duration_s() == pytest.approx(0.045)
+        assert [record[1] for record in log] == list(range(1, 11))
+
+
+def test_partial_record_is_ignored(tmp_path):
+    path = tmp_path / "session.tkr"
+    record_drive(path, 3)
+    with open(path, "ab") as f:
+        f.write(b"\0" * (RECORD.size - 1))  # as if the process died mid-write
+    with SessionLog(str(path)) as log:
+        assert len(log) == 4
+
+
+def test_other_files_are_refused(tmp_path):
+    path = tmp_path / "notes.txt"
+    path.write_bytes(b"x" * (HEADER.size + RECORD.size))
+    with pytest.raises(ValueError):
+        SessionLog(str(path))
+
+
+def test_replay_drives_the_receiver(tmp_path):
+    path = tmp_path / "session.tkr"
+    record_drive(path, 9)
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        with ReceiverEmulator(port=0) as emulator, SessionLog(str(path)) as log:
+            stats = replay(log, sock, ("127.0.0.1", emulator.port))
+            deadline = time.perf_counter() + 2.0
+            while emulator.decoder.accepted < 10 and time.perf_counter() < deadline:
+                time.sleep(0.005)
+            assert emulator.decoder.accepted == 10
+            assert emulator.left_pwm == emulator.right_pwm == 0  # the recorded STOP
+    finally:
+        sock.close()
+    assert stats["sent"] == 10
+    assert stats["elapsed_s"] == pytest.approx(0.045, abs=0.02)
+    assert stats["late_max_ms"] < 20
+
+
+def test_ascii_records_replay_as_letters(tmp_path):
+    path = tmp_path / "session.tkr"
+    recorder = SessionRecorder(str(path))
+    t0 = time.perf_counter_ns()
+    recorder.record(t0, 0, NO_COMMAND, DEFAULT_SPEED, 0, 0, 0, ord("F"))
+    recorder.record(t0 + MS, 0, NO_COMMAND, DEFAULT_SPEED, 0, 0, 0, ord("S"))
+    recorder.close()
+
+    receiver = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    receiver.bind(("127.0.0.1", 0))
+    receiver.settimeout(1.0)
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        with SessionLog(str(path)) as log:
+            replay(log, sock, receiver.getsockname())
+        assert [receiver.recv(16), receiver.recv(16)] == [b"F", b"S"]
+    finally:
+        sock.close()
+        receiver.close()
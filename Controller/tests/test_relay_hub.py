@@ -0,0 +1,174 @@
+import asyncio
+import socket
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from protocol import (
+    ASCII_PAYLOADS, CMD_FORWARD, CMD_STOP, COMMAND_PACKET, DEFAULT_SPEED, PacketEncoder,
+    decode_hello, encode_probe,
+)
+from receiver_emulator import ReceiverEmulator
+from relay_hub import HUB_CAPS, HUB_ID, STOP_COPIES, BotLink, ControlPort, RelayHub, parse_bot
+
+OPERATOR = ("10.0.0.5", 50000)
+
+
+class FakeTransport:
+    def __init__(self):
+        self.sent = []
+
+    def sendto(self, data, address=None):
+        self.sent.append((bytes(data), address))
+
+
+def bot_link():
+    hub = SimpleNamespace(stopped=False)
+    bot = BotLink(hub, "alice", ("10.0.0.10", 4210), 4300)
+    bot.transport = FakeTransport()
+    bot.operator_port = SimpleNamespace(transport=FakeTransport())
+    return bot
+
+
+def command(encoder, cmd=CMD_FORWARD):
+    return encoder.encode(cmd, DEFAULT_SPEED, DEFAULT_SPEED)
+
+
+def test_forwards_and_relays_acks():
+    bot = bot_link()
+    packet = bytes(command(PacketEncoder()))
+    bot.from_operator(packet, OPERATOR, time.perf_counter_ns())
+    assert bot.transport.sent == [(packet, None)]
+    assert bot.operator == OPERATOR
+    bot.datagram_received(b"ack", bot.address)
+    assert bot.operator_port.transport.sent == [(b"ack", OPERATOR)]
+    assert (bot.forwarded, bot.acks) == (1, 1)
+
+
+@pytest.mark.parametrize("last_seq, stop_seq", [(41, 42), (0xFFFF, 0)])
+def test_stop_follows_the_operators_sequence(last_seq, stop_seq):
+    bot = bot_link()
+    encoder = PacketEncoder()
+    encoder.seq = last_seq - 1
+    bot.from_operator(bytes(command(encoder)), OPERATOR, time.perf_counter_ns())
+    sent_time_ms = COMMAND_PACKET.unpack(bot.transport.sent[0][0])[7]
+    bot.transport.sent.clear()
+
+    bot.send_stop()
+    assert len(bot.transport.sent) == STOP_COPIES
+    assert len({data for data, _ in bot.transport.sent}) == 1  # identical copies
+    fields = COMMAND_PACKET.unpack(bot.transport.sent[0][0])
+    assert fields[3] == CMD_STOP
+    assert fields[4] == stop_seq
+    assert fields[5:7] == (0, 0)
+    assert 0 <= fields[7] - sent_time_ms < 100
+    assert bot.stops_sent == 1
+
+
+def test_held_packets_still_advance_the_stop_sequence():
+    bot = bot_link()
+    bot.hub.stopped = True
+    encoder = PacketEncoder()
+    for _ in range(5):
+        bot.from_operator(bytes(command(encoder)), OPERATOR, time.perf_counter_ns())
+    assert bot.transport.sent == [] and bot.held == 5
+    bot.send_stop()
+    assert COMMAND_PACKET.unpack(bot.transport.sent[0][0])[4] == encoder.seq + 1
+
+
+def test_ascii_operator_gets_an_ascii_stop():
+    bot = bot_link()
+    bot.from_operator(b"F", OPERATOR, time.perf_counter_ns())
+    bot.send_stop()
+    assert [data for data, _ in bot.transport.sent[1:]] == [ASCII_PAYLOADS[CMD_STOP]] * STOP_COPIES
+
+
+def test_stray_datagrams_dont_pick_the_stop_protocol():
+    bot = bot_link()
+    bot.from_operator(bytes(command(PacketEncoder())), OPERATOR, time.perf_counter_ns())
+    bot.from_operator(b"hello?", OPERATOR, time.perf_counter_ns())
+    bot.send_stop()
+    assert len(bot.transport.sent[-1][0]) == COMMAND_PACKET.size
+
+
+def test_never_driven_bot_gets_no_stop():
+    bot = bot_link()
+    bot.send_stop()
+    assert bot.transport.sent == [] and bot.stops_sent == 0
+
+
+def test_hub_answers_probes_itself():
+    bot = bot_link()
+    bot.from_operator(encode_probe(99), OPERATOR, time.perf_counter_ns())
+    (data, address), = bot.operator_port.transport.sent
+    assert address == OPERATOR
+    assert decode_hello(data) == (99, HUB_ID | 4300, HUB_CAPS, "hub/alice")
+    # Never forwarded, and it doesn't claim the port
+    assert bot.transport.sent == []
+    assert bot.operator is None
+    encoder = PacketEncoder()
+    bot.from_operator(bytes(command(encoder)), ("10.0.0.6", 50000), time.perf_counter_ns())
+    assert bot.forwarded == 1 and bot.foreign == 0
+
+
+def test_second_operator_waits_for_the_first_to_go_idle():
+    bot = bot_link()
+    encoder = PacketEncoder()
+    bot.from_operator(bytes(command(encoder)), OPERATOR, time.perf_counter_ns())
+    bot.from_operator(bytes(command(encoder)), ("10.0.0.6", 50000), time.perf_counter_ns())
+    assert bot.operator == OPERATOR
+    assert (bot.forwarded, bot.foreign) == (1, 1)
+
+
+@pytest.mark.parametrize("token, datagram, reply, stopped", [
+    (None, b"stop", b"STOPPED", True),
+    (None, b"status", b"RUNNING", False),
+    (None, b"jump", b"error: unknown command 'jump'", False),
+    ("s3cret", b"stop", b"error: bad token", False),
+    ("s3cret", b"stop wrong", b"error: bad token", False),
+    ("s3cret", b"stop s3cret", b"STOPPED", True),
+])
+def test_control_port(token, datagram, reply, stopped):
+    hub = RelayHub([], token=token)
+    control = ControlPort(hub)
+    control.transport = FakeTransport()
+    control.datagram_received(datagram, ("127.0.0.1", 40000))
+    assert control.transport.sent == [(reply, ("127.0.0.1", 40000))]
+    assert hub.stopped == stopped
+
+
+def test_parse_bot():
+    assert parse_bot("alice=192.168.4.10") == ("alice", ("192.168.4.10", 4210))
+    assert parse_bot("bob=10.0.0.2:4300") == ("bob", ("10.0.0.2", 4300))
+
+
+def test_arbitration_stop_through_the_hub():
+    async def drive():
+        with ReceiverEmulator(port=0) as emulator:
+            hub = RelayHub([("bot1", ("127.0.0.1", emulator.port))], host="127.0.0.1",
+                           base_port=0, control_port=None)
+            await hub.start()
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            try:
+                encoder = PacketEncoder()
+                for _ in range(3):
+                    sock.sendto(command(encoder), ("127.0.0.1", hub.bots[0].listen_port))
+                    await asyncio.sleep(0.01)
+                assert emulator.left_pwm == DEFAULT_SPEED
+                hub.stop_all("test")
+                await asyncio.sleep(0.02)
+                assert emulator.left_pwm == emulator.right_pwm == 0
+                assert emulator.decoder.duplicates == STOP_COPIES - 1
+                sock.sendto(command(encoder), ("127.0.0.1", hub.bots[0].listen_port))
+                await asyncio.sleep(0.02)
+                assert emulator.left_pwm == 0 and hub.bots[0].held == 1
+                hub.go("test")
+                sock.sendto(command(encoder), ("127.0.0.1", hub.bots[0].listen_port))
+                await asyncio.sleep(0.02)
+                assert emulator.left_pwm == DEFAULT_SPEED  # newer than the hub's STOP
+            finally:
+                sock.close()
+                hub.close()
+
+    asyncio.run(drive())
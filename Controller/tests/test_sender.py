@@ -0,0 +1,156 @@
+import socket
+import time
+
+import pytest
+
+from protocol import CMD_FORWARD, CMD_STOP, DEFAULT_SPEED, motor_pwm
+from receiver_emulator import ReceiverEmulator
+from sender import CommandSender, MODE_CHANGE, MODE_STREAM
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.perf_counter() + timeout
+    while not condition():
+        if time.perf_counter() > deadline:
+            return False
+        time.sleep(0.005)
+    return True
+
+
+def pwm(emulator):
+    return emulator.left_dir * emulator.left_pwm, emulator.right_dir * emulator.right_pwm
+
+
+@pytest.fixture
+def emulator():
+    with ReceiverEmulator(port=0) as emulator:
+        yield emulator
+
+
+@pytest.fixture
+def sock():
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setblocking(False)
+    yield sock
+    sock.close()
+
+
+def test_stream_mode_sends_every_tick_and_stops_on_exit(emulator, sock):
+    sender = CommandSender(sock, ("127.0.0.1", emulator.port), rate_hz=100, mode=MODE_STREAM)
+    sender.set_command(CMD_FORWARD, DEFAULT_SPEED)
+    sender.start()
+    try:
+        assert wait_for(lambda: pwm(emulator) == motor_pwm(CMD_FORWARD, DEFAULT_SPEED))
+        time.sleep(0.2)
+    finally:
+        sender.stop(final=CMD_STOP)
+    # ~20 ticks in 0.2 s; the thread, not the caller, sets the pace
+    assert 10 <= sender.packets_sent <= 40
+    assert wait_for(lambda: pwm(emulator) == (0, 0))
+    assert emulator.timeouts == 0
+
+
+def test_latest_published_command_wins(emulator, sock):
+    sender = CommandSender(sock, ("127.0.0.1", emulator.port), mode=MODE_STREAM)
+    sender.start()
+    try:
+        for speed in (400, 600, 800):
+            sender.set_command(CMD_FORWARD, speed)
+        assert wait_for(lambda: pwm(emulator) == motor_pwm(CMD_FORWARD, 800))
+    finally:
+        sender.stop(final=CMD_STOP)
+
+
+def test_change_mode_sends_changes_and_heartbeats_only(emulator, sock):
+    sender = CommandSender(sock, ("127.0.0.1", emulator.port), rate_hz=100, mode=MODE_CHANGE,
+                           heartbeat_interval=0.1)
+    sender.set_command(CMD_FORWARD, DEFAULT_SPEED)
+    sender.start()
+    try:
+        time.sleep(0.5)
+        # Held for longer than the receiver's timeout: heartbeats keep it driving
+        assert pwm(emulator) == motor_pwm(CMD_FORWARD, DEFAULT_SPEED)
+        assert emulator.timeouts == 0
+        sent = sender.packets_sent
+        sender.set_command(CMD_STOP, DEFAULT_SPEED)
+        assert wait_for(lambda: pwm(emulator) == (0, 0), timeout=0.05)
+    finally:
+        sender.stop(final=CMD_STOP)
+    assert sender.changes == 2
+    assert 4 <= sender.heartbeats <= 7
+    assert sent < 10  # streaming would have sent ~50
+    assert sender.session_stats()["saved_vs_stream"] > 30
+
+
+@pytest.mark.parametrize("mode", [MODE_STREAM, MODE_CHANGE])
+def test_acks_measure_the_link(emulator, sock, mode):
+    sender = CommandSender(sock, ("127.0.0.1", emulator.port), mode=mode, ack=True)
+    sender.set_command(CMD_FORWARD, DEFAULT_SPEED)
+    sender.start()
+    try:
+        assert wait_for(lambda: sender.link.acks >= 3)
+        assert sender.status == "CONNECTED"
+    finally:
+        sender.stop(final=CMD_STOP)
+    assert emulator.acks_sent >= sender.link.acks
+    assert sender.link.acks <= sender.packets_sent
+    assert sender.link.percentiles()[0] < 50  # ms, localhost
+
+
+def test_no_acks_reports_no_reply(sock):
+    quiet = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    quiet.bind(("127.0.0.1", 0))  # a port that reads nothing and answers nothing
+    sender = CommandSender(sock, quiet.getsockname(), mode=MODE_STREAM, ack=True)
+    sender.start()
+    try:
+        assert wait_for(lambda: sender.status == "NO REPLY", timeout=3.0)
+    finally:
+        sender.stop(final=None)
+        quiet.close()
+
+
+def test_input_edge_goes_out_at_once(emulator, sock):
+    sender = CommandSender(sock, ("127.0.0.1", emulator.port), rate_hz=10, mode=MODE_CHANGE, ack=True)
+    sender.start()
+    try:
+        time.sleep(0.05)
+        sender.set_command(CMD_FORWARD, DEFAULT_SPEED, time.perf_counter_ns())
+        sender.wake()
+        # Well before the next 100 ms tick
+        assert wait_for(lambda: emulator.left_pwm != 0, timeout=0.05)
+        assert wait_for(lambda: sender.input_latency.count == 1)
+    finally:
+        sender.stop(final=CMD_STOP)
+
+
+def test_bad_configuration_is_refused(sock):
+    with pytest.raises(ValueError):
+        CommandSender(sock, ("127.0.0.1", 9), mode="sometimes")
+    with pytest.raises(ValueError):
+        CommandSender(sock, ("127.0.0.1", 9), heartbeat_interval=0.5)
+    with pytest.raises(ValueError):
+        CommandSender(sock, ("127.0.0.1", 9), protocol="ascii", ack=True)
+
+
+def test_nothing_is_sent_without_an_address(sock):
+    sender = CommandSender(sock, None, ack=True)
+    sender.set_command(CMD_FORWARD, DEFAULT_SPEED)
+    sender.start()
+    try:
+        time.sleep(0.05)
+        assert sender.packets_sent == 0
+        assert sender.status == "SEARCHING..."
+    finally:
+        sender.stop(final=None)
+
+
+def test_sending_starts_once_an_address_is_found(emulator, sock):
+    sender = CommandSender(sock, None, mode=MODE_STREAM)
+    sender.set_command(CMD_FORWARD, DEFAULT_SPEED)
+    sender.start()
+    try:
+        time.sleep(0.02)
+        sender.address = ("127.0.0.1", emulator.port)  # as BotFinder does
+        assert wait_for(lambda: pwm(emulator) == motor_pwm(CMD_FORWARD, DEFAULT_SPEED))
+    finally:
+        sender.stop(final=CMD_STOP)
@@ -0,0 +1,88 @@
+import pytest
+
+from protocol import TELEM_SEQ_VALID, TELEM_TIMED_OUT, TELEMETRY_SAMPLE_MS, Telemetry
+from telemetry import BotTelemetry
+
+BATCH = 5  # samples per batch
+BATCH_MS = BATCH * TELEMETRY_SAMPLE_MS
+
+
+def batch(uptime_ms, pwm=(512, 512), timeouts=0, last_timeout_ms=0, last_seq=10,
+          flags=TELEM_SEQ_VALID):
+    return Telemetry(flags, uptime_ms, last_seq, timeouts, last_timeout_ms, (pwm,) * BATCH)
+
+
+def test_consecutive_batches():
+    telemetry = BotTelemetry()
+    telemetry.update(batch(1000), 40, now=1.0, sent_seq=12)
+    telemetry.update(batch(1000 + BATCH_MS, (600, -600), last_seq=15), 40, now=1.1, sent_seq=15)
+    state = telemetry.state
+    assert (state.left, state.right) == (600, -600)
+    assert (state.last_seq, state.lag) == (15, 0)
+    assert state.uptime_ms == 1000 + BATCH_MS
+    assert not state.timed_out
+    assert (telemetry.batches, telemetry.samples, telemetry.bytes) == (2, 2 * BATCH, 80)
+    assert (telemetry.gaps, telemetry.reboots) == (0, 0)
+    times = [t for t, _, _ in telemetry.recent()]
+    assert times == list(range(1000 - (BATCH - 1) * TELEMETRY_SAMPLE_MS, 1000 + BATCH_MS + 1,
+                               TELEMETRY_SAMPLE_MS))
+
+
+def test_lost_batch_is_counted_once():
+    telemetry = BotTelemetry()
+    telemetry.update(batch(1000), 40, now=1.0)
+    telemetry.update(batch(1000 + 2 * BATCH_MS), 40, now=1.2)  # one batch missing
+    assert telemetry.gaps == 1
+    telemetry.update(batch(1000 + 3 * BATCH_MS), 40, now=1.3)
+    assert telemetry.gaps == 1
+    assert telemetry.reboots == 0
+
+
+def test_reboot_starts_a_new_session():
+    telemetry = BotTelemetry()
+    telemetry.update(batch(50_000, timeouts=3, last_timeout_ms=40_000), 40, now=1.0)
+    assert telemetry.timeouts_seen == 0  # stops before we connected aren't ours
+    telemetry.update(batch(50_000 + BATCH_MS, timeouts=4, last_timeout_ms=50_050), 40, now=1.1)
+    assert telemetry.timeouts_seen == 1
+    # Brownout: uptime starts over, and so does the bot's timeout counter
+    telemetry.update(batch(300, timeouts=1, last_timeout_ms=200, flags=TELEM_TIMED_OUT), 40, now=1.2)
+    assert telemetry.reboots == 1
+    assert telemetry.gaps == 0  # not a lost batch
+    assert telemetry.timeouts_seen == 2
+    assert list(telemetry.timeout_events) == [50_050, 200]
+    state = telemetry.state
+    assert state.timed_out and state.uptime_ms == 300
+    assert state.last_seq is None and state.lag is None  # nothing applied since the reboot
+
+
+def test_timeout_counter_wraps():
+    telemetry = BotTelemetry()
+    telemetry.update(batch(1000, timeouts=0xFFFF), 40, now=1.0)
+    telemetry.update(batch(1000 + BATCH_MS, timeouts=1), 40, now=1.1)
+    assert telemetry.timeouts_seen == 2
+
+
+def test_empty_batch_keeps_the_last_pwm():
+    telemetry = BotTelemetry()
+    telemetry.update(batch(1000, (700, 700)), 40, now=1.0)
+    telemetry.update(Telemetry(TELEM_SEQ_VALID, 1000 + BATCH_MS, 10, 0, 0, ()), 12, now=1.1)
+    assert (telemetry.state.left, telemetry.state.right) == (700, 700)
+    assert telemetry.gaps == 0
+
+
+def test_ring_keeps_the_latest_samples():
+    telemetry = BotTelemetry(history=8)
+    for i in range(3):
+        telemetry.update(batch(1000 + i * BATCH_MS, (i, -i)), 40, now=1.0 + i)
+    recent = telemetry.recent()
+    assert len(recent) == 8
+    assert recent[-1] == (1000 + 2 * BATCH_MS, 2, -2)
+    assert [t for t, _, _ in recent] == sorted(t for t, _, _ in recent)
+
+
+def test_fresh():
+    telemetry = BotTelemetry()
+    assert telemetry.fresh(1.0) is None
+    telemetry.update(batch(1000), 40, now=1.0)
+    assert telemetry.fresh(1.5) is telemetry.state
+    assert telemetry.fresh(2.5) is None
@@ -1,12 +1,43 @@
-import socket
+import time
+STARTED_AT = time.perf_counter()  # startup is measured from here
+
 import pygame
 import sys
 
+from render_engine import Label, RenderEngine
+from protocol import PROTO_BINARY, MAX_SPEED
+from frame_clock import FrameClock
+from asset_cache import LazyFont, load_layer
+from controller_core import ControllerCore
+from keymap import BIT_UP, BIT_DOWN, BIT_LEFT, BIT_RIGHT
+from profiler import draw_overlay, overlay_size, P_DRAW, P_FLIP, P_IDLE
+from sender import MODE_CHANGE
+
 # ============================================
 # CONFIGURATION - CHANGE THIS!
 # ============================================
-ESP_IP = "10.67.214.228"  # ← PUT YOUR ESP8266 IP HERE
+ESP_IP = None  # ← the bot's address, pinned (None = discover it, reusing the last one from BOT_CACHE)
 ESP_PORT = 4210
+BOT_CACHE = ".bot_cache.json"
+SEND_RATE = 100  # Hz - command stream rate, independent of the frame rate
+SEND_MODE = MODE_CHANGE  # send on change + heartbeats ("stream" = every tick)
+HEARTBEAT_INTERVAL = 0.1  # s - must stay well below the receiver's 300 ms timeout
+PROTOCOL = PROTO_BINARY  # PROTO_ASCII for firmware without the binary protocol
+ACK_MODE = True  # bot echoes sequence numbers -> RTT/loss in the UI (binary only)
+ADAPTIVE_LINK = True  # heartbeats and critical-send copies follow the measured link
+TELEMETRY = True  # bot streams its PWM, applied seq, timeouts and uptime back (binary only)
+FPS = 30
+KEY_RESYNC_FRAMES = 15  # while no key is held, re-read the keyboard every N frames
+GAMEPAD_INDEX = 0  # analog stick drive (binary protocol only)
+RECORD_DIR = "recordings"  # every packet sent is logged here (None to disable)
+PROFILE = False  # time every loop phase from the start (F3 toggles it)
+PROFILE_CSV = "profile.csv"  # per-frame timings written on exit if profiled
+ANALYTICS = True  # keep every send/ack for the F4 and exit reports (needs numpy)
+METRICS_PORT = 9108  # Prometheus endpoint on localhost for the pit crew (None to disable)
+MANEUVER_KEYS = {  # timed maneuvers (maneuvers.py); a direction key cancels
+    pygame.K_1: "burst", pygame.K_2: "spin_left", pygame.K_3: "spin_right",
+    pygame.K_4: "pop", pygame.K_5: "tug",
+}
 
 # ============================================
 # Colors
@@ -22,69 +53,134 @@ YELLOW = (255, 255, 0)
 GOLD = (255, 215, 0)
 
 # ============================================
-# UDP Setup
+# Pygame Setup (deferred to init_gui)
 # ============================================
-sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-sock.settimeout(0.1)
+WIDTH, HEIGHT = 600, 550  # Increased height for team logo
+screen = None
+clock = None
+LOGO_PATH = "takeshi_castle.png"  # Save your image as takeshi_castle.png
+LOGO_ALPHA = 100  # 0-255, where 255 is opaque (lower = more transparent)
+OVERLAY_ALPHA = 150  # Adjust for darker/lighter overlay
+team_font = title_font = font = small_font = mono_font = None
+backdrop = None  # logo blended with the overlay, or None without a logo
+engine = None
+labels = None
+
+def blend_backdrop(logo):
+    """Dark fill, translucent logo and readability overlay as one opaque layer"""
+    layer = pygame.Surface((WIDTH, HEIGHT))
+    layer.fill(DARK_GRAY)
+    logo.set_alpha(LOGO_ALPHA)
+    layer.blit(logo, (0, 0))
+    
+    # Semi-transparent overlay for better text readability
+    overlay = pygame.Surface((WIDTH, HEIGHT))
+    overlay.set_alpha(OVERLAY_ALPHA)
+    overlay.fill(DARK_GRAY)
+    layer.blit(overlay, (0, 0))
+    return layer
+
+def init_gui():
+    """Open the window, set up fonts and the team logo backdrop"""
+    global screen, clock, team_font, title_font, font, small_font, mono_font, backdrop, engine, labels
+    pygame.init()
+    screen = pygame.display.set_mode((WIDTH, HEIGHT))
+    pygame.display.set_caption("ESP8266 RC Car Controller - TAKESHI'S TROOPS")
+    clock = FrameClock(FPS)
+    
+    # Fonts (created on first use)
+    team_font = LazyFont(None, 56)  # Large font for team name
+    title_font = LazyFont(None, 48)
+    font = LazyFont(None, 32)
+    small_font = LazyFont(None, 24)
+    mono_font = LazyFont("monospace", 14, sysfont=True)
+    
+    # Team logo as full background, scaled and blended once per image and size
+    backdrop = load_layer(LOGO_PATH, (WIDTH, HEIGHT), blend_backdrop,
+                          tag=f"{LOGO_ALPHA}/{OVERLAY_ALPHA}/{DARK_GRAY}")
+    if backdrop is None:
+        print(f"Warning: Could not load team logo. Place '{LOGO_PATH}' in the same folder.")
+    
+    engine = RenderEngine(screen)
+    
+    # Text is rendered again only when what it shows changes
+    labels = {
+        "status": Label(small_font, "Status: {}{}", GREEN),
+        "target": Label(small_font, "Target: {}:{}", WHITE),
+        "target_none": Label(small_font, "Target: searching...", GRAY),
+        "packets": Label(small_font, "Packets: {}", WHITE),
+        "bot_none": Label(small_font, "Bot: no telemetry", WHITE),
+        "bot_pwm": Label(small_font, "Bot L/R: {:+d}/{:+d}", WHITE),
+        "bot_seq": Label(small_font, "Applied: #{} (lag {})", WHITE),
+        "bot_up": Label(small_font, "Up {}s  Timeouts: {}", WHITE),
+        "rtt": Label(small_font, "{}", WHITE),
+        "cmd": Label(font, "CMD: {}", GREEN),
+        "speed": Label(small_font, "Speed: {}/" + str(MAX_SPEED), WHITE),
+    }
 
 # ============================================
-# Pygame Setup
+# Layout (widget rects for dirty-rect redraws)
 # ============================================
-pygame.init()
-WIDTH, HEIGHT = 600, 550  # Increased height for team logo
-screen = pygame.display.set_mode((WIDTH, HEIGHT))
-pygame.display.set_caption("ESP8266 RC Car Controller - TAKESHI'S TROOPS")
-clock = pygame.time.Clock()
+BANNER_HEIGHT = 80
+SMALL_TEXT_HEIGHT = 24  # small_font line height, rounded up
+STATUS_RECT = pygame.Rect(20, 160, WIDTH - 150 - 30, SMALL_TEXT_HEIGHT)
+PACKETS_RECT = pygame.Rect(WIDTH - 150, 160, 150, SMALL_TEXT_HEIGHT)
+TARGET_RECT = pygame.Rect(20, 185, WIDTH - 150 - 30, SMALL_TEXT_HEIGHT)
+RTT_RECT = pygame.Rect(WIDTH - 150, 185, 150, SMALL_TEXT_HEIGHT)
+CMD_BOX = pygame.Rect(WIDTH//2 - 150, 220, 300, 60)
+CMD_TEXT_RECT = CMD_BOX.inflate(-8, -8)
+SPEED_TEXT_RECT = pygame.Rect(WIDTH//2 - 150, 290, 300, SMALL_TEXT_HEIGHT)
+SPEED_BAR = pygame.Rect(WIDTH//2 - 150, 320, 300, 20)
+BOT_PWM_RECT = pygame.Rect(20, 360, 170, SMALL_TEXT_HEIGHT)  # left of the arrows
+BOT_SEQ_RECT = pygame.Rect(20, 385, 170, SMALL_TEXT_HEIGHT)
+BOT_UP_RECT = pygame.Rect(20, 410, 170, SMALL_TEXT_HEIGHT)
 
-# Fonts
-team_font = pygame.font.Font(None, 56)  # Large font for team name
-title_font = pygame.font.Font(None, 48)
-font = pygame.font.Font(None, 32)
-small_font = pygame.font.Font(None, 24)
+ARROW_SIZE = 20
+ARROW_CENTER_X = WIDTH // 2
+ARROW_CENTER_Y = 430
+ARROW_SPACING = 80
+GUIDE_Y = 520
 
-# Load team logo as full background
-try:
-    team_logo = pygame.image.load("takeshi_castle.png")  # Save your image as takeshi_castle.png
-    # Scale logo to fill entire window
-    team_logo = pygame.transform.scale(team_logo, (WIDTH, HEIGHT))
-    # Set transparency (0-255, where 255 is opaque, 128 is 50% transparent)
-    team_logo.set_alpha(100)  # Adjust this value for more/less transparency (lower = more transparent)
-    logo_loaded = True
-except:
-    logo_loaded = False
-    print("Warning: Could not load team logo. Place 'takeshi_castle.png' in the same folder.")
+def arrow_points(direction, x, y, size):
+    """Triangle of an arrow pointing in direction"""
+    if direction == "UP":
+        return ((x, y - size), (x - size, y + size), (x + size, y + size))
+    if direction == "DOWN":
+        return ((x, y + size), (x - size, y - size), (x + size, y - size))
+    if direction == "LEFT":
+        return ((x - size, y), (x + size, y - size), (x + size, y + size))
+    return ((x + size, y), (x - size, y - size), (x - size, y + size))
+
+def arrow_rect(x, y, size):
+    """Bounding box of an arrow including its outline"""
+    return pygame.Rect(x - size - 3, y - size - 3, 2 * size + 7, 2 * size + 7)
+
+# (direction, points, bounding box, input bit), built once
+ARROWS = [
+    (direction, arrow_points(direction, x, y, ARROW_SIZE), arrow_rect(x, y, ARROW_SIZE), bit)
+    for direction, x, y, bit in (
+        ("UP", ARROW_CENTER_X, ARROW_CENTER_Y - ARROW_SPACING, BIT_UP),
+        ("DOWN", ARROW_CENTER_X, ARROW_CENTER_Y + ARROW_SPACING, BIT_DOWN),
+        ("LEFT", ARROW_CENTER_X - ARROW_SPACING, ARROW_CENTER_Y, BIT_LEFT),
+        ("RIGHT", ARROW_CENTER_X + ARROW_SPACING, ARROW_CENTER_Y, BIT_RIGHT),
+    )
+]
 
 # ============================================
-# State Variables
+# State (input, sender and reports live in controller_core.py)
 # ============================================
-current_command = "STOPPED"
-current_speed = 512
-command_history = []
-max_history = 10
-packets_sent = 0
-connection_status = "CONNECTING..."
+core = ControllerCore(sys.modules[__name__])
+overlay_shown = False  # profiler overlay drawn last frame
 
 # ============================================
 # Functions
 # ============================================
-def send_command(command):
-    """Send UDP command to ESP8266"""
-    global packets_sent, connection_status
-    try:
-        sock.sendto(command.encode(), (ESP_IP, ESP_PORT))
-        packets_sent += 1
-        connection_status = "CONNECTED"
-        return True
-    except Exception as e:
-        connection_status = f"ERROR: {e}"
-        return False
-
-def log_command(cmd, description):
-    """Add command to history"""
-    global command_history
-    command_history.append(f"{description}")
-    if len(command_history) > max_history:
-        command_history.pop(0)
+def print_startup(window_at, frame_at):
+    """Launch-to-window, first frame and first packet times"""
+    def since_launch(t):
+        return "--" if t is None else f"{(t - STARTED_AT) * 1000:.0f} ms"
+    print(f"Startup: window {since_launch(window_at)}, first frame {since_launch(frame_at)}, "
+          f"first packet {since_launch(core.sender.first_send_at)} from launch")
 
 def draw_button(text, x, y, width, height, active=False):
     """Draw a button on screen"""
@@ -96,44 +192,26 @@ def draw_button(text, x, y, width, height, active=False):
     text_rect = text_surf.get_rect(center=(x + width//2, y + height//2))
     screen.blit(text_surf, text_rect)
 
-def draw_arrow(direction, x, y, size, active=False):
+def draw_arrow(points, active=False):
     """Draw directional arrow"""
     color = YELLOW if active else BLUE
-    
-    if direction == "UP":
-        points = [(x, y - size), (x - size, y + size), (x + size, y + size)]
-    elif direction == "DOWN":
-        points = [(x, y + size), (x - size, y - size), (x + size, y - size)]
-    elif direction == "LEFT":
-        points = [(x - size, y), (x + size, y - size), (x + size, y + size)]
-    elif direction == "RIGHT":
-        points = [(x + size, y), (x - size, y - size), (x - size, y + size)]
-    
     pygame.draw.polygon(screen, color, points)
     pygame.draw.polygon(screen, WHITE, points, 3)
 
-def draw_ui():
-    """Draw the user interface"""
-    # Fill background with dark color
-    screen.fill(DARK_GRAY)
-    
-    # Draw full background logo (translucent)
-    if logo_loaded:
-        screen.blit(team_logo, (0, 0))
-    
-    # Semi-transparent overlay for better text readability
-    overlay = pygame.Surface((WIDTH, HEIGHT))
-    overlay.set_alpha(150)  # Adjust for darker/lighter overlay
-    overlay.fill(DARK_GRAY)
-    screen.blit(overlay, (0, 0))
+def draw_static_layer(surface):
+    """Draw everything that never changes into the cached background"""
+    # Translucent logo under the overlay, or just the dark color
+    if backdrop is not None:
+        surface.blit(backdrop, (0, 0))
+    else:
+        surface.fill(DARK_GRAY)
     
     # Team Name Banner
-    banner_height = 80
-    banner_surface = pygame.Surface((WIDTH, banner_height))
+    banner_surface = pygame.Surface((WIDTH, BANNER_HEIGHT))
     banner_surface.set_alpha(200)  # Semi-transparent banner
     banner_surface.fill((20, 20, 20))
-    screen.blit(banner_surface, (0, 0))
-    pygame.draw.rect(screen, GOLD, (0, banner_height - 3, WIDTH, 3))  # Gold underline
+    surface.blit(banner_surface, (0, 0))
+    pygame.draw.rect(surface, GOLD, (0, BANNER_HEIGHT - 3, WIDTH, 3))  # Gold underline
     
     # Team Name
     team_name = team_font.render("TAKESHI'S TROOPS", True, GOLD)
@@ -141,174 +219,163 @@ def draw_ui():
     
     # Add shadow effect for team name
     shadow = team_font.render("TAKESHI'S TROOPS", True, BLACK)
-    screen.blit(shadow, (team_name_rect.x + 3, team_name_rect.y + 3))
-    screen.blit(team_name, team_name_rect)
+    surface.blit(shadow, (team_name_rect.x + 3, team_name_rect.y + 3))
+    surface.blit(team_name, team_name_rect)
     
     # Title
     title = title_font.render("RC CAR CONTROL", True, WHITE)
     title_shadow = title_font.render("RC CAR CONTROL", True, BLACK)
-    screen.blit(title_shadow, (WIDTH//2 - title.get_width()//2 + 2, 102))
-    screen.blit(title, (WIDTH//2 - title.get_width()//2, 100))
-    
-    # Connection status
-    status_color = GREEN if connection_status == "CONNECTED" else RED
-    status_text = small_font.render(f"Status: {connection_status}", True, status_color)
-    screen.blit(status_text, (20, 160))
-    
-    # Target info
-    target_text = small_font.render(f"Target: {ESP_IP}:{ESP_PORT}", True, WHITE)
-    screen.blit(target_text, (20, 185))
+    surface.blit(title_shadow, (WIDTH//2 - title.get_width()//2 + 2, 102))
+    surface.blit(title, (WIDTH//2 - title.get_width()//2, 100))
     
-    # Packets sent
-    packets_text = small_font.render(f"Packets: {packets_sent}", True, WHITE)
-    screen.blit(packets_text, (WIDTH - 150, 160))
-    
-    # Current command display
-    cmd_bg = pygame.Rect(WIDTH//2 - 150, 220, 300, 60)
-    pygame.draw.rect(screen, BLACK, cmd_bg, border_radius=10)
-    pygame.draw.rect(screen, GREEN, cmd_bg, 3, border_radius=10)
+    # Current command box (only the text inside changes)
+    pygame.draw.rect(surface, BLACK, CMD_BOX, border_radius=10)
+    pygame.draw.rect(surface, GREEN, CMD_BOX, 3, border_radius=10)
     
-    cmd_text = font.render(f"CMD: {current_command}", True, GREEN)
-    screen.blit(cmd_text, (WIDTH//2 - cmd_text.get_width()//2, 235))
+    # Controls guide
+    guide_texts = [
+        "W/↑: Forward  |  S/↓: Backward  |  A/←: Left  |  D/→: Right  |  +: Speed↑  |  -: Speed↓  |  ESC: Quit"
+    ]
     
-    # Speed display
-    speed_text = small_font.render(f"Speed: {current_speed}/1023", True, WHITE)
-    screen.blit(speed_text, (WIDTH//2 - speed_text.get_width()//2, 290))
+    guide = small_font.render(guide_texts[0], True, WHITE)
+    surface.blit(guide, (WIDTH//2 - guide.get_width()//2, GUIDE_Y))
+
+def draw_text(text_surf, x, y):
+    """Blit a cached text surface"""
+    screen.blit(text_surf, (x, y))
+
+def draw_optional_text(text_surf, x, y):
+    """Blit a cached text surface, or leave the background if None"""
+    if text_surf is not None:
+        screen.blit(text_surf, (x, y))
+
+def draw_speed_bar(speed):
+    """Draw the speed bar"""
+    pygame.draw.rect(screen, BLACK, SPEED_BAR)
+    filled_width = int((speed / MAX_SPEED) * SPEED_BAR.width)
+    pygame.draw.rect(screen, GREEN, (SPEED_BAR.x, SPEED_BAR.y, filled_width, SPEED_BAR.height))
+    pygame.draw.rect(screen, WHITE, SPEED_BAR, 2)
+
+def draw_ui():
+    """Draw the user interface (only widgets that changed)"""
+    global overlay_shown
+    sender = core.sender
+    profiler = core.profiler
+    if engine.background is None:
+        engine.build_background(draw_static_layer)
+    if profiler.enabled != overlay_shown:
+        overlay_shown = profiler.enabled
+        engine.invalidate()  # show or clear the overlay
     
-    # Speed bar
-    bar_width = 300
-    bar_height = 20
-    bar_x = WIDTH//2 - bar_width//2
-    bar_y = 320
+    # Connection status
+    rtt, loss_text = core.link_labels()
+    labels["status"].color = GREEN if sender.status == "CONNECTED" else RED
+    status_text = labels["status"].get(sender.status, loss_text)
+    engine.widget("status", STATUS_RECT, status_text,
+                  draw_text, status_text, STATUS_RECT.x, STATUS_RECT.y)
     
-    pygame.draw.rect(screen, BLACK, (bar_x, bar_y, bar_width, bar_height))
-    filled_width = int((current_speed / 1023) * bar_width)
-    pygame.draw.rect(screen, GREEN, (bar_x, bar_y, filled_width, bar_height))
-    pygame.draw.rect(screen, WHITE, (bar_x, bar_y, bar_width, bar_height), 2)
+    # Target (follows the bot if discovery retargets the sender)
+    address = sender.address
+    target_text = labels["target_none"].get() if address is None else labels["target"].get(*address)
+    engine.widget("target", TARGET_RECT, address,
+                  draw_text, target_text, TARGET_RECT.x, TARGET_RECT.y)
     
-    # Draw directional arrows
-    center_x = WIDTH // 2
-    center_y = 430
-    spacing = 80
+    # Packets sent
+    packets_text = labels["packets"].get(sender.packets_sent)
+    engine.widget("packets", PACKETS_RECT, sender.packets_sent,
+                  draw_text, packets_text, PACKETS_RECT.x, PACKETS_RECT.y)
     
-    # Get key states
-    keys = pygame.key.get_pressed()
+    # Round-trip time p50/p95/p99
+    rtt_text = labels["rtt"].get(rtt)
+    engine.widget("rtt", RTT_RECT, rtt_text, draw_text, rtt_text, RTT_RECT.x, RTT_RECT.y)
     
-    # Up arrow
-    draw_arrow("UP", center_x, center_y - spacing, 20, 
-               keys[pygame.K_UP] or keys[pygame.K_w])
+    # Bot-side telemetry, as last reported (None once it goes stale)
+    if sender.telemetry is not None:
+        state = sender.telemetry.fresh(time.perf_counter())
+        if state is None:
+            pwm_text = labels["bot_none"].get()
+            seq_text = up_text = None
+        else:
+            pwm_text = labels["bot_pwm"].get(state.left, state.right)
+            seq_text = labels["bot_seq"].get("-" if state.last_seq is None else state.last_seq,
+                                             "-" if state.lag is None else state.lag)
+            labels["bot_up"].color = RED if state.timed_out else WHITE
+            up_text = labels["bot_up"].get(state.uptime_ms // 1000, state.timeouts)
+        engine.widget("bot_pwm", BOT_PWM_RECT, pwm_text,
+                      draw_text, pwm_text, BOT_PWM_RECT.x, BOT_PWM_RECT.y)
+        engine.widget("bot_seq", BOT_SEQ_RECT, seq_text,
+                      draw_optional_text, seq_text, BOT_SEQ_RECT.x, BOT_SEQ_RECT.y)
+        engine.widget("bot_up", BOT_UP_RECT, up_text,
+                      draw_optional_text, up_text, BOT_UP_RECT.x, BOT_UP_RECT.y)
     
-    # Down arrow
-    draw_arrow("DOWN", center_x, center_y + spacing, 20, 
-               keys[pygame.K_DOWN] or keys[pygame.K_s])
+    # Current command display
+    cmd_text = labels["cmd"].get(core.current_command)
+    engine.widget("cmd", CMD_TEXT_RECT, core.current_command,
+                  draw_text, cmd_text, WIDTH//2 - cmd_text.get_width()//2, 235)
     
-    # Left arrow
-    draw_arrow("LEFT", center_x - spacing, center_y, 20, 
-               keys[pygame.K_LEFT] or keys[pygame.K_a])
+    # Speed display
+    speed_text = labels["speed"].get(core.current_speed)
+    engine.widget("speed", SPEED_TEXT_RECT, core.current_speed,
+                  draw_text, speed_text, WIDTH//2 - speed_text.get_width()//2, 290)
     
-    # Right arrow
-    draw_arrow("RIGHT", center_x + spacing, center_y, 20, 
-               keys[pygame.K_RIGHT] or keys[pygame.K_d])
+    # Speed bar
+    engine.widget("speed_bar", SPEED_BAR, core.current_speed, draw_speed_bar, core.current_speed)
     
-    # Controls guide
-    guide_y = 520
-    guide_texts = [
-        "W/↑: Forward  |  S/↓: Backward  |  A/←: Left  |  D/→: Right  |  +: Speed↑  |  -: Speed↓  |  ESC: Quit"
-    ]
+    # Directional arrows (from this tick's input bitmask)
+    for direction, points, rect, bit in ARROWS:
+        active = bool(core.input_mask & bit)
+        engine.widget(direction, rect, active, draw_arrow, points, active)
     
-    guide = small_font.render(guide_texts[0], True, WHITE)
-    screen.blit(guide, (WIDTH//2 - guide.get_width()//2, guide_y))
+    # Profiler overlay (bottom right, clear of the bot telemetry, speed text
+    # and arrows; only redrawn when its numbers refresh)
+    if profiler.enabled:
+        lines = profiler.overlay_lines()
+        width, height = overlay_size(mono_font)
+        rect = pygame.Rect(WIDTH - width - 10, GUIDE_Y - height - 6, width, height)
+        engine.widget("profiler", rect, lines, draw_overlay, screen, mono_font, lines, rect.x, rect.y)
+
 
 # ============================================
 # Main Loop
 # ============================================
-def main():
-    global current_command, current_speed
-    
-    running = True
-    last_command = None
+def run_frame():
+    """One pass of the main loop, up to the wait for the next frame"""
+    # Events, key state and the command for the sender
+    core.process_input()
     
-    print("=" * 60)
-    print("ESP8266 RC Car Controller - TAKESHI'S TROOPS")
-    print("=" * 60)
-    print(f"Target: {ESP_IP}:{ESP_PORT}")
-    print("=" * 60)
+    # Draw UI
+    draw_ui()
+    core.profiler.mark(P_DRAW)
     
-    while running:
-        # Event handling
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                running = False
-            
-            # Speed control on key press
-            if event.type == pygame.KEYDOWN:
-                if event.key == pygame.K_PLUS or event.key == pygame.K_EQUALS:
-                    current_speed = min(1023, current_speed + 100)
-                    send_command("+")
-                    log_command("+", f"Speed increased to {current_speed}")
-                elif event.key == pygame.K_MINUS or event.key == pygame.K_UNDERSCORE:
-                    current_speed = max(200, current_speed - 100)
-                    send_command("-")
-                    log_command("-", f"Speed decreased to {current_speed}")
-                elif event.key == pygame.K_ESCAPE:
-                    running = False
-        
-        # Get current key states
-        keys = pygame.key.get_pressed()
-        
-        # Determine command based on keys
-        command = "S"  # Default to stop
-        command_name = "STOPPED"
+    # Update display (dirty rects only)
+    engine.present()
+    core.profiler.mark(P_FLIP)
 
-
-        if keys[pygame.K_UP] and keys[pygame.K_LEFT]:
-            command = "R"
-            command_name = "UPPER_LEFT"
-        elif keys[pygame.K_UP] and keys[pygame.K_RIGHT]:
-            command = "Y"
-            command_name = "UPPER_RIGHT"
-        elif keys[pygame.K_DOWN] and keys[pygame.K_LEFT]:
-            command = "C"
-            command_name = "DOWN_LEFT"
-        elif keys[pygame.K_DOWN] and keys[pygame.K_RIGHT]:
-            command = "B"
-            command_name = "DOWN_RIGHT"
-        elif keys[pygame.K_UP] or keys[pygame.K_w]:
-            command = "F"
-            command_name = "FORWARD"
-        elif keys[pygame.K_DOWN] or keys[pygame.K_s]:
-            command = "K"
-            command_name = "BACKWARD"
-        elif keys[pygame.K_LEFT] or keys[pygame.K_a]:
-            command = "L"
-            command_name = "LEFT"
-        elif keys[pygame.K_RIGHT] or keys[pygame.K_d]:
-            command = "E"
-            command_name = "RIGHT"
-        
-        
-        # Always send command (removed change check for better responsiveness)
-        if send_command(command):
-            current_command = command_name
-            # Only log and print when command changes to reduce console spam
-            if command != last_command:
-                log_command(command, command_name)
-                print(f"→ {command_name}")
-            last_command = command
-        
-        # Draw UI
-        draw_ui()
-        
-        # Update display
-        pygame.display.flip()
+def main():
+    core.open_network()
+    core.start()  # the first packet (STOP) goes out while the window opens
+    init_gui()
+    window_at = time.perf_counter()
+    core.open_gamepad()
+    
+    core.print_banner("ESP8266 RC Car Controller - TAKESHI'S TROOPS")
+    
+    first_frame = True
+    while core.running:
+        run_frame()
+        if first_frame:
+            first_frame = False
+            print_startup(window_at, time.perf_counter())
         
-        # Control frame rate (20 FPS = 50ms between commands)
-        clock.tick(20)
+        # Control frame rate, handling input as it arrives in between
+        clock.wait(core.handle_event)
+        core.profiler.mark(P_IDLE)
+        core.profiler.end_frame()
     
     # Cleanup
-    send_command("S")  # Stop car before exiting
+    core.close()
     pygame.quit()
-    sock.close()
+    core.print_report()
     print("\n✓ Controller stopped.")
 
 # ============================================
@@ -319,6 +386,6 @@ if __name__ == "__main__":
         main()
     except KeyboardInterrupt:
         print("\n\nInterrupted by user")
+        core.close()
         pygame.quit()
-        sock.close()
         sys.exit(0)
\ No newline at end of file
@@ -31,6 +31,93 @@ const unsigned long COMMAND_TIMEOUT = 300; // Stop if no command for 300ms
 // Last command for change detection
 char lastCommand = 'S';
 
+// Binary command protocol (see Controller/protocol.py)
+// Packets whose first byte is PROTOCOL_VERSION carry absolute signed PWM
+// for each motor; anything else is treated as a one-letter ASCII command.
+// The cmd byte is informational: CMD_DRIVE (9) packets from an analog
+// stick carry an arbitrary left/right mix and are applied exactly like the
+// discrete commands, so the sm offset never applies to them.
+#define PROTOCOL_VERSION 0xA1
+#define PKT_COMMAND 0x01
+#define PKT_ACK 0x02
+#define PKT_PROBE 0x03
+#define PKT_HELLO 0x04
+#define PKT_TELEMETRY 0x05
+#define FLAG_ACK_REQUEST 0x01
+#define FLAG_TELEMETRY 0x02
+#define CAP_ASCII 0x01
+#define CAP_BINARY 0x02
+#define CAP_ACK 0x04
+#define CAP_TELEMETRY 0x08
+#define TELEM_TIMED_OUT 0x01
+#define TELEM_SEQ_VALID 0x02
+#define HELLO_NAME_MAX 32
+const unsigned long RESYNC_AFTER = 1000; // Accept any sequence after 1s of silence
+
+struct __attribute__((packed)) CommandPacket {
+  uint8_t version;
+  uint8_t type;
+  uint8_t flags;
+  uint8_t cmd;
+  uint16_t seq;
+  int16_t left;      // -1023..1023, sign = direction
+  int16_t right;
+  uint32_t timeMs;   // sender clock
+};
+
+// Discovery: controllers broadcast a probe and we answer with a hello
+// carrying our chip ID, capabilities and hostname (see Controller/discovery.py)
+struct __attribute__((packed)) ProbePacket {
+  uint8_t version;
+  uint8_t type;
+  uint32_t nonce;
+};
+
+struct __attribute__((packed)) HelloHeader {
+  uint8_t version;
+  uint8_t type;
+  uint32_t nonce;    // echoed from the probe
+  uint32_t botId;
+  uint8_t caps;
+};
+
+// Telemetry: motor PWM sampled every TELEMETRY_SAMPLE_MS and sent in
+// batches of TELEMETRY_BATCH to whoever asks with FLAG_TELEMETRY, until they
+// have been silent for TELEMETRY_IDLE_MS (see Controller/protocol.py)
+#define TELEMETRY_SAMPLE_MS 20
+#define TELEMETRY_BATCH 10
+#define TELEMETRY_IDLE_MS 1000
+
+struct __attribute__((packed)) TelemetryHeader {
+  uint8_t version;
+  uint8_t type;
+  uint8_t count;
+  uint8_t flags;
+  uint32_t uptimeMs;       // millis() at the last sample
+  uint16_t lastSeq;
+  uint16_t timeouts;
+  uint32_t lastTimeoutMs;
+};
+
+int16_t pwmLeft = 0;       // signed PWM as driven, sign = direction
+int16_t pwmRight = 0;
+int16_t samples[TELEMETRY_BATCH][2];
+uint8_t sampleCount = 0;
+unsigned long nextSampleTime = 0;
+bool telemetryOn = false;
+bool flushTelemetry = false;
+IPAddress telemetryIP;
+uint16_t telemetryPort = 0;
+unsigned long telemetryRequestTime = 0;
+uint16_t timeoutCount = 0;
+unsigned long lastTimeoutTime = 0;
+bool timedOut = false;     // stopped by the timeout, no command since
+
+bool haveSeq = false;
+uint16_t lastSeq = 0;
+uint32_t minOffset = 0;
+unsigned long lastAcceptTime = 0;
+
 // Function declarations
 void forward();
 void backward();
@@ -40,6 +127,12 @@ void stopMotors();
 void increaseSpeed();
 void decreaseSpeed();
 void executeCommand(char cmd);
+bool handleBinaryPacket(const CommandPacket& pkt);
+void drive(int left, int right);
+void sendAck(uint16_t seq);
+void sendHello(uint32_t nonce);
+void serviceTelemetry();
+void setPwmState(int left, int right);
 void ul();
 void ur();
 void dl();
@@ -87,14 +180,40 @@ void setup() {
 void loop() {
   // Process ALL pending UDP packets (clear the buffer)
   while (udp.parsePacket()) {
-    int len = udp.read(packetBuffer, 2); // Read max 2 bytes (command + potential null)
-    if (len > 0) {
+    int len = udp.read(packetBuffer, sizeof(packetBuffer));
+    if (len == sizeof(CommandPacket) && (uint8_t)packetBuffer[0] == PROTOCOL_VERSION) {
+      CommandPacket pkt;
+      memcpy(&pkt, packetBuffer, sizeof(pkt));
+      if (handleBinaryPacket(pkt)) {
+        lastCommand = (pkt.left == 0 && pkt.right == 0) ? 'S' : 'D';
+        lastCommandTime = millis();
+        timedOut = false;
+      }
+      if (pkt.flags & FLAG_TELEMETRY) {
+        if (!telemetryOn) nextSampleTime = millis();
+        telemetryOn = true;
+        telemetryIP = udp.remoteIP();
+        telemetryPort = udp.remotePort();
+        telemetryRequestTime = millis();
+      }
+      // Echo the sequence number so the controller can measure RTT and loss
+      if (pkt.flags & FLAG_ACK_REQUEST) {
+        sendAck(pkt.seq);
+      }
+    } else if (len == sizeof(ProbePacket) && (uint8_t)packetBuffer[0] == PROTOCOL_VERSION
+               && (uint8_t)packetBuffer[1] == PKT_PROBE) {
+      // Discovery probe: answer without touching the motors or the timeout
+      ProbePacket probe;
+      memcpy(&probe, packetBuffer, sizeof(probe));
+      sendHello(probe.nonce);
+    } else if (len > 0) {
       char cmd = packetBuffer[0];
       
       // Execute command immediately (removed debouncing for better responsiveness)
       executeCommand(cmd);
       lastCommand = cmd;
       lastCommandTime = millis();
+      timedOut = false;
     }
   }
   
@@ -103,9 +222,15 @@ void loop() {
     if (lastCommand != 'S') {
       stopMotors();
       lastCommand = 'S';
+      timeoutCount++;
+      lastTimeoutTime = millis();
+      timedOut = true;
+      flushTelemetry = true;  // report the stop now, not at the end of the batch
       Serial.println(F("\n[TIMEOUT - STOPPED]"));
     }
   }
+
+  serviceTelemetry();
   
   // Yield to prevent watchdog reset
   yield();
@@ -157,6 +282,93 @@ void executeCommand(char cmd) {
   }
 }
 
+bool handleBinaryPacket(const CommandPacket& pkt) {
+  if (pkt.type != PKT_COMMAND) return false;
+  unsigned long now = millis();
+
+  // After a long silence (e.g. controller restart) relearn sequence and clock
+  if (haveSeq && now - lastAcceptTime > RESYNC_AFTER) {
+    haveSeq = false;
+  }
+
+  // Reject duplicates and out-of-order packets (uint16 serial arithmetic)
+  if (haveSeq && (int16_t)(pkt.seq - lastSeq) <= 0) return false;
+
+  // Reject packets that sat in a queue longer than the command timeout
+  uint32_t offset = (uint32_t)now - pkt.timeMs;
+  if (!haveSeq || (int32_t)(offset - minOffset) < 0) {
+    minOffset = offset;
+  } else if (offset - minOffset > COMMAND_TIMEOUT) {
+    return false;
+  }
+
+  haveSeq = true;
+  lastSeq = pkt.seq;
+  lastAcceptTime = now;
+  drive(pkt.left, pkt.right);
+  return true;
+}
+
+void sendAck(uint16_t seq) {
+  uint8_t ack[4] = {PROTOCOL_VERSION, PKT_ACK, (uint8_t)(seq & 0xFF), (uint8_t)(seq >> 8)};
+  udp.beginPacket(udp.remoteIP(), udp.remotePort());
+  udp.write(ack, sizeof(ack));
+  udp.endPacket();
+}
+
+void sendHello(uint32_t nonce) {
+  HelloHeader hello = {PROTOCOL_VERSION, PKT_HELLO, nonce, ESP.getChipId(),
+                       CAP_ASCII | CAP_BINARY | CAP_ACK | CAP_TELEMETRY};
+  String name = WiFi.hostname();
+  size_t nameLen = name.length() < HELLO_NAME_MAX ? name.length() : HELLO_NAME_MAX;
+  udp.beginPacket(udp.remoteIP(), udp.remotePort());
+  udp.write((const uint8_t*)&hello, sizeof(hello));
+  udp.write((const uint8_t*)name.c_str(), nameLen);
+  udp.endPacket();
+}
+
+void serviceTelemetry() {
+  if (!telemetryOn) return;
+  unsigned long now = millis();
+  if (now - telemetryRequestTime > TELEMETRY_IDLE_MS) {
+    telemetryOn = false;  // the controller has gone; stop talking
+    sampleCount = 0;
+    return;
+  }
+  if ((long)(now - nextSampleTime) >= 0 || flushTelemetry) {
+    samples[sampleCount][0] = pwmLeft;
+    samples[sampleCount][1] = pwmRight;
+    sampleCount++;
+    nextSampleTime = now + TELEMETRY_SAMPLE_MS;
+  }
+  if (sampleCount < TELEMETRY_BATCH && !flushTelemetry) return;
+
+  uint8_t flags = (timedOut ? TELEM_TIMED_OUT : 0) | (haveSeq ? TELEM_SEQ_VALID : 0);
+  TelemetryHeader header = {PROTOCOL_VERSION, PKT_TELEMETRY, sampleCount, flags,
+                            (uint32_t)now, lastSeq, timeoutCount, (uint32_t)lastTimeoutTime};
+  udp.beginPacket(telemetryIP, telemetryPort);
+  udp.write((const uint8_t*)&header, sizeof(header));
+  udp.write((const uint8_t*)samples, sampleCount * sizeof(samples[0]));
+  udp.endPacket();
+  sampleCount = 0;
+  flushTelemetry = false;
+}
+
+void setPwmState(int left, int right) {
+  pwmLeft = constrain(left, -MAX_SPEED, MAX_SPEED);
+  pwmRight = constrain(right, -MAX_SPEED, MAX_SPEED);
+}
+
+void drive(int left, int right) {
+  digitalWrite(MOTOR_LEFT_FWD, left > 0 ? HIGH : LOW);
+  digitalWrite(MOTOR_LEFT_BWD, left < 0 ? HIGH : LOW);
+  digitalWrite(MOTOR_RIGHT_FWD, right > 0 ? HIGH : LOW);
+  digitalWrite(MOTOR_RIGHT_BWD, right < 0 ? HIGH : LOW);
+  analogWrite(MOTOR_LEFT_EN, constrain(abs(left), 0, MAX_SPEED));
+  analogWrite(MOTOR_RIGHT_EN, constrain(abs(right), 0, MAX_SPEED));
+  setPwmState(left, right);
+}
+
 void forward() {
   digitalWrite(MOTOR_LEFT_FWD, HIGH);
   digitalWrite(MOTOR_LEFT_BWD, LOW);
@@ -164,6 +376,7 @@ void forward() {
   digitalWrite(MOTOR_RIGHT_BWD, LOW);
   analogWrite(MOTOR_LEFT_EN, currentSpeed);
   analogWrite(MOTOR_RIGHT_EN, currentSpeed);
+  setPwmState(currentSpeed, currentSpeed);
 }
 
 void backward() {
@@ -173,6 +386,7 @@ void backward() {
   digitalWrite(MOTOR_RIGHT_BWD, HIGH);
   analogWrite(MOTOR_LEFT_EN, currentSpeed);
   analogWrite(MOTOR_RIGHT_EN, currentSpeed);
+  setPwmState(-currentSpeed, -currentSpeed);
 }
 
 void right() {
@@ -182,6 +396,7 @@ void right() {
   digitalWrite(MOTOR_RIGHT_BWD, HIGH);
   analogWrite(MOTOR_LEFT_EN, currentSpeed);
   analogWrite(MOTOR_RIGHT_EN, currentSpeed);
+  setPwmState(currentSpeed, -currentSpeed);
 }
 
 void left() {
@@ -191,6 +406,7 @@ void left() {
   digitalWrite(MOTOR_RIGHT_BWD, LOW);
   analogWrite(MOTOR_LEFT_EN, currentSpeed);
   analogWrite(MOTOR_RIGHT_EN, currentSpeed);
+  setPwmState(-currentSpeed, currentSpeed);
 }
 
 void ul(){
@@ -200,6 +416,7 @@ void ul(){
   digitalWrite(MOTOR_RIGHT_BWD, LOW);
   analogWrite(MOTOR_LEFT_EN, currentSpeed - sm);
   analogWrite(MOTOR_RIGHT_EN,currentSpeed + sm);
+  setPwmState(constrain(currentSpeed - sm, 0, MAX_SPEED), constrain(currentSpeed + sm, 0, MAX_SPEED));
 }
 void ur(){
   digitalWrite(MOTOR_LEFT_FWD, HIGH);
@@ -208,6 +425,7 @@ void ur(){
   digitalWrite(MOTOR_RIGHT_BWD, LOW);
   analogWrite(MOTOR_LEFT_EN, currentSpeed + sm);
   analogWrite(MOTOR_RIGHT_EN,currentSpeed - sm);
+  setPwmState(constrain(currentSpeed + sm, 0, MAX_SPEED), constrain(currentSpeed - sm, 0, MAX_SPEED));
 }
 void dl(){
   digitalWrite(MOTOR_LEFT_FWD, LOW);
@@ -216,6 +434,7 @@ void dl(){
   digitalWrite(MOTOR_RIGHT_BWD, HIGH);
   analogWrite(MOTOR_LEFT_EN, currentSpeed - sm);
   analogWrite(MOTOR_RIGHT_EN, currentSpeed + sm);
+  setPwmState(-constrain(currentSpeed - sm, 0, MAX_SPEED), -constrain(currentSpeed + sm, 0, MAX_SPEED));
 }
 void dr(){
   digitalWrite(MOTOR_LEFT_FWD, LOW);
@@ -224,6 +443,7 @@ void dr(){
   digitalWrite(MOTOR_RIGHT_BWD, HIGH);
   analogWrite(MOTOR_LEFT_EN, currentSpeed + sm);
   analogWrite(MOTOR_RIGHT_EN, currentSpeed - sm);
+  setPwmState(-constrain(currentSpeed + sm, 0, MAX_SPEED), -constrain(currentSpeed - sm, 0, MAX_SPEED));
 }
 
 void stopMotors() {
@@ -233,6 +453,7 @@ void stopMotors() {
   digitalWrite(MOTOR_RIGHT_BWD, LOW);
   analogWrite(MOTOR_LEFT_EN, 0);
   analogWrite(MOTOR_RIGHT_EN, 0);
+  setPwmState(0, 0);
 }
 
 void increaseSpeed() {